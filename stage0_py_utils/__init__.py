@@ -6,17 +6,23 @@ from .agents.conversation_agent import create_conversation_agent
 from .agents.echo_agent import create_echo_agent
 from .echo.echo import Echo
 from .echo.agent import Agent
+from .echo.caching_llm_client import CachingLLMClient
+from .echo.context_builder import ContextBuilder
 from .echo.message import Message
 from .echo.discord_bot import DiscordBot
 from .echo.llm_handler import LLMHandler
 from .echo.mock_llm_client import MockLLMClient
 from .echo.ollama_llm_client import OllamaLLMClient
+from .echo.ollama_router_client import OllamaRouterClient
+from .echo.pooled_llm_client import PooledLLMClient, LLMRequestQueue, QueueTimeoutError
 from .echo_utils.breadcrumb import create_echo_breadcrumb
 from .echo_utils.token import create_echo_token
 from .evaluator.evaluator import Evaluator
+from .evaluator.grade_cache import GradeCache
 from .evaluator.loader import Loader
 from .flask_utils.breadcrumb import create_flask_breadcrumb
 from .flask_utils.token import create_flask_token
+from .flask_utils.page import create_flask_page, create_flask_page_headers, InvalidPageError
 from .flask_utils.ejson_encoder import MongoJSONEncoder
 from .mongo_utils.mongo_io import MongoIO, TestDataLoadError
 from .mongo_utils.encode_properties import encode_document
@@ -33,7 +39,8 @@ __all__ = [
     MongoIO, TestDataLoadError, MongoJSONEncoder, encode_document,
 
     # Echo Framework
-    Echo, Agent, Message, DiscordBot, LLMHandler, MockLLMClient, OllamaLLMClient,
+    Echo, Agent, Message, DiscordBot, LLMHandler, ContextBuilder, CachingLLMClient, MockLLMClient, OllamaLLMClient,
+    OllamaRouterClient, PooledLLMClient, LLMRequestQueue, QueueTimeoutError,
     create_echo_agent, create_echo_routes,
     BotServices, create_bot_agent, create_bot_routes, 
     ConversationServices, create_conversation_agent, create_conversation_routes,
@@ -42,8 +49,8 @@ __all__ = [
     create_echo_breadcrumb, create_echo_token,
 
     # Flask Utility Functions
-    create_flask_breadcrumb, create_flask_token,
+    create_flask_breadcrumb, create_flask_token, create_flask_page, create_flask_page_headers, InvalidPageError,
     
     # LLM Model and Prompt Evaluator
-    Evaluator, Loader,
+    Evaluator, GradeCache, Loader,
 ]
\ No newline at end of file
@@ -63,7 +63,8 @@ def create_bot_agent(agent_name):
                     "type": "breadcrumb"
                 }
             }
-        })
+        },
+        cacheable=True)
 
     def get_channels(arguments):
         """Get a list of active channels for the specified bot"""
@@ -90,7 +91,8 @@ def create_bot_agent(agent_name):
             "items": {
                 "type": "identifier"
             }
-        })
+        },
+        cacheable = True)
     
     def add_channel(arguments):
         """Add the specified channel_id 
@@ -47,7 +47,8 @@ def create_config_agent(agent_name):
                     "type": "object"
                 }
             }
-        }
+        },
+        cacheable=True
     )
 
     logger.info("Registered config agent action handlers.")
@@ -162,6 +162,45 @@ def create_conversation_agent(agent_name):
             }
         })
         
+    def add_messages(arguments):
+        try:
+            token = create_echo_token()
+            breadcrumb = create_echo_breadcrumb(token)
+            message_count = ConversationServices.add_messages(
+                channel_id=arguments["channel_id"],
+                messages=arguments["messages"], 
+                token=token, breadcrumb=breadcrumb)
+            logger.info(f"add_messages Successful {str(breadcrumb['at_time'])}, {breadcrumb['correlation_id']}")            
+            return message_count
+        except Exception as e:
+            logger.warning(f"Add Messages Error has occurred {e}")
+            return "error"
+    agent.register_action(
+        action_name="add_messages", 
+        function=add_messages,
+        description="Add a batch of messages to the specified conversation", 
+        arguments_schema={
+            "description":"A channel_id and the messages to add",
+            "type": "object", 
+            "properties": {
+                "channel_id": {
+                    "description": "",
+                    "type": "string"
+                },
+                "messages": {
+                    "description": "",
+                    "type": "array",
+                    "items": {
+                        "type": "object"
+                    }
+                }                
+            }
+        },
+        output_schema={    
+            "description":"The number of messages in the conversation",
+            "type": "number"
+        })
+        
     def reset_conversation(arguments):
         try:
             token = create_echo_token()
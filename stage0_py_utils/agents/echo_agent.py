@@ -35,7 +35,8 @@ def create_echo_agent(agent_name, echo=None):
                 "description": "An echo agent instance",
                 "type": "object"
             }
-        }
+        },
+        cacheable=True
     )
 
     def get_action(arguments):
@@ -90,7 +91,8 @@ def create_echo_agent(agent_name, echo=None):
                     "type": "object"
                 }
             }
-        }
+        },
+        cacheable=True
     )
 
     logger.info("Registered echo agent action handlers.")
@@ -33,11 +33,31 @@ class Config:
             self.PENDING_STATUS = ''
             self.COMPLETED_STATUS = ''
             self.MONGO_DB_NAME = ''
+            self.MONGO_COMPRESSORS = ''
             self.OLLAMA_HOST = ''
+            self.OLLAMA_HOSTS = ''
+            self.OLLAMA_HEALTH_CHECK_INTERVAL_MS = 0
+            self.OLLAMA_HEALTH_CHECK_TIMEOUT_MS = 0
+            self.OLLAMA_KEEP_ALIVE = ''
+            self.OLLAMA_NUM_CTX = 0
+            self.OLLAMA_NUM_PREDICT = 0
+            self.LLM_TOKEN_BUDGET = 0
+            self.LLM_MAX_TOOL_HOPS = 0
+            self.LLM_CONTEXT_TRIM_STEP = 0
+            self.LLM_MAX_IN_FLIGHT = 0
+            self.LLM_QUEUE_TIMEOUT_MS = 0
+            self.LLM_CACHE = False
+            self.LLM_CACHE_PERSIST = False
+            self.LLM_CACHE_LAST_N = 0
+            self.LLM_CACHE_TTL = 0
+            self.LLM_CACHE_SIZE = 0
+            self.LLM_CACHE_COLLECTION_NAME = ''
+            self.LLM_MODEL_TOKEN_BUDGETS = {}
             # Collection name properties (will be initialized from config)
             self.BOT_COLLECTION_NAME = ''
             self.CHAIN_COLLECTION_NAME = ''
             self.CONVERSATION_COLLECTION_NAME = ''
+            self.MESSAGE_COLLECTION_NAME = ''
             self.ENUMERATORS_COLLECTION_NAME = ''
             self.EXECUTION_COLLECTION_NAME = ''
             self.EXERCISE_COLLECTION_NAME = ''
@@ -51,6 +71,9 @@ class Config:
             self.STAGE0_FRAN_TOKEN = ''
             self.FRAN_MODEL_NAME = ''
             self.FRAN_BOT_PORT = 0
+            self.DISCORD_MAX_WORKERS = 0
+            self.DISCORD_MAX_QUEUE_DEPTH = 0
+            self.ECHO_CACHE_SIZE = 0
             self.FRAN_BOT_ID = ''
             self.SEARCH_API_PORT = 0
             self.MONGO_CONNECTION_STRING = ''
@@ -64,6 +87,25 @@ class Config:
             self.SYNC_BATCH_SIZE = 0
             self.MONGO_COLLECTION_NAMES = []
             self.PAGE_SIZE = 0
+            self.MAX_PAGE_SIZE = 0
+            self.MESSAGE_WINDOW = 0
+            self.MAX_MESSAGES = 0
+            self.MESSAGE_STORAGE = ''
+            self.MESSAGE_BUCKET_SIZE = 0
+            # In-process conversation cache configuration items
+            self.CONVERSATION_CACHE = False
+            self.CONVERSATION_CACHE_CHANNELS = 0
+            self.CONVERSATION_CACHE_BYTES = 0
+            self.CONVERSATION_FLUSH_INTERVAL_MS = 0
+            self.CONVERSATION_FLUSH_SIZE = 0
+            # MongoDB connection pool and timeout configuration items
+            self.MONGO_MAX_POOL_SIZE = 0
+            self.MONGO_MIN_POOL_SIZE = 0
+            self.MONGO_MAX_IDLE_TIME_MS = 0
+            self.MONGO_WAIT_QUEUE_TIMEOUT_MS = 0
+            self.MONGO_SERVER_SELECTION_TIMEOUT_MS = 0
+            self.MONGO_CONNECT_TIMEOUT_MS = 0
+            self.MONGO_SOCKET_TIMEOUT_MS = 0
             # SPA Collection URL properties
             self.BOT_SPA_URL = ''
             self.CHAIN_SPA_URL = ''
@@ -88,10 +130,16 @@ class Config:
                 "PENDING_STATUS": "pending",
                 "COMPLETED_STATUS": "complete",
                 "MONGO_DB_NAME": "stage0",
+                "MONGO_COMPRESSORS": "",
                 "OLLAMA_HOST": "http://localhost:11434",
+                "OLLAMA_HOSTS": "",
+                "OLLAMA_KEEP_ALIVE": "30m",
                 "BOT_COLLECTION_NAME": "bot",
                 "CHAIN_COLLECTION_NAME": "chain",
                 "CONVERSATION_COLLECTION_NAME": "conversation",
+                "MESSAGE_COLLECTION_NAME": "message",
+                "LLM_CACHE_COLLECTION_NAME": "llm_cache",
+                "MESSAGE_STORAGE": "embedded",
                 "ENUMERATORS_COLLECTION_NAME": "enumerators",
                 "EXECUTION_COLLECTION_NAME": "execution",
                 "EXERCISE_COLLECTION_NAME": "exercise",
@@ -118,17 +166,53 @@ class Config:
             }
             self.config_ints = {
                 "FRAN_BOT_PORT": "8087",
+                "LLM_TOKEN_BUDGET": "4096",
+                "LLM_MAX_TOOL_HOPS": "5",
+                "LLM_CONTEXT_TRIM_STEP": "8",
+                "LLM_MAX_IN_FLIGHT": "0",
+                "LLM_QUEUE_TIMEOUT_MS": "60000",
+                "LLM_CACHE_LAST_N": "2",
+                "LLM_CACHE_TTL": "3600",
+                "LLM_CACHE_SIZE": "1000",
+                "OLLAMA_HEALTH_CHECK_INTERVAL_MS": "30000",
+                "OLLAMA_HEALTH_CHECK_TIMEOUT_MS": "2000",
+                "OLLAMA_NUM_CTX": "0",
+                "OLLAMA_NUM_PREDICT": "0",
+                "DISCORD_MAX_WORKERS": "8",
+                "DISCORD_MAX_QUEUE_DEPTH": "10",
+                "ECHO_CACHE_SIZE": "256",
                 "SEARCH_API_PORT": "8083",
                 "MONGODB_API_PORT": "8081",
                 "ELASTIC_SYNC_PERIOD": "0",
                 "SYNC_BATCH_SIZE": "100",
                 "PAGE_SIZE": "30",
+                "MAX_PAGE_SIZE": "500",
+                "MESSAGE_WINDOW": "100",
+                "MAX_MESSAGES": "1000",
+                "MESSAGE_BUCKET_SIZE": "100",
+                "CONVERSATION_CACHE_CHANNELS": "100",
+                "CONVERSATION_CACHE_BYTES": "16777216",
+                "CONVERSATION_FLUSH_INTERVAL_MS": "500",
+                "CONVERSATION_FLUSH_SIZE": "20",
+                "MONGO_MAX_POOL_SIZE": "100",
+                "MONGO_MIN_POOL_SIZE": "0",
+                "MONGO_MAX_IDLE_TIME_MS": "0",
+                "MONGO_WAIT_QUEUE_TIMEOUT_MS": "0",
+                "MONGO_SERVER_SELECTION_TIMEOUT_MS": "2000",
+                "MONGO_CONNECT_TIMEOUT_MS": "20000",
+                "MONGO_SOCKET_TIMEOUT_MS": "5000",
             }
             self.config_booleans = {
                 "AUTO_PROCESS": "false",
                 "EXIT_AFTER_PROCESSING": "false",
                 "LOAD_TEST_DATA": "false",
+                "CONVERSATION_CACHE": "false",
+                "LLM_CACHE": "false",
+                "LLM_CACHE_PERSIST": "false",
             }            
+            self.config_jsons = {
+                "LLM_MODEL_TOKEN_BUDGETS": '{}',
+            }
             self.config_string_secrets = {  
                 "MONGO_CONNECTION_STRING": "mongodb://mongodb:27017/?replicaSet=rs0",
                 "STAGE0_FRAN_TOKEN": "BBB000000000000000000001",
@@ -165,6 +249,11 @@ class Config:
             value = (self._get_config_value(key, default, False)).lower() == "true"
             setattr(self, key, value)
             
+        # Initialize Config JSON values
+        for key, default in self.config_jsons.items():
+            value = json.loads(self._get_config_value(key, default, False))
+            setattr(self, key, value)
+            
         # Initialize String Secrets
         for key, default in self.config_string_secrets.items():
             value = self._get_config_value(key, default, True)
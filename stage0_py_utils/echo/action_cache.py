@@ -0,0 +1,75 @@
+import copy
+import json
+import threading
+import time
+from collections import OrderedDict
+
+class ActionCache:
+    """_summary_
+    Bounded least recently used cache of agent action results.
+
+    Entries are keyed by agent, action and arguments, and expire after the
+    ttl of the action. Echo removes the entries of an agent when one of its
+    actions that is not cacheable is invoked, as that action may change the
+    data the cached results were read from.
+    """
+    def __init__(self, max_entries=256):
+        """
+        :param max_entries: Maximum number of results to cache
+        """
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(agent_name=None, action_name=None, arguments=None):
+        """Cache key for an action invocation, arguments are compared by their JSON value"""
+        return (agent_name, action_name, json.dumps(arguments, sort_keys=True, default=str))
+
+    def get(self, key):
+        """
+        Look up a cached result
+
+        :return: (True, a copy of the result) on a hit, (False, None) on a miss
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry["expires"] <= time.monotonic():
+                if entry is not None: del self.entries[key]
+                self.misses += 1
+                return False, None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            value = entry["value"]
+        return True, copy.deepcopy(value)
+
+    def put(self, key, value, ttl=60):
+        """Cache a copy of a result for ttl seconds, evicting the least recently used entries"""
+        value = copy.deepcopy(value)
+        with self.lock:
+            self.entries[key] = {"value": value, "expires": time.monotonic() + ttl}
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, agent_name=None):
+        """Remove the cached results of one agent, or all agents"""
+        with self.lock:
+            if agent_name is None:
+                self.entries.clear()
+                return
+            for key in [key for key in self.entries if key[0] == agent_name]:
+                del self.entries[key]
+
+    def get_stats(self):
+        """Number of entries, hits and misses, and the hit rate"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
@@ -14,8 +14,13 @@ class Agent:
             function: Callable[[Any], Any], 
             description: str, 
             arguments_schema: dict, 
-            output_schema: dict):
-        """Registers an action with required metadata and ensures validity."""
+            output_schema: dict,
+            cacheable: bool = False,
+            ttl: float = 60):
+        """
+        Registers an action with required metadata and ensures validity.
+        Results of cacheable (read only) actions are cached by Echo for ttl seconds.
+        """
         if not all([action_name, function, description, arguments_schema, output_schema]):
             raise ValueError("Missing required attributes for action registration")
 
@@ -23,7 +28,9 @@ class Agent:
             "function": function,
             "description": description,
             "arguments_schema": arguments_schema,
-            "output_schema": output_schema
+            "output_schema": output_schema,
+            "cacheable": cacheable,
+            "ttl": ttl
         }
 
     def get_actions(self) -> list:
@@ -0,0 +1,186 @@
+import asyncio
+import datetime
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from stage0_py_utils.config.config import Config
+from stage0_py_utils.echo.message import Message
+from stage0_py_utils.mongo_utils.mongo_io import MongoIO
+
+import logging
+logger = logging.getLogger(__name__)
+
+class CachingLLMClient:
+    """_summary_
+    Response cache that wraps an LLM client with a chat(messages) method.
+
+    Replies are cached by the model, the pinned system messages, and the normalized
+    content of the last_n conversation messages, so a repeated question returns
+    the earlier reply without an inference. Entries expire after ttl seconds, and
+    the least recently used entries are evicted beyond max_entries. With persist,
+    replies are also stored in a MongoDB collection so they survive a restart.
+    Other attributes of the wrapped client are passed through.
+    """
+    FROM_HEADER = re.compile(r"^from:\S+\s+")
+
+    def __init__(self, llm_client=None, last_n=None, ttl=None, max_entries=None, persist=None, collection_name=None):
+        """
+        :param llm_client: The LLM client to wrap
+        :param last_n: Number of conversation messages in the cache key, defaults to config.LLM_CACHE_LAST_N,
+            0 uses the whole conversation
+        :param ttl: Seconds a reply is cached, defaults to config.LLM_CACHE_TTL
+        :param max_entries: Maximum number of replies kept in memory, defaults to config.LLM_CACHE_SIZE
+        :param persist: Store replies in MongoDB, defaults to config.LLM_CACHE_PERSIST
+        :param collection_name: MongoDB collection for persisted replies, defaults to config.LLM_CACHE_COLLECTION_NAME
+        """
+        config = Config.get_instance()
+        self.llm = llm_client
+        self.model = getattr(llm_client, "model", None)
+        self.last_n = config.LLM_CACHE_LAST_N if last_n is None else last_n
+        self.ttl = config.LLM_CACHE_TTL if ttl is None else ttl
+        self.max_entries = config.LLM_CACHE_SIZE if max_entries is None else max_entries
+        self.persist = config.LLM_CACHE_PERSIST if persist is None else persist
+        self.collection_name = collection_name or config.LLM_CACHE_COLLECTION_NAME
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if self.persist: self.create_indexes()
+
+    def __getattr__(self, name):
+        if name == "llm": raise AttributeError(name)
+        return getattr(self.llm, name)
+
+    @staticmethod
+    def normalize(content=""):
+        """Lower case, drop the From: header, collapse white space, and trim trailing punctuation"""
+        content = " ".join(content.lower().split())
+        content = CachingLLMClient.FROM_HEADER.sub("", content)
+        return content.rstrip("?!. ")
+
+    def key(self, messages=None):
+        """Cache key for a prompt, a hash of the model, system messages and the normalized conversation tail"""
+        pinned = [message for message in messages if message["role"] == Message.SYSTEM_ROLE]
+        conversation = [message for message in messages if message["role"] != Message.SYSTEM_ROLE]
+        tail = [[message["role"], self.normalize(message["content"])] for message in conversation[-self.last_n:]]
+        prompt = {
+            "model": self.model,
+            "system": [message["content"] for message in pinned],
+            "tail": tail
+        }
+        return hashlib.sha256(json.dumps(prompt, sort_keys=True).encode()).hexdigest()
+
+    def chat(self, messages: list):
+        """
+        Return the cached reply for the prompt, or call the wrapped client and cache its reply.
+
+        :messages: An array of messages passed to the model.
+        :return: LLM-generated response
+        """
+        key = self.key(messages)
+        reply = self.get(key)
+        if reply is not None: return reply
+
+        response = self.llm.chat(messages=messages)
+        self.put(key, response["message"])
+        return response
+
+    async def chat_stream(self, messages: list):
+        """
+        Streaming version of chat, a cached reply is returned as a single chunk.
+        With persist the MongoDB reads and writes run on a worker thread, so the event loop is not blocked.
+
+        :messages: An array of messages passed to the model.
+        :return: Async generator of response chunks
+        """
+        key = self.key(messages)
+        reply = await asyncio.to_thread(self.get, key) if self.persist else self.get(key)
+        if reply is not None:
+            yield {**reply, "done": True}
+            return
+
+        content = ""
+        role = Message.ASSISTANT_ROLE
+        async for chunk in self.llm.chat_stream(messages=messages):
+            content += chunk["message"]["content"]
+            role = chunk["message"].get("role") or role
+            yield chunk
+        if self.persist: await asyncio.to_thread(self.put, key, {"role": role, "content": content})
+        else: self.put(key, {"role": role, "content": content})
+
+    def get(self, key):
+        """Look up a reply in memory, then in MongoDB, returns None on a miss"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry["expires"] <= time.monotonic():
+                del self.entries[key]
+                entry = None
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return {"message": dict(entry["message"])}
+
+        message = self.load(key) if self.persist else None
+        with self.lock:
+            if message is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        self.remember(key, message)
+        return {"message": dict(message)}
+
+    def put(self, key, message=None):
+        """Cache a reply message"""
+        message = {"role": message["role"], "content": message["content"]}
+        self.remember(key, message)
+        if self.persist: self.save(key, message)
+
+    def remember(self, key, message=None):
+        """Keep a reply in memory, evicting the least recently used replies"""
+        with self.lock:
+            self.entries[key] = {"message": message, "expires": time.monotonic() + self.ttl}
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def load(self, key):
+        """Read an unexpired reply from MongoDB, failures are logged and treated as a miss"""
+        try:
+            now = datetime.datetime.now(datetime.timezone.utc)
+            documents = MongoIO.get_instance().get_documents(self.collection_name, match={"_id": key, "expires_at": {"$gt": now}})
+            return documents[0]["message"] if documents else None
+        except Exception as e:
+            logger.warning(f"LLM cache read failed: {e}")
+            return None
+
+    def save(self, key, message=None):
+        """Write a reply to MongoDB, failures are logged and ignored"""
+        try:
+            expires_at = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=self.ttl)
+            MongoIO.get_instance().update_document(self.collection_name, match={"_id": key},
+                set_data={"model": self.model, "message": message, "expires_at": expires_at},
+                project={"_id": 1}, upsert=True)
+        except Exception as e:
+            logger.warning(f"LLM cache write failed: {e}")
+
+    def create_indexes(self):
+        """Ensure the TTL index that removes expired replies from MongoDB"""
+        indexes = [{"name": "expires_at", "key": [("expires_at", 1)], "expireAfterSeconds": 0}]
+        try:
+            return MongoIO.get_instance().ensure_indexes(self.collection_name, indexes)
+        except Exception as e:
+            logger.warning(f"LLM cache index creation failed: {e}")
+
+    def get_stats(self):
+        """Number of cached replies, hits and misses, and the hit rate"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
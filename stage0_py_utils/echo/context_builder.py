@@ -0,0 +1,67 @@
+from stage0_py_utils.config.config import Config
+from stage0_py_utils.echo.message import Message
+
+import logging
+logger = logging.getLogger(__name__)
+
+class ContextBuilder:
+    """_summary_
+    Assembles the messages sent to the LLM so that they fit in a token budget.
+    Pinned (system role) messages such as a personality are always kept, and the
+    rest of the budget is filled with the most recent messages of the conversation.
+
+    Older messages are dropped trim_step at a time, so the start of the context stays 
+    the same for several turns and the LLM server can reuse its evaluation of the prompt.
+    Steps are counted from the first message given, conversation windows from 
+    ConversationServices start on a LLM_CONTEXT_TRIM_STEP boundary so the steps stay 
+    anchored to the conversation as the window moves.
+    """
+    MESSAGE_OVERHEAD = 4  # Tokens used by the chat template around each message
+
+    def __init__(self, model=None, token_budget=None, tokenizer=None, trim_step=None):
+        """
+        :param model: Model name, used to find the budget in config.LLM_MODEL_TOKEN_BUDGETS
+        :param token_budget: Number of tokens to fill, defaults to the model budget or config.LLM_TOKEN_BUDGET
+        :param tokenizer: Function that returns the number of tokens in a string, defaults to approximate_tokens
+        :param trim_step: Number of messages dropped together when the conversation is over the budget, 
+            defaults to config.LLM_CONTEXT_TRIM_STEP
+        """
+        config = Config.get_instance()
+        self.token_budget = token_budget or config.LLM_MODEL_TOKEN_BUDGETS.get(model, config.LLM_TOKEN_BUDGET)
+        self.tokenizer = tokenizer or ContextBuilder.approximate_tokens
+        self.trim_step = max(1, trim_step or config.LLM_CONTEXT_TRIM_STEP)
+
+    @staticmethod
+    def approximate_tokens(text=""):
+        """Fast token estimate, about four characters per token for English text"""
+        return len(text) // 4 + 1
+
+    def count_tokens(self, message=None):
+        """Number of tokens a message uses in the prompt"""
+        return self.tokenizer(message["content"]) + self.MESSAGE_OVERHEAD
+
+    def build(self, messages=None):
+        """
+        Select the messages to send to the LLM
+
+        :param messages: The conversation messages, oldest first
+        :return: The pinned messages followed by the most recent messages that fit the budget. 
+            The latest message is always included, even if it is over the budget by itself.
+        """
+        pinned = [message for message in messages if message["role"] == Message.SYSTEM_ROLE]
+        remaining = self.token_budget - sum(self.count_tokens(message) for message in pinned)
+        conversation = [message for message in messages if message["role"] != Message.SYSTEM_ROLE]
+        tokens = [self.count_tokens(message) for message in conversation]
+
+        # Drop the oldest messages until the rest fit, rounded up to a whole trim_step
+        start = 0
+        total = sum(tokens)
+        while start < len(conversation) - 1 and total > remaining:
+            total -= tokens[start]
+            start += 1
+        if start:
+            start = min(-(-start // self.trim_step) * self.trim_step, len(conversation) - 1)
+            total = sum(tokens[start:])
+
+        if total > remaining: logger.warning(f"Context is {total - remaining} tokens over the budget of {self.token_budget}")
+        return pinned + conversation[start:]
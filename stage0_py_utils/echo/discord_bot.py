@@ -1,6 +1,10 @@
+import asyncio
 import discord
+import functools
 import json
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from stage0_py_utils.config.config import Config
 from stage0_py_utils.echo.message import Message
 
 logger = logging.getLogger(__name__)
@@ -12,13 +16,22 @@ class DiscordBot(discord.Client):
     and implements the channel join/leave logic. It uses the LLM handle_message_function 
     to process any messages that are not join/leave messages.
     """
-    def __init__(self, handle_command_function=None, handle_message_function=None,  bot_id=None, **kwargs):
+    BUSY_REPLY = "⏳ I'm still working on earlier messages in this channel, try again in a moment."
+    STREAM_EDIT_INTERVAL = 1.0  # Seconds between edits of a streaming reply, Discord rate limits message edits
+
+    def __init__(self, handle_command_function=None, handle_message_function=None,  bot_id=None, invoke_function=None, max_workers=None, max_queue_depth=None, stream_message_function=None, **kwargs):
         """
         Initializes the Discord bot 
 
         :param handle_command_function: Function used to execute an agent action.
         :param handle_message_function: Function used to ask the LLM to handle a message
         :param bot_id: Unique Identifier of the Bot Record in the stage0 system.
+        :param invoke_function: Function used to invoke an agent action directly. 
+            Defaults to sending a command with the handle_command_function.
+        :param max_workers: Number of worker threads processing messages, defaults to config.DISCORD_MAX_WORKERS
+        :param max_queue_depth: Number of messages queued for a channel before replying busy, defaults to config.DISCORD_MAX_QUEUE_DEPTH
+        :param stream_message_function: Async generator function used to stream the LLM reply to a message, 
+            when provided chat replies are sent as they stream and edited as they grow. 
         """
         intents = kwargs.pop("intents", discord.Intents.default())
         intents.messages = True
@@ -29,8 +42,17 @@ class DiscordBot(discord.Client):
         super().__init__(intents=intents, **kwargs)
         self.handle_command = handle_command_function
         self.handle_message = handle_message_function
+        self.invoke_function = invoke_function
+        self.stream_message = stream_message_function
         self.bot_id = bot_id
         self.active_channels = []  
+        self.channel_queues = {}
+        self.channel_workers = {}
+        self.max_queue_depth = max_queue_depth or Config.get_instance().DISCORD_MAX_QUEUE_DEPTH
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or Config.get_instance().DISCORD_MAX_WORKERS, 
+            thread_name_prefix="discord-bot"
+        )
 
     async def on_ready(self):
         """
@@ -39,8 +61,7 @@ class DiscordBot(discord.Client):
         """
         logger.info(f"Logged in as {self.user}")
         try:
-            arguments = json.dumps(self.bot_id, separators=(',', ':'))
-            self.active_channels = self.handle_command(f"/bot/get_channels/{arguments}")
+            self.active_channels = self.invoke("bot", "get_channels", self.bot_id)
             logger.info(f"Initialized active channels: {self.active_channels}")
         except Exception as e:
             logger.warning(f"Failed to initialize active channels: {e}")
@@ -48,8 +69,11 @@ class DiscordBot(discord.Client):
     async def on_message(self, message):
         """
         Processes incoming messages from Discord. 
-        Handles all join/leave logic
-        Passes messages to the LLM handle_message_function
+        Messages are added to a per-channel queue, and processed one turn at a time 
+        in the order they arrived, on the worker thread pool so that Mongo and LLM 
+        calls never block the event loop. Chat messages that arrive while a turn is 
+        in progress are coalesced into a single follow-up turn, and messages beyond 
+        the max_queue_depth get a busy reply.
         """
         logger.debug(f"Got a message!")
         if message.author == self.user:
@@ -64,63 +88,188 @@ class DiscordBot(discord.Client):
         if not content: logger.warning(f"Content is None")
         logger.debug(f"Processing message for: {username}-{user_id}: channel: {channel} content: {content}")
 
-        response = ""
-        try:
-            # Always Join DM channels if they are not already active
-            if message.guild is None and channel not in self.active_channels:
-                logger.debug(f"Joining DM Channel {channel}")
-                response = self.update_active_channels(action="add_channel", channel=channel)
-                await message.channel.send(response)                
-                
-            # Leave Channels when requested
-            if self.user in message.mentions and "leave" in content.lower():
-                logger.debug(f"Leaving Channel {channel}")
-                response = self.update_active_channels(action="remove_channel", channel=channel)
-                
-            # Reset the Channels conversation when requested
-            elif self.user in message.mentions and "reset" in content.lower():
-                logger.debug(f"Resetting Channel Conversation {channel}")
-                response = self.reset_channel_conversation(channel=channel)
-                
-            # Load a named conversation into this Channels conversation when requested
-            elif self.user in message.mentions and "load" in content.lower():
-                name = content.split()[-1] 
-                logger.debug(f"Loading Conversation {name} Conversation {channel}")
-                response = self.load_named_channel(channel=channel, named_conversation=name)
-                
-            # Join Channels when requested
-            elif self.user in message.mentions and "join" in content.lower():
-                logger.debug(f"Joining Channel {channel}")
-                response = self.update_active_channels(action="add_channel", channel=channel)
-
-            # Process Message if from an active channel            
-            elif channel in self.active_channels:
-                logger.debug(f"Getting LLM Response in {channel}")
-                response = self.handle_message(channel=channel, user=username, role=Message.USER_ROLE, dialog=Message.GROUP_DIALOG, text=content)
-                
-            # Send the reply message
-            logger.debug(f"Sending response {response}.")
-            response = response.strip()
-            if len(response) > 2000:
-                response = f"{response[:1950]}-TRUNCATED"
-                
-            if len(response) > 0:
-                await message.channel.send(response)
+        is_mentioned = self.user in message.mentions
+        queue = self.channel_queues.setdefault(channel, [])
+        if len(queue) >= self.max_queue_depth:
+            logger.info(f"Channel {channel} is busy, {len(queue)} messages are queued")
+            await message.channel.send(self.BUSY_REPLY)
+            return
+
+        item = {
+            "message": message,
+            "username": username,
+            "content": content,
+            "is_direct": message.guild is None,
+            "is_mentioned": is_mentioned,
+            "is_chat": not is_mentioned and not (content or "").startswith("/"),
+            "done": asyncio.get_running_loop().create_future()
+        }
+        queue.append(item)
+        if channel not in self.channel_workers:
+            self.channel_workers[channel] = asyncio.create_task(self.process_channel(channel))
 
+        try:
+            await item["done"]
             logger.debug(f"on_message processing complete {content}.")
             return
-
         except Exception as e:
             logger.warning(f"Echo bot On-Message Error: {e}, username: {username} user_id: {user_id}: channel: {channel} content: {content}")
             raise e
 
+    async def process_channel(self, channel=None):
+        """
+        Process the queued messages for a channel, one turn at a time, until the queue is empty.
+        """
+        queue = self.channel_queues[channel]
+        loop = asyncio.get_running_loop()
+        batch = []
+        try:
+            while queue:
+                batch = [queue.pop(0)]
+                while batch[0]["is_chat"] and queue and queue[0]["is_chat"]:
+                    batch.append(queue.pop(0))
+                if len(batch) > 1: logger.debug(f"Coalesced {len(batch)} messages in {channel}")
+
+                last = batch[-1]
+                try:
+                    if self.stream_message and last["is_chat"] and channel in self.active_channels:
+                        await self.stream_reply(channel=channel, batch=batch)
+                    else:
+                        responses = await loop.run_in_executor(self.executor, functools.partial(
+                            self.process_message, channel=channel, username=last["username"], content=last["content"],
+                            is_direct=last["is_direct"], is_mentioned=last["is_mentioned"],
+                            earlier_messages=[(item["username"], item["content"]) for item in batch[:-1]]
+                        ))
+
+                        # Send the reply messages
+                        for response in responses:
+                            logger.debug(f"Sending response {response}.")
+                            response = self.format_response(response)
+                            if len(response) > 0:
+                                await last["message"].channel.send(response)
+
+                    # The on_message task of an item may have been cancelled while it waited
+                    for item in batch:
+                        if not item["done"].done(): item["done"].set_result(None)
+                except Exception as e:
+                    for item in batch:
+                        if not item["done"].done(): item["done"].set_exception(e)
+        except BaseException as e:
+            # The worker stopped, fail the messages it will not process so they do not wait forever
+            for item in batch + queue:
+                if item["done"].done(): continue
+                if isinstance(e, asyncio.CancelledError): item["done"].cancel()
+                else: item["done"].set_exception(e)
+            queue.clear()
+            raise
+        finally:
+            del self.channel_workers[channel]
+            if not queue: del self.channel_queues[channel]
+
+    async def stream_reply(self, channel=None, batch=None):
+        """
+        Add any coalesced messages to the conversation, then send the LLM reply 
+        as it streams in, editing the Discord message at most every STREAM_EDIT_INTERVAL seconds.
+        """
+        loop = asyncio.get_running_loop()
+        last = batch[-1]
+        for item in batch[:-1]:
+            await loop.run_in_executor(self.executor, functools.partial(
+                self.post_message, channel=channel, username=item["username"], content=item["content"]))
+
+        logger.debug(f"Streaming LLM Response in {channel}")
+        reply = None
+        sent = ""
+        response = ""
+        edited_at = 0
+        async for text in self.stream_message(channel=channel, user=last["username"], role=Message.USER_ROLE, dialog=Message.GROUP_DIALOG, text=last["content"]):
+            response = self.format_response(text)
+            if len(response) == 0 or response == sent: continue
+            if reply is None:
+                reply = await last["message"].channel.send(response)
+            elif loop.time() - edited_at < self.STREAM_EDIT_INTERVAL:
+                continue
+            else:
+                await reply.edit(content=response)
+            sent = response
+            edited_at = loop.time()
+
+        # Make sure the complete reply is shown
+        if reply is not None and response != sent:
+            await reply.edit(content=response)
+
+    def format_response(self, response=None):
+        """Trim a reply to fit in a Discord message"""
+        response = response.strip()
+        if len(response) > 2000:
+            response = f"{response[:1950]}-TRUNCATED"
+        return response
+
+    def process_message(self, channel=None, username=None, content=None, is_direct=False, is_mentioned=False, earlier_messages=None):
+        """
+        Handles all join/leave logic
+        Passes messages to the LLM handle_message_function
+        Runs on a worker thread, and returns the list of replies to send to the channel
+
+        :param earlier_messages: (username, content) of coalesced chat messages, 
+            added to the conversation before the LLM is asked to reply to this message.
+        """
+        responses = []
+
+        # Always Join DM channels if they are not already active
+        if is_direct and channel not in self.active_channels:
+            logger.debug(f"Joining DM Channel {channel}")
+            responses.append(self.update_active_channels(action="add_channel", channel=channel))
+            
+        # Leave Channels when requested
+        if is_mentioned and "leave" in content.lower():
+            logger.debug(f"Leaving Channel {channel}")
+            responses.append(self.update_active_channels(action="remove_channel", channel=channel))
+            
+        # Reset the Channels conversation when requested
+        elif is_mentioned and "reset" in content.lower():
+            logger.debug(f"Resetting Channel Conversation {channel}")
+            responses.append(self.reset_channel_conversation(channel=channel))
+            
+        # Load a named conversation into this Channels conversation when requested
+        elif is_mentioned and "load" in content.lower():
+            name = content.split()[-1] 
+            logger.debug(f"Loading Conversation {name} Conversation {channel}")
+            responses.append(self.load_named_channel(channel=channel, named_conversation=name))
+            
+        # Join Channels when requested
+        elif is_mentioned and "join" in content.lower():
+            logger.debug(f"Joining Channel {channel}")
+            responses.append(self.update_active_channels(action="add_channel", channel=channel))
+
+        # Process Message if from an active channel            
+        elif channel in self.active_channels:
+            for earlier_username, earlier_content in earlier_messages or []:
+                self.post_message(channel=channel, username=earlier_username, content=earlier_content)
+            logger.debug(f"Getting LLM Response in {channel}")
+            responses.append(self.handle_message(channel=channel, user=username, role=Message.USER_ROLE, dialog=Message.GROUP_DIALOG, text=content))
+
+        return responses
+
+    def post_message(self, channel=None, username=None, content=None):
+        """
+        Add a chat message to the conversation without asking the LLM for a reply
+        """
+        message = Message(encoded_text=content, role=Message.USER_ROLE, user=username, dialog=Message.GROUP_DIALOG)
+        self.invoke("conversation", "add_message", {"channel_id": channel, "message": message.as_llm_message()})
+
+    async def close(self):
+        """Close the Discord connection, then stop the worker thread pool"""
+        await super().close()
+        self.executor.shutdown(wait=False)
+
     def update_active_channels(self, action=None, channel=None):
         """
         Updates the list of active channels using the bot_agent actions.
         """
         try:
-            arguments = json.dumps({"bot_id": self.bot_id,"channel_id": channel}, separators=(',', ':'))
-            channels =  self.handle_command(f"/bot/{action}/{arguments}")
+            arguments = {"bot_id": self.bot_id, "channel_id": channel}
+            channels = self.invoke("bot", action, arguments)
             if isinstance(channels, list):
                 self.active_channels = channels
                 return f"✅ Channel: {channel} {'added to' if action == 'add_channel' else 'removed from'} active channels list."
@@ -135,7 +284,7 @@ class DiscordBot(discord.Client):
         Calls the channel reset agent action
         """
         try:
-            conversation =  self.handle_command(f'/conversation/reset_conversation/"{channel}"')
+            conversation = self.invoke("conversation", "reset_conversation", channel)
             if isinstance(conversation, dict):
                 return f"✅ The conversation in channel: {channel} has been reset."
             else:
@@ -149,11 +298,11 @@ class DiscordBot(discord.Client):
         Calls the load_personality agent action
         """
         try:
-            arguments = json.dumps({
+            arguments = {
                 "channel_id": channel,
                 "named_conversation": named_conversation
-            }, separators=(',', ':'))
-            conversation =  self.handle_command(f'/conversation/load_personality/{arguments}')
+            }
+            conversation = self.invoke("conversation", "load_personality", arguments)
             if isinstance(conversation, dict):
                 return f"✅ The {named_conversation} personality has been loaded into this conversation. ({channel})"
             else:
@@ -161,3 +310,12 @@ class DiscordBot(discord.Client):
                 return f"❎ Something went wrong, Try again later"
         except Exception as e:
             raise Exception(f"Failed to reset a conversation: {e}")
+
+    def invoke(self, agent_name=None, action_name=None, arguments=None):
+        """
+        Invokes an agent action, directly when an invoke_function was 
+        provided, otherwise as a handle_command command.
+        """
+        if self.invoke_function:
+            return self.invoke_function(agent_name, action_name, arguments)
+        return self.handle_command(f"/{agent_name}/{action_name}/{json.dumps(arguments, separators=(',', ':'))}")
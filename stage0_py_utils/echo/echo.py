@@ -1,10 +1,15 @@
 import asyncio
 import json
 import re
+from stage0_py_utils.config.config import Config
+from stage0_py_utils.echo.action_cache import ActionCache
 from stage0_py_utils.echo.agent import Agent
+from stage0_py_utils.echo.caching_llm_client import CachingLLMClient
 from stage0_py_utils.echo.discord_bot import DiscordBot
 from stage0_py_utils.echo.llm_handler import LLMHandler
 from stage0_py_utils.echo.ollama_llm_client import OllamaLLMClient
+from stage0_py_utils.echo.ollama_router_client import OllamaRouterClient
+from stage0_py_utils.echo.pooled_llm_client import PooledLLMClient
 
 import logging
 logger = logging.getLogger(__name__)
@@ -16,6 +21,7 @@ class Echo:
     Agents register their actions with Echo, and Echo
     implements the handle_command function used in
     those classes to execute agent/actions.
+    Results of cacheable actions are kept in an ActionCache.
     """
     ECHO_AGENT_COMMAND_PATTERN = re.compile(r"^/([^/]+)/([^/]+)(?:/(.*))?$")
     
@@ -24,7 +30,15 @@ class Echo:
         self.name = name
         self.model = model
         self.agents = {}        
+        self.action_cache = ActionCache(max_entries=Config.get_instance().ECHO_CACHE_SIZE)
+        if client is None and Config.get_instance().OLLAMA_HOSTS:
+            client = OllamaRouterClient(model=model)
         self.llm_client = client or OllamaLLMClient(model=model)
+        can_stream = hasattr(self.llm_client, "chat_stream")
+        if Config.get_instance().LLM_MAX_IN_FLIGHT > 0:
+            self.llm_client = PooledLLMClient(llm_client=self.llm_client)
+        if Config.get_instance().LLM_CACHE:
+            self.llm_client = CachingLLMClient(llm_client=self.llm_client)
 
         # Register default agents
         from stage0_py_utils.agents.bot_agent import create_bot_agent
@@ -38,12 +52,15 @@ class Echo:
         self.llm_handler = LLMHandler(
             echo_bot_name=self.name,
             handle_command_function=self.handle_command, 
+            invoke_function=self.invoke,
             llm_client=self.llm_client
         )
         # Initialize Discord Chatbot
         self.bot = DiscordBot(
             handle_command_function=self.handle_command, 
             handle_message_function=self.llm_handler.handle_message,
+            invoke_function=self.invoke,
+            stream_message_function=self.llm_handler.stream_message if can_stream else None,
             bot_id=bot_id
         )
         
@@ -63,7 +80,11 @@ class Echo:
         """
         Gracefully shut down the Discord bot, and handle the 
         asynchronous nature of Client.close() without hanging.
+        Cached conversation messages are written to the database first.
         """
+        from stage0_py_utils.services.conversation_services import ConversationServices
+        ConversationServices.close_cache()
+
         logger.info("Closing Discord Bot connection...")
 
         try:
@@ -85,6 +106,7 @@ class Echo:
         if not isinstance(agent, Agent): 
             raise Exception(f"can not register agent without actions: {agent}")
         self.agents[agent.name] = agent
+        self.action_cache.invalidate()
 
     def get_agents(self):
         """Returns a list of registered agent names."""
@@ -160,6 +182,16 @@ class Echo:
         except Exception as e:
             return f"Invalid Command Format {e}"
 
+        return self.invoke(agent_name, action_name, arguments)
+
+    def invoke(self, agent_name: str, action_name: str, arguments=None):
+        """
+        Invokes an agent action directly with python arguments.
+        - Used in-process by the LLM handler and Discord bot, without the 
+          JSON encoding and parsing of a /agent/action/arguments command.
+        - Returns the response from the agent.
+        - If invalid, returns an error message.
+        """
         if agent_name not in self.agents:
             logger.debug(f"Agent {agent_name} not found")
             return f"Unknown Agent {agent_name}. Available agents are: {self.agents.keys}"
@@ -170,5 +202,16 @@ class Echo:
             available_actions = ", ".join(agent.get_actions())
             return f"Unknown action '{action_name}'. Available actions: {available_actions}"
 
-        output  = agent.invoke_action(action_name, arguments)
+        action = agent.actions[action_name]
+        if not action.get("cacheable"):
+            # The action may change what cached actions of this agent read
+            self.action_cache.invalidate(agent_name)
+            return agent.invoke_action(action_name, arguments)
+
+        key = ActionCache.key(agent_name, action_name, arguments)
+        hit, output = self.action_cache.get(key)
+        if hit: return output
+
+        output = agent.invoke_action(action_name, arguments)
+        if output != "error": self.action_cache.put(key, output, ttl=action["ttl"])
         return output
@@ -1,8 +1,13 @@
+import asyncio
 import re
 import json
+import time
 import datetime
 
 from bson import ObjectId
+from stage0_py_utils.config.config import Config
+from stage0_py_utils.echo.context_builder import ContextBuilder
+from stage0_py_utils.echo.pooled_llm_client import llm_channel
 from stage0_py_utils.echo.message import Message
 
 import logging
@@ -15,16 +20,24 @@ class LLMHandler:
     the Chat Engine. It persists the conversation using the 
     /conversation/add_message Agent Action
     """
-    def __init__(self, echo_bot_name="Echo", handle_command_function=None, llm_client=None):
+    def __init__(self, echo_bot_name="Echo", handle_command_function=None, llm_client=None, invoke_function=None, context_builder=None, max_tool_hops=None):
         """
         Initializes LLMHandler with an Echo agent framework and an LLM client.
 
-        :param handle_command_function: Echo handle command function
+        :param handle_command_function: Echo handle command function, used for agent calls in messages
         :param llm_client: Instance of LLMClient for LLM chat processing. (ollama_llm_client)
+        :param invoke_function: Echo invoke function, used for internal agent calls. 
+            Defaults to sending a command with the handle_command_function.
+        :param context_builder: ContextBuilder that fits the conversation into the model token budget. 
+            Defaults to a ContextBuilder for the llm_client model.
+        :param max_tool_hops: Maximum number of LLM tool calls in one turn, defaults to config.LLM_MAX_TOOL_HOPS
         """
         self.llm = llm_client
         self.echo_bot_name = echo_bot_name
         self.handle_command = handle_command_function
+        self.invoke_function = invoke_function
+        self.context = context_builder or ContextBuilder(model=getattr(llm_client, "model", None))
+        self.max_tool_hops = Config.get_instance().LLM_MAX_TOOL_HOPS if max_tool_hops is None else max_tool_hops
         self.agent_command_pattern = re.compile(r"^/(\S+)/(\S+)(?:/(.*))?$")
 
     def handle_message(self, channel=None, text=None, user="unknown", role=Message.USER_ROLE, dialog=Message.GROUP_DIALOG ):
@@ -40,6 +53,129 @@ class LLMHandler:
         :return: The response to be written to the chat-channel. 
         """
         
+        # Step 1 & 2: Add the user message to the conversation, and process agent calls
+        messages, agent_reply_string = self.add_user_message(channel=channel, text=text, user=user, role=role, dialog=dialog)
+        if agent_reply_string is not None: return agent_reply_string
+
+        # Step 3: Call the LLM, and process tool calls until it replies on another dialog
+        llm_channel.set(channel)
+        turn_messages = []
+        hop_timings = []
+        while True:
+            started = time.perf_counter()
+            logger.debug(f"LLM Chat Prompt: {(messages + turn_messages)[-1]['content']}")
+            llm_reply = self.llm.chat(messages=self.context.build(messages + turn_messages))
+            logger.debug(f"LLM Reply Object: {llm_reply}")
+            chat_reply = Message(llm_message=llm_reply["message"], user=self.echo_bot_name)
+            logger.debug(f"LLM Chat Reply: {chat_reply.role}-{chat_reply.text[:49].strip()}...")
+            llm_ms = (time.perf_counter() - started) * 1000
+            if chat_reply.dialog != Message.TOOLS_DIALOG: break
+
+            # Step 4: Process the tool call, unless the hop limit has been reached
+            if len(hop_timings) >= self.max_tool_hops:
+                chat_reply = self.tool_limit_reply(len(hop_timings))
+                break
+            turn_messages.extend(self.call_tool(chat_reply))
+            hop_timings.append(self.hop_timing(len(hop_timings) + 1, chat_reply, llm_ms, started))
+        self.log_turn(channel, hop_timings, llm_ms)
+
+        # Step 5: Add this turns messages to the conversation in one batch, and return the reply
+        logger.debug(f"Posting LLM response message to chat: {chat_reply.text}")
+        turn_messages.append(chat_reply.as_llm_message())
+        self.post_messages(channel=channel, messages=turn_messages)
+        return chat_reply.text
+
+    async def stream_message(self, channel=None, text=None, user="unknown", role=Message.USER_ROLE, dialog=Message.GROUP_DIALOG):
+        """
+        Streaming version of handle_message, for LLM clients with a chat_stream method. 
+        Conversation updates and agent calls run on a worker thread, so the event loop is not blocked.
+
+        :return: Async generator of the reply text received so far, starting as soon as the 
+            first tokens arrive. Replies on the tools dialog are processed, not yielded. 
+        """
+        messages, agent_reply_string = await asyncio.to_thread(
+            self.add_user_message, channel=channel, text=text, user=user, role=role, dialog=dialog)
+        if agent_reply_string is not None: 
+            yield agent_reply_string
+            return
+
+        llm_channel.set(channel)
+        turn_messages = []
+        hop_timings = []
+        while True:
+            # Stream the LLM reply, once the From: To: header has arrived the dialog is known
+            started = time.perf_counter()
+            content = ""
+            async for chunk in self.llm.chat_stream(messages=self.context.build(messages + turn_messages)):
+                content += chunk["message"]["content"]
+                if content.count(" ") < 2 and "From:".startswith(content[:5]): continue
+                partial_reply = Message(llm_message={"role": Message.ASSISTANT_ROLE, "content": content}, user=self.echo_bot_name)
+                if partial_reply.dialog != Message.TOOLS_DIALOG and partial_reply.text:
+                    yield partial_reply.text
+
+            chat_reply = Message(llm_message={"role": Message.ASSISTANT_ROLE, "content": content}, user=self.echo_bot_name)
+            logger.debug(f"LLM Chat Reply: {chat_reply.role}-{chat_reply.text[:49].strip()}...")
+            llm_ms = (time.perf_counter() - started) * 1000
+            if chat_reply.dialog != Message.TOOLS_DIALOG: break
+
+            # Process the tool call, unless the hop limit has been reached
+            if len(hop_timings) >= self.max_tool_hops:
+                chat_reply = self.tool_limit_reply(len(hop_timings))
+                break
+            turn_messages.extend(await asyncio.to_thread(self.call_tool, chat_reply))
+            hop_timings.append(self.hop_timing(len(hop_timings) + 1, chat_reply, llm_ms, started))
+        self.log_turn(channel, hop_timings, llm_ms)
+
+        turn_messages.append(chat_reply.as_llm_message())
+        await asyncio.to_thread(self.post_messages, channel=channel, messages=turn_messages)
+        yield chat_reply.text
+
+    def call_tool(self, tool_message=None):
+        """
+        Process a message the LLM sent on the tools dialog, invoking the requested agent/action.
+
+        :param tool_message: The LLM Message on the tools dialog
+        :return: The tool call message, and the agent reply message if it was an agent call
+        """
+        messages = [tool_message.as_llm_message()]
+        match = self.agent_command_pattern.match(tool_message.text)
+        if match:
+            agent = match.group(1)
+            agent_reply = self.handle_command(tool_message.text)
+            agent_reply_message = Message(user=agent, role=Message.USER_ROLE, dialog=tool_message.dialog, text=self.stringify(agent_reply))
+            messages.append(agent_reply_message.as_llm_message())
+        return messages
+
+    def tool_limit_reply(self, hops=0):
+        """The reply used when the LLM is still calling tools after max_tool_hops"""
+        logger.warning(f"LLM tool call limit of {self.max_tool_hops} reached")
+        return Message(user=self.echo_bot_name, role=Message.ASSISTANT_ROLE, dialog=Message.GROUP_DIALOG, 
+                       text=f"I stopped after {hops} tool calls without finding an answer.")
+
+    def hop_timing(self, hop=0, tool_message=None, llm_ms=0, started=0):
+        """Timing of one LLM tool call hop, the tool time includes the agent action"""
+        return {
+            "hop": hop,
+            "command": tool_message.text[:60],
+            "llm_ms": round(llm_ms, 1),
+            "tool_ms": round((time.perf_counter() - started) * 1000 - llm_ms, 1)
+        }
+
+    def log_turn(self, channel=None, hop_timings=None, llm_ms=0):
+        """Log the per-hop timing of a turn that used tools"""
+        for timing in hop_timings:
+            logger.info(f"Tool hop {timing['hop']} in {channel}: llm {timing['llm_ms']}ms, tool {timing['tool_ms']}ms, {timing['command']}")
+        if hop_timings:
+            logger.info(f"Turn in {channel} used {len(hop_timings)} tool hops, final llm {round(llm_ms, 1)}ms")
+
+    def add_user_message(self, channel=None, text=None, user="unknown", role=Message.USER_ROLE, dialog=Message.GROUP_DIALOG):
+        """
+        Add an incoming message to the conversation, and if it is an agent call, 
+        invoke the agent action and add its reply to the conversation.
+
+        :return: The conversation messages, and the agent reply if it should be 
+            returned to the group instead of calling the LLM (otherwise None)
+        """
         # Step 1: Add the user message to the conversation
         logger.debug(f"Posting Message {text}")
         message = Message(encoded_text=text, role=role, user=user, dialog=dialog)
@@ -54,24 +190,8 @@ class LLMHandler:
             message = Message(user=agent, role=Message.USER_ROLE, dialog=dialog, text=agent_reply_string)
             messages = self.post_message(channel=channel, message=message)
             # If this was a direct user to agent call, return the reply to the group.
-            if dialog == Message.GROUP_DIALOG: return agent_reply_string
-
-        # Step 3: Call the LLM with updated conversation history
-        logger.debug(f"LLM Chat Prompt: {messages[len(messages)-1]['content']}")
-        llm_reply = self.llm.chat(messages=messages)
-        logger.debug(f"LLM Reply Object: {llm_reply}")
-        chat_reply = Message(llm_message=llm_reply["message"], user=self.echo_bot_name)
-        logger.debug(f"LLM Chat Reply: {chat_reply.role}-{chat_reply.text[:49].strip()}...")
-
-        # Step 4: Process LLM response recursively if it's an tool message
-        if chat_reply.dialog == Message.TOOLS_DIALOG:
-            logger.debug(f"Process LLM response recursively {chat_reply.text}")
-            return self.handle_message(channel=channel, user=chat_reply.user, role=chat_reply.role, text=chat_reply.text, dialog=chat_reply.dialog)
-
-        # Step 6: Add LLM response to conversation and return it
-        logger.debug(f"Posting LLM response message to chat: {chat_reply.text}")
-        self.post_message(channel=channel, message=chat_reply)
-        return chat_reply.text
+            if dialog == Message.GROUP_DIALOG: return messages, agent_reply_string
+        return messages, None
 
     def post_message(self, channel=None, message=None):
         """
@@ -82,12 +202,30 @@ class LLMHandler:
         :param message: a Echo Message object
         :return: The full conversation (list of messages)
         """
-        arguments = json.dumps({"channel_id": channel, "message":message.as_llm_message()}, separators=(',', ':'))
-        command = f"/conversation/add_message/{arguments}"
-        logger.debug(f"Sending the command: {command}")
-        conversation = self.handle_command(command)
+        conversation = self.invoke("conversation", "add_message", {"channel_id": channel, "message": message.as_llm_message()})
         return conversation if isinstance(conversation, list) else []
 
+    def invoke(self, agent_name=None, action_name=None, arguments=None):
+        """
+        Helper function to invoke an agent action, directly when an
+        invoke_function was provided, otherwise as a handle_command command.
+        """
+        if self.invoke_function:
+            return self.invoke_function(agent_name, action_name, arguments)
+        command = f"/{agent_name}/{action_name}/{json.dumps(arguments, separators=(',', ':'))}"
+        logger.debug(f"Sending the command: {command}")
+        return self.handle_command(command)
+
+    def post_messages(self, channel=None, messages=None):
+        """
+        Helper function to add a batch of messages to the conversation in one write
+        Uses the /conversation/add_messages agent action
+        
+        :param channel: The channel_id for the conversation
+        :param messages: a list of LLM messages (role, content)
+        """
+        return self.invoke("conversation", "add_messages", {"channel_id": channel, "messages": messages})
+
     def stringify(self, obj):
         """Recursively convert ObjectId and datetime values to strings, then minify JSON."""
         def stringify_mongo_objects(obj):
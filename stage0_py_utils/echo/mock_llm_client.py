@@ -1,15 +1,19 @@
+import asyncio
 import random
 
 class MockLLMClient:
     """_summary_
     Mock Client for Testing 
     """
-    def __init__(self, base_url=None, model=None):
+    def __init__(self, base_url=None, model=None, token_delay=0):
         """
         Initializes the LLMClient list of possible replies
+
+        :param token_delay: Seconds to wait before each streamed token, to simulate generation time.
         """
         self.model = model
         self.base_url = base_url
+        self.token_delay = token_delay
         self.replies = [
             {"message": {"role": "assistant", "content": "group:Scant seconds later I hear the boss's phone ringing. I'll give the boss"}},
             {"message": {"role": "assistant", "content": "tools:/chain/get_chains"}},
@@ -26,3 +30,24 @@ class MockLLMClient:
         Get a random reply
         """
         return random.choice(self.replies)
+
+    async def async_chat(self, messages: list):
+        """
+        Get a random reply, after the time it would take to stream it
+        """
+        reply = self.chat(messages=messages)
+        await asyncio.sleep(self.token_delay * len(reply["message"]["content"].split(" ")))
+        return reply
+
+    async def chat_stream(self, messages: list):
+        """
+        Stream a random reply one word at a time, waiting token_delay seconds before each word
+        """
+        reply = self.chat(messages=messages)
+        role = reply["message"]["role"]
+        words = reply["message"]["content"].split(" ")
+        for index, word in enumerate(words):
+            await asyncio.sleep(self.token_delay)
+            token = word if index == len(words) - 1 else f"{word} "
+            yield {"message": {"role": role, "content": token}, "done": False}
+        yield {"message": {"role": role, "content": ""}, "done": True}
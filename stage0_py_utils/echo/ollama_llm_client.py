@@ -1,26 +1,114 @@
+import threading
 import ollama
+from stage0_py_utils.config.config import Config
+
+import logging
+logger = logging.getLogger(__name__)
 
 class OllamaLLMClient:
     """_summary_
     Wrapper for the ollama Library for chat function
+
+    The model is kept loaded for keep_alive, so the server can reuse the evaluated
+    prompt of the last request when the next request starts with the same messages.
+    Each response's prompt evaluation metrics are recorded, see get_stats.
     """
-    def __init__(self, base_url="http://localhost:11434", model="llama3.2:latest"):
+    def __init__(self, base_url="http://localhost:11434", model="llama3.2:latest", keep_alive=None, num_ctx=None, num_predict=None):
         """
         Initializes the LLMClient to communicate with an Ollama server.
-        
+
         :param base_url: URL of the Ollama API server.
         :param model: Default model to use.
+        :param keep_alive: How long the server keeps the model loaded, defaults to config.OLLAMA_KEEP_ALIVE
+        :param num_ctx: Context window size, defaults to config.OLLAMA_NUM_CTX, 0 uses the server default
+        :param num_predict: Maximum tokens to generate, defaults to config.OLLAMA_NUM_PREDICT, 0 uses the server default
         """
+        config = Config.get_instance()
         self.base_url = base_url
         self.model = model
         self.ollama_client = ollama.Client(host=base_url)
+        self.async_client = ollama.AsyncClient(host=base_url)
+
+        keep_alive = config.OLLAMA_KEEP_ALIVE if keep_alive is None else keep_alive
+        num_ctx = config.OLLAMA_NUM_CTX if num_ctx is None else num_ctx
+        num_predict = config.OLLAMA_NUM_PREDICT if num_predict is None else num_predict
+        options = {name: value for name, value in [("num_ctx", num_ctx), ("num_predict", num_predict)] if value}
+        self.chat_arguments = {}
+        if keep_alive: self.chat_arguments["keep_alive"] = keep_alive
+        if options: self.chat_arguments["options"] = options
+
+        self.lock = threading.Lock()
+        self.last_prompt = []
+        self.stats = {"calls": 0, "prefix_hits": 0, "prefix_messages": 0, "prompt_messages": 0,
+                      "prompt_eval_count": 0, "prompt_eval_ms": 0.0}
 
     def chat(self, messages: list):
         """
         Sends a chat message to the LLM and returns the response.
-        
+
+        :messages: An array of messages passed to the model.
+        :return: LLM-generated response
+        """
+        response = self.ollama_client.chat(model=self.model, messages=messages, **self.chat_arguments)
+        self.record(messages, response)
+        return response
+
+    async def async_chat(self, messages: list):
+        """
+        Sends a chat message to the LLM without blocking the event loop.
+
         :messages: An array of messages passed to the model.
         :return: LLM-generated response
         """
+        response = await self.async_client.chat(model=self.model, messages=messages, **self.chat_arguments)
+        self.record(messages, response)
+        return response
 
-        return self.ollama_client.chat(model=self.model, messages=messages)
+    async def chat_stream(self, messages: list):
+        """
+        Sends a chat message to the LLM and yields the response as it is generated.
+
+        :messages: An array of messages passed to the model.
+        :return: Async generator of response chunks, each with a message containing the
+            next part of the content, and done set on the last chunk.
+        """
+        stream = await self.async_client.chat(model=self.model, messages=messages, stream=True, **self.chat_arguments)
+        async for chunk in stream:
+            if chunk.get("done"): self.record(messages, chunk)
+            yield chunk
+
+    def record(self, messages=None, response=None):
+        """
+        Record the prompt metrics of a response. The prompt is a prefix hit when it starts
+        with all of the messages of the previous prompt, so the server can reuse its evaluation.
+        """
+        prefix = 0
+        with self.lock:
+            for previous, message in zip(self.last_prompt, messages):
+                if previous != message: break
+                prefix += 1
+            prefix_hit = bool(self.last_prompt) and prefix == len(self.last_prompt)
+            self.last_prompt = list(messages)
+
+            prompt_eval_count = response.get("prompt_eval_count") or 0
+            prompt_eval_ms = (response.get("prompt_eval_duration") or 0) / 1_000_000
+            self.stats["calls"] += 1
+            self.stats["prefix_hits"] += prefix_hit
+            self.stats["prefix_messages"] += prefix
+            self.stats["prompt_messages"] += len(messages)
+            self.stats["prompt_eval_count"] += prompt_eval_count
+            self.stats["prompt_eval_ms"] += prompt_eval_ms
+        logger.debug(f"LLM prompt of {len(messages)} messages, {prefix} reused, evaluated {prompt_eval_count} tokens in {prompt_eval_ms:.1f}ms")
+
+    def get_stats(self):
+        """
+        Prompt reuse and evaluation statistics since the client was created
+
+        :return: The recorded counters, with the prefix hit rate and the average prompt evaluation time
+        """
+        with self.lock:
+            stats = dict(self.stats)
+        calls = stats["calls"] or 1
+        stats["prefix_hit_rate"] = stats["prefix_hits"] / calls
+        stats["avg_prompt_eval_ms"] = stats["prompt_eval_ms"] / calls
+        return stats
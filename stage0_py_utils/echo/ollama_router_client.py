@@ -0,0 +1,211 @@
+import asyncio
+import threading
+import time
+import httpx
+import ollama
+from stage0_py_utils.config.config import Config
+from stage0_py_utils.echo.ollama_llm_client import OllamaLLMClient
+
+import logging
+logger = logging.getLogger(__name__)
+
+class OllamaRouterClient:
+    """_summary_
+    Spreads chat requests over several Ollama hosts, with the same chat interface as OllamaLLMClient.
+
+    Each request goes to the healthy host with the fewest outstanding requests, ties go
+    to the host that has handled the fewest requests. A failed request is retried on the 
+    next host, and a host that can not be reached or returns a server (5xx) error is marked down.
+    A down host is health checked again after health_check_interval_ms, and used as soon
+    as the check passes. If every host is down, they are all tried anyway.
+    """
+    def __init__(self, hosts=None, model="llama3.2:latest", health_check_interval_ms=None, health_check_timeout_ms=None, client_factory=None):
+        """
+        :param hosts: List of Ollama server URLs, defaults to config.OLLAMA_HOSTS or config.OLLAMA_HOST
+        :param model: Model to use on every host
+        :param health_check_interval_ms: Milliseconds before a down host is checked again,
+            defaults to config.OLLAMA_HEALTH_CHECK_INTERVAL_MS
+        :param health_check_timeout_ms: Milliseconds a health check waits for a host,
+            defaults to config.OLLAMA_HEALTH_CHECK_TIMEOUT_MS
+        :param client_factory: function(base_url, model) that creates the client for a host, defaults to OllamaLLMClient
+        """
+        config = Config.get_instance()
+        hosts = hosts or OllamaRouterClient.configured_hosts()
+        client_factory = client_factory or (lambda base_url, model: OllamaLLMClient(base_url=base_url, model=model))
+        interval_ms = config.OLLAMA_HEALTH_CHECK_INTERVAL_MS if health_check_interval_ms is None else health_check_interval_ms
+        timeout_ms = config.OLLAMA_HEALTH_CHECK_TIMEOUT_MS if health_check_timeout_ms is None else health_check_timeout_ms
+        self.model = model
+        self.health_check_interval = interval_ms / 1000
+        self.health_check_timeout = timeout_ms / 1000
+        self.lock = threading.Lock()
+        self.hosts = [{
+            "base_url": host,
+            "client": client_factory(host, model),
+            "health_client": ollama.Client(host=host, timeout=self.health_check_timeout),
+            "async_health_client": ollama.AsyncClient(host=host, timeout=self.health_check_timeout),
+            "outstanding": 0,
+            "healthy": True,
+            "check_after": 0,
+            "requests": 0,
+            "failures": 0
+        } for host in hosts]
+
+    @staticmethod
+    def configured_hosts():
+        """The comma separated config.OLLAMA_HOSTS, or config.OLLAMA_HOST when that is empty"""
+        config = Config.get_instance()
+        hosts = [host.strip() for host in config.OLLAMA_HOSTS.split(",") if host.strip()]
+        return hosts or [config.OLLAMA_HOST]
+
+    def chat(self, messages: list):
+        """
+        Sends a chat message to the least busy healthy host, failing over to the other hosts.
+
+        :messages: An array of messages passed to the model.
+        :return: LLM-generated response
+        """
+        last_error = None
+        for host in self.candidates():
+            self.start(host)
+            try:
+                response = host["client"].chat(messages=messages)
+                self.finish(host)
+                return response
+            except Exception as e:
+                self.finish(host, error=e)
+                last_error = e
+        raise last_error
+
+    async def async_chat(self, messages: list):
+        """
+        Sends a chat message without blocking the event loop, failing over to the other hosts.
+
+        :messages: An array of messages passed to the model.
+        :return: LLM-generated response
+        """
+        last_error = None
+        for host in await self.async_candidates():
+            self.start(host)
+            try:
+                response = await host["client"].async_chat(messages=messages)
+                self.finish(host)
+                return response
+            except Exception as e:
+                self.finish(host, error=e)
+                last_error = e
+        raise last_error
+
+    async def chat_stream(self, messages: list):
+        """
+        Streams the reply from the least busy healthy host. The request fails over to the
+        next host if the host fails before the first chunk, later failures are raised.
+
+        :messages: An array of messages passed to the model.
+        :return: Async generator of response chunks
+        """
+        last_error = None
+        for host in await self.async_candidates():
+            self.start(host)
+            streaming = False
+            error = None
+            try:
+                async for chunk in host["client"].chat_stream(messages=messages):
+                    streaming = True
+                    yield chunk
+                return
+            except Exception as e:
+                error = e
+                if streaming: raise
+                last_error = e
+            finally:
+                self.finish(host, error=error)
+        raise last_error
+
+    def candidates(self):
+        """
+        The hosts to try, in order. Down hosts that are due are health checked first, then the 
+        healthy hosts are ordered by outstanding requests. If no host is healthy every host is tried.
+        """
+        for host in self.due_for_check(): self.check_health(host)
+        return self.ordered_hosts()
+
+    async def async_candidates(self):
+        """The hosts to try, health checking down hosts without blocking the event loop"""
+        due = self.due_for_check()
+        if due: await asyncio.gather(*[self.async_check_health(host) for host in due])
+        return self.ordered_hosts()
+
+    def due_for_check(self):
+        """The down hosts that are due for a health check"""
+        now = time.monotonic()
+        with self.lock:
+            return [host for host in self.hosts if not host["healthy"] and host["check_after"] <= now]
+
+    def ordered_hosts(self):
+        """The healthy hosts ordered by outstanding requests, or every host if none are healthy"""
+        with self.lock:
+            candidates = sorted([host for host in self.hosts if host["healthy"]], key=lambda host: (host["outstanding"], host["requests"]))
+        return candidates or list(self.hosts)
+
+    def check_health(self, host=None):
+        """Check a host by listing its models, and mark it healthy or down"""
+        try:
+            host["health_client"].list()
+            return self.checked(host, True)
+        except Exception as e:
+            logger.warning(f"Ollama host {host['base_url']} failed health check: {e}")
+            return self.checked(host, False)
+
+    async def async_check_health(self, host=None):
+        """Check a host without blocking the event loop"""
+        try:
+            await host["async_health_client"].list()
+            return self.checked(host, True)
+        except Exception as e:
+            logger.warning(f"Ollama host {host['base_url']} failed health check: {e}")
+            return self.checked(host, False)
+
+    def checked(self, host=None, healthy=False):
+        """Record the result of a health check"""
+        with self.lock:
+            host["healthy"] = healthy
+            host["check_after"] = time.monotonic() + self.health_check_interval
+        return healthy
+
+    @staticmethod
+    def is_host_failure(error=None):
+        """True for errors that mean the host is down, not for request errors such as an unknown model"""
+        if isinstance(error, ollama.ResponseError): return error.status_code >= 500
+        return isinstance(error, (ConnectionError, TimeoutError, httpx.TransportError))
+
+    def check_all(self):
+        """Health check every host, returns the number of healthy hosts"""
+        return sum(self.check_health(host) for host in self.hosts)
+
+    def start(self, host=None):
+        with self.lock:
+            host["outstanding"] += 1
+            host["requests"] += 1
+
+    def finish(self, host=None, error=None):
+        with self.lock:
+            host["outstanding"] -= 1
+            if error is None: return
+            host["failures"] += 1
+            host_down = OllamaRouterClient.is_host_failure(error)
+            if host_down:
+                host["healthy"] = False
+                host["check_after"] = time.monotonic() + self.health_check_interval
+        if host_down: logger.warning(f"Ollama host {host['base_url']} failed, marked down: {error}")
+        else: logger.warning(f"Ollama host {host['base_url']} request failed: {error}")
+
+    def get_stats(self):
+        """The state and request counts of each host"""
+        with self.lock:
+            return [{
+                "base_url": host["base_url"],
+                "healthy": host["healthy"],
+                "outstanding": host["outstanding"],
+                "requests": host["requests"],
+                "failures": host["failures"]
+            } for host in self.hosts]
@@ -0,0 +1,228 @@
+import asyncio
+import contextvars
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from stage0_py_utils.config.config import Config
+
+import logging
+logger = logging.getLogger(__name__)
+
+# The channel that LLM requests made in this context are queued under, set by the LLMHandler
+llm_channel = contextvars.ContextVar("llm_channel", default=None)
+
+class QueueTimeoutError(TimeoutError):
+    """Raised when a request waits longer than the queue timeout for a slot"""
+    pass
+
+class LLMRequestQueue:
+    """_summary_
+    Limits the number of LLM requests in flight, shared by every PooledLLMClient
+    and the Evaluator in the process, so a single Ollama server is not overloaded.
+
+    Waiting requests are queued by channel and channels take turns, so a busy
+    channel does not hold up the others. Requests of a channel are served in order.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(self, max_in_flight=None, timeout_ms=None):
+        """
+        :param max_in_flight: Maximum concurrent requests, defaults to config.LLM_MAX_IN_FLIGHT, 0 is unlimited
+        :param timeout_ms: Maximum milliseconds a request waits in the queue, defaults to config.LLM_QUEUE_TIMEOUT_MS
+        """
+        config = Config.get_instance()
+        self.max_in_flight = config.LLM_MAX_IN_FLIGHT if max_in_flight is None else max_in_flight
+        self.timeout = (config.LLM_QUEUE_TIMEOUT_MS if timeout_ms is None else timeout_ms) / 1000
+        self.condition = threading.Condition()
+        self.queues = OrderedDict()
+        self.in_flight = 0
+        self.stats = {"requests": 0, "timeouts": 0, "cancelled": 0, "queue_ms": 0.0, "max_queue_ms": 0.0}
+
+    @staticmethod
+    def get_instance():
+        """The process wide request queue"""
+        if LLMRequestQueue._instance is None:
+            with LLMRequestQueue._lock:
+                if LLMRequestQueue._instance is None:
+                    LLMRequestQueue._instance = LLMRequestQueue()
+        return LLMRequestQueue._instance
+
+    @contextmanager
+    def slot(self, channel=None, timeout=None):
+        """
+        Wait for a request slot, and hold it for the body of the with statement
+
+        :param channel: The channel the request is queued under, defaults to the llm_channel context
+        :param timeout: Seconds to wait in the queue, defaults to the queue timeout
+        :raises QueueTimeoutError: If a slot is not available in time
+        """
+        ticket = self.ticket(channel)
+        self.acquire(ticket, timeout)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def ticket(self, channel=None):
+        """A new queue ticket for the channel"""
+        return {"channel": channel if channel is not None else llm_channel.get(), "granted": False, "queued": time.perf_counter()}
+
+    def acquire(self, ticket=None, timeout=None):
+        """Queue a ticket and wait until it is granted a slot"""
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            self.queues.setdefault(ticket["channel"], deque()).append(ticket)
+            self._dispatch()
+            while not ticket["granted"]:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0: break
+                self.condition.wait(remaining)
+
+            if ticket["granted"]:
+                self._acquired(ticket)
+                return
+            self._remove(ticket)
+            self.stats["timeouts"] += 1
+        logger.warning(f"LLM request for {ticket['channel']} timed out after {timeout}s in the queue")
+        raise QueueTimeoutError(f"LLM request was queued for more than {timeout} seconds")
+
+    async def async_acquire(self, ticket=None, timeout=None):
+        """
+        Wait for a slot without blocking the event loop, or a thread.
+        The ticket is granted by _dispatch, which resolves a future on the waiting loop.
+        Cancelling the task removes the ticket.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        loop = asyncio.get_running_loop()
+        ticket["future"] = loop.create_future()
+        ticket["loop"] = loop
+        with self.condition:
+            self.queues.setdefault(ticket["channel"], deque()).append(ticket)
+            self._dispatch()
+        try:
+            await asyncio.wait_for(ticket["future"], timeout)
+        except (asyncio.CancelledError, TimeoutError) as e:
+            with self.condition:
+                if ticket["granted"]:
+                    # The slot was granted as the wait ended, give it back
+                    self.in_flight -= 1
+                    self._dispatch()
+                else:
+                    self._remove(ticket)
+                if isinstance(e, asyncio.CancelledError):
+                    self.stats["cancelled"] += 1
+                    raise
+                self.stats["timeouts"] += 1
+            logger.warning(f"LLM request for {ticket['channel']} timed out after {timeout}s in the queue")
+            raise QueueTimeoutError(f"LLM request was queued for more than {timeout} seconds") from None
+        with self.condition:
+            self._acquired(ticket)
+
+    def release(self):
+        """Give back a slot, and grant it to the next waiting request"""
+        with self.condition:
+            self.in_flight -= 1
+            self._dispatch()
+
+    def get_stats(self):
+        """Requests in flight and queued, timeouts, cancellations and queue times"""
+        with self.condition:
+            stats = dict(self.stats)
+            stats["in_flight"] = self.in_flight
+            stats["queued"] = sum(len(queue) for queue in self.queues.values())
+            stats["max_in_flight"] = self.max_in_flight
+        stats["avg_queue_ms"] = stats["queue_ms"] / stats["requests"] if stats["requests"] else 0.0
+        return stats
+
+    def _dispatch(self):
+        """Grant free slots to the channels in turn, caller must hold the condition"""
+        while self.queues and (self.max_in_flight <= 0 or self.in_flight < self.max_in_flight):
+            channel, queue = next(iter(self.queues.items()))
+            ticket = queue.popleft()
+            if queue: self.queues.move_to_end(channel)
+            else: del self.queues[channel]
+            ticket["granted"] = True
+            self.in_flight += 1
+            if "future" in ticket:
+                ticket["loop"].call_soon_threadsafe(self._wake, ticket["future"])
+        self.condition.notify_all()
+
+    @staticmethod
+    def _wake(future):
+        """Resolve the future of a granted ticket, on the loop that waits for it"""
+        if not future.done(): future.set_result(None)
+
+    def _acquired(self, ticket):
+        """Record the queue time of a granted ticket, caller must hold the condition"""
+        queue_ms = (time.perf_counter() - ticket["queued"]) * 1000
+        self.stats["requests"] += 1
+        self.stats["queue_ms"] += queue_ms
+        self.stats["max_queue_ms"] = max(self.stats["max_queue_ms"], queue_ms)
+
+    def _remove(self, ticket):
+        """Remove a waiting ticket, caller must hold the condition"""
+        queue = self.queues.get(ticket["channel"])
+        if queue is None: return
+        queue.remove(ticket)
+        if not queue: del self.queues[ticket["channel"]]
+
+class PooledLLMClient:
+    """_summary_
+    Wrapper for an LLM client that sends its requests through the shared LLMRequestQueue.
+    Other attributes of the wrapped client are passed through.
+    """
+    def __init__(self, llm_client=None, request_queue=None, timeout_ms=None):
+        """
+        :param llm_client: The LLM client to wrap
+        :param request_queue: The LLMRequestQueue, defaults to the process wide queue
+        :param timeout_ms: Maximum milliseconds to wait in the queue, defaults to the queue timeout
+        """
+        self.llm = llm_client
+        self.model = getattr(llm_client, "model", None)
+        self.queue = request_queue or LLMRequestQueue.get_instance()
+        self.timeout = None if timeout_ms is None else timeout_ms / 1000
+
+    def __getattr__(self, name):
+        if name == "llm": raise AttributeError(name)
+        return getattr(self.llm, name)
+
+    def chat(self, messages: list):
+        """
+        Sends a chat message to the LLM once a request slot is available.
+
+        :messages: An array of messages passed to the model.
+        :return: LLM-generated response
+        """
+        with self.queue.slot(timeout=self.timeout):
+            return self.llm.chat(messages=messages)
+
+    async def async_chat(self, messages: list):
+        """
+        Sends a chat message to the LLM without blocking the event loop.
+        Cancelling the task removes the request from the queue.
+        """
+        ticket = self.queue.ticket()
+        await self.queue.async_acquire(ticket, self.timeout)
+        try:
+            return await self.llm.async_chat(messages=messages)
+        finally:
+            self.queue.release()
+
+    async def chat_stream(self, messages: list):
+        """
+        Streams the LLM reply once a request slot is available, the slot is held until the stream ends.
+        """
+        ticket = self.queue.ticket()
+        await self.queue.async_acquire(ticket, self.timeout)
+        try:
+            async for chunk in self.llm.chat_stream(messages=messages):
+                yield chunk
+        finally:
+            self.queue.release()
+
+    def get_stats(self):
+        """Statistics of the shared request queue"""
+        return self.queue.get_stats()
@@ -1,8 +1,16 @@
+import json
 import os
 import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 
-import ollama
+from stage0_py_utils.config.config import Config
 from stage0_py_utils.echo.message import Message
+from stage0_py_utils.echo.ollama_llm_client import OllamaLLMClient
+from stage0_py_utils.echo.ollama_router_client import OllamaRouterClient
+from stage0_py_utils.evaluator.grade_cache import GradeCache
+from stage0_py_utils.echo.pooled_llm_client import LLMRequestQueue, QueueTimeoutError
 
 import logging
 logger = logging.getLogger(__name__)
@@ -29,8 +37,24 @@ class Evaluator:
             These can be loaded with an Evaluator.loader.load_formatted_messages(prompt_files)
     conversations: A dictionary of filename.csv entries, with Array of LLM messages to be evaluated.
             These can be loaded with Evaluator.loader.load_formatted_conversations(test_conversation_files)
+    workers: Number of conversations evaluated at the same time, defaults to 1 (one at a time). 
+            LLM requests share the config.LLM_MAX_IN_FLIGHT slots of the LLMRequestQueue, so workers 
+            above that only queue more requests. Requests that time out waiting for a slot are queued again.
+    grade_workers: Number of replies graded at the same time when workers is more than 1, defaults to workers.
+            Replies are graded while the conversation continues with the next message.
+    results_file: Path of a JSONL file that each graded turn is appended to as it completes.
+    resume: Continue the run recorded in results_file, skipping the turns that are already graded.
+    grade_cache_file: Path of a JSONL file of grades kept between runs, so only new replies are graded. 
+            Grades are kept in memory for the run when this is None.
+    grade_cache_size: Maximum number of cached grades
+    grade_batch_size: Number of replies graded by one grader request, defaults to 1. Batches ask the grader 
+            for a JSON list of grades, and fall back to grading each reply if that can not be parsed.
+    model_client: LLM client used for the replies, any client with a chat(messages) method such as 
+            OllamaLLMClient, OllamaRouterClient, PooledLLMClient or MockLLMClient. Defaults to an 
+            OllamaLLMClient for model, or an OllamaRouterClient when config.OLLAMA_HOSTS is set.
+    grade_client: LLM client used for grading, defaults to a client for grade_model in the same way.
     """
-    def __init__(self, name=None, model=None, grade_model=None, grade_prompt_files=None, grade_prompt=None, prompt_files=None, prompt=None, conversations=None):
+    def __init__(self, name=None, model=None, grade_model=None, grade_prompt_files=None, grade_prompt=None, prompt_files=None, prompt=None, conversations=None, workers=1, grade_workers=None, results_file=None, resume=False, grade_cache_file=None, grade_cache_size=10000, grade_batch_size=1, model_client=None, grade_client=None):
         """ """
         self.name = name
         self.model = model
@@ -40,41 +64,201 @@ class Evaluator:
         self.prompt_files = prompt_files
         self.prompt = prompt
         self.conversations = conversations  
+        self.model_client = model_client
+        self.grade_client = grade_client
+        self.clients = {}
+        self.clients_lock = threading.Lock()
+        self.workers = workers
+        self.grade_workers = grade_workers or workers
+        self.results_file = results_file
+        self.resume = resume
+        self.results = None
+        self.results_lock = threading.Lock()
+        self.completed = {}
+        self.grade_batch_size = max(1, grade_batch_size)
+        self.grade_cache = GradeCache(cache_file=grade_cache_file, max_entries=grade_cache_size)
         logger.info(f"Evaluator {self.name} Initialized")
 
     def evaluate(self):
-        """Evaluate the conversations and report the grades"""
-        grades = {}
-        for name, conversation in self.conversations.items():
-            logger.info(f"{self.name} Grading {name}")
-            grades[name] = self.grade_conversation(conversation)
-        return grades
+        """Evaluate the conversations and report the grades, in the order of the conversations"""
+        self.open_results()
+        try:
+            if self.workers <= 1:
+                grades = {}
+                for name, conversation in self.conversations.items():
+                    logger.info(f"{self.name} Grading {name}")
+                    grades[name] = self.grade_conversation(conversation, name=name)
+                return grades
+
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="evaluator") as conversation_pool, \
+                 ThreadPoolExecutor(max_workers=self.grade_workers, thread_name_prefix="grader") as grade_pool:
+                futures = {
+                    name: conversation_pool.submit(self.grade_conversation, conversation, grade_pool, name)
+                    for name, conversation in self.conversations.items()
+                }
+                return {name: future.result() for name, future in futures.items()}
+        finally:
+            self.close_results()
+            logger.info(f"{self.name} grade cache {self.grade_cache.get_stats()}")
 
-    def grade_conversation(self, conversation=[]):
+    def grade_conversation(self, conversation=[], grade_pool=None, name=None):
+        """
+        Replay a conversation, and grade each LLM reply against the expected assistant message.
+        With a grade_pool the replies are graded on the pool, while the conversation continues.
+        Turns of the named conversation found in the resumed results file are not replayed.
+        """
         messages = self.prompt[:]
         grades = []
+        pending = []
+        batches = []
+        turn = 0
         for message in conversation:
             messages.append(message)
+            completed = self.completed.get((name, turn))
             if message["role"] == "user":
-                reply, latency = self.chat(messages=messages)
+                if completed is None:
+                    reply, latency = self.chat(messages=messages)
             elif message["role"] == "assistant":
+                if completed is not None:
+                    grades.append(completed)
+                    turn += 1
+                    continue
                 expected=message["content"]
                 given=reply["content"]
-                grade = self.grade_reply(expected=expected, given=given)
-                grades.append({
+                graded = {
                     "expected":expected, 
                     "given":given, 
                     "latency":latency, 
-                    "grade":grade
-                })
-                logger.info(f"Graded Answer {len(grades)}")
+                    "grade":None
+                }
+                grades.append(graded)
+                pending.append((turn, graded))
+                turn += 1
+                if len(pending) >= self.grade_batch_size:
+                    batches.append(self.grade_pending(name, pending, grade_pool))
+                    pending = []
+        if pending:
+            batches.append(self.grade_pending(name, pending, grade_pool))
+        if grade_pool:
+            for batch in batches: batch.result()
+            logger.info(f"Graded {len(grades)} Answers")
         return grades
-        
+
+    def grade_pending(self, name=None, pending=None, grade_pool=None):
+        """Grade a batch of (turn, graded) replies, on the grade_pool if there is one"""
+        if grade_pool: return grade_pool.submit(self.grade_turns, name, pending)
+        self.grade_turns(name, pending)
+
+    def grade_turns(self, name=None, pending=None):
+        """Grade a batch of (turn, graded) replies, and write the results"""
+        if len(pending) == 1:
+            turn, graded = pending[0]
+            grades = [self.grade_reply(expected=graded["expected"], given=graded["given"])]
+        else:
+            grades = self.grade_replies([(graded["expected"], graded["given"]) for turn, graded in pending])
+        for (turn, graded), grade in zip(pending, grades):
+            graded["grade"] = grade
+            self.write_result(name, turn, graded)
+        logger.info(f"Graded Answer {pending[-1][0] + 1}")
+
+    def open_results(self):
+        """
+        Open the results_file. With resume the graded turns already in the file are loaded 
+        and new results are appended, otherwise the file is replaced. Turns without a grade,
+        where the grader reply could not be parsed, are not loaded so they are graded again.
+        """
+        self.completed = {}
+        if not self.results_file: return
+        if self.resume and os.path.exists(self.results_file):
+            for result in Evaluator.read_results(self.results_file):
+                if result.get("grade") is None: continue
+                self.completed[(result.pop("conversation"), result.pop("turn"))] = result
+            logger.info(f"Resuming {self.name} with {len(self.completed)} graded answers from {self.results_file}")
+        self.results = open(self.results_file, "a" if self.resume else "w", encoding="utf-8")
+        if self.resume and self.results.tell() > 0:
+            # Start on a new line if the last run stopped part way through writing a result
+            with open(self.results_file, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n": self.write_line("")
+
+    def close_results(self):
+        if self.results is not None: 
+            self.results.close()
+            self.results = None
+
+    def write_result(self, name=None, turn=0, graded=None):
+        """Append a graded turn to the results_file"""
+        if self.results is None: return
+        self.write_line(json.dumps({"conversation": name, "turn": turn, **graded}))
+
+    def write_line(self, line=""):
+        with self.results_lock:
+            self.results.write(line + "\n")
+            self.results.flush()
+
+    @staticmethod
+    def read_results(results_file=None):
+        """Read the graded turns from a JSONL results file, an incomplete last line is skipped"""
+        with open(results_file, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping invalid result in {results_file}: {line[:60]}")
+
     def grade_reply(self, expected=None, given=None):
-        # Use LLM model with grading prompts to grade message
+        # Use a cached grade, or the LLM model with grading prompts to grade message
+        key = GradeCache.key(self.grade_model, self.grade_prompt, expected, given)
+        grade = self.grade_cache.get(key)
+        if grade is not None: return grade
+        grade = self.ask_grader(expected=expected, given=given)
+        if grade is not None: self.grade_cache.put(key, grade)
+        return grade
+
+    def grade_replies(self, pairs=None):
+        """
+        Grade a list of (expected, given) pairs with one grader request. 
+        Pairs with a cached grade are not sent, and if the grader reply is not a JSON
+        list of grades for every pair, the pairs are graded one at a time.
+        """
+        keys = [GradeCache.key(self.grade_model, self.grade_prompt, expected, given) for expected, given in pairs]
+        grades = [self.grade_cache.get(key) for key in keys]
+        missing = [index for index, grade in enumerate(grades) if grade is None]
+        if not missing: return grades
+
+        graded = self.ask_grader_batch([pairs[index] for index in missing]) if len(missing) > 1 else None
+        if graded is None:
+            graded = [self.ask_grader(expected=pairs[index][0], given=pairs[index][1]) for index in missing]
+        for index, grade in zip(missing, graded):
+            grades[index] = grade
+            if grade is not None: self.grade_cache.put(keys[index], grade)
+        return grades
+
+    def ask_grader_batch(self, pairs=None):
+        """Ask the grader for the grades of several pairs, returns None if the reply can not be parsed"""
+        items = "\n\n".join(f"Pair {number}:\nGiven:\n{given}\nExpected:\n{expected}" for number, (expected, given) in enumerate(pairs, 1))
+        messages = self.grade_prompt[:]
+        messages.append({"role":"user", "content": 
+            f"Grade each of these {len(pairs)} pairs. Reply with only a JSON object like "
+            f'{{"grades": [0.5, 1.0]}} that has one grade for each pair, in order.\n\n{items}'})
+        reply, latency = self.chat(model=self.grade_model, messages=messages, grading=True)
+        content = reply["content"]
+        try:
+            match = re.search(r"[\[{].*[\]}]", content, re.DOTALL)
+            parsed = json.loads(match.group(0))
+            grades = parsed["grades"] if isinstance(parsed, dict) else parsed
+            if len(grades) != len(pairs) or not all(isinstance(grade, (int, float)) and not isinstance(grade, bool) for grade in grades):
+                raise ValueError(f"expected {len(pairs)} numeric grades")
+            return [float(grade) for grade in grades]
+        except Exception as e:
+            logger.warning(f"Grader didn't return a valid batch of grades, grading one at a time: {e}")
+            return None
+
+    def ask_grader(self, expected=None, given=None):
+        """Ask the grader for the grade of one pair"""
         messages = self.grade_prompt[:]
         messages.append({"role":"user", "content": f"Given:\n{given}\nExpected:\n{expected}"})
-        reply, latency = self.chat(model=self.grade_model, messages=messages)
+        reply, latency = self.chat(model=self.grade_model, messages=messages, grading=True)
         content = reply["content"]
         grade = None
         try:
@@ -86,18 +270,48 @@ class Evaluator:
             grade = None
         return grade
     
-    def chat(self, model=None, messages=None):
-        # Get chat response to conversation
-        # use ollama.chat(model=self.model, messages=messages)
-        # return a LLM Message dict (role, content)
-        model = model or self.model
+    def chat(self, model=None, messages=None, grading=False):
+        """
+        Get the chat reply to a conversation from the model client, or the grade client when grading.
+        The model is only used to pick a default client when no client was given.
+
+        Returns the reply as a LLM Message dict (role, content), and the latency in nanoseconds. 
+        The latency is the total_duration reported by Ollama, or the measured time of the call.
+        """
+        client = self.grade_client if grading else self.model_client
+        client = client or self.client(model or self.model)
         logger.debug(f"Chat Request model {model}, message: {messages[len(messages)-1]}")
-        reply = ollama.chat(model=model, messages=messages)
-        logger.debug(f"Chat reply {reply.message.content}")
-        latency = reply.total_duration
+        started = time.perf_counter_ns()
+        while True:
+            try:
+                if isinstance(getattr(client, "queue", None), LLMRequestQueue):
+                    # A PooledLLMClient already waits for a slot in the request queue
+                    reply = client.chat(messages=messages)
+                else:
+                    with LLMRequestQueue.get_instance().slot(channel=self.name):
+                        reply = client.chat(messages=messages)
+                break
+            except QueueTimeoutError:
+                # The queue is busy, an evaluation run waits for a slot rather than failing.
+                # Other timeouts are raised by the client, and are not retried.
+                logger.warning(f"{self.name} is still waiting for an LLM request slot")
+        measured = time.perf_counter_ns() - started
+        logger.debug(f"Chat reply {reply['message']['content']}")
+        latency = reply.get("total_duration") or measured
         response = {
-            "role":reply.message.role, 
-            "content":reply.message.content
+            "role":reply["message"]["role"], 
+            "content":reply["message"]["content"]
         }
         return response, latency
-        
\ No newline at end of file
+
+    def client(self, model=None):
+        """The default client for a model, an OllamaRouterClient when config.OLLAMA_HOSTS is set"""
+        with self.clients_lock:
+            if model not in self.clients:
+                config = Config.get_instance()
+                if config.OLLAMA_HOSTS:
+                    # Spread the requests over the configured Ollama hosts
+                    self.clients[model] = OllamaRouterClient(model=model)
+                else:
+                    self.clients[model] = OllamaLLMClient(base_url=config.OLLAMA_HOST, model=model)
+            return self.clients[model]
@@ -0,0 +1,95 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import logging
+logger = logging.getLogger(__name__)
+
+class GradeCache:
+    """
+    Memo of the grades given by the grading LLM, so a re-run only grades new replies.
+
+    Grades are keyed by a hash of the grade model, grade prompt, expected and given values.
+    The least recently used grades are evicted beyond max_entries. With a cache_file the
+    grades are appended to a JSONL file and loaded again by the next run, the file is
+    rewritten when it holds more than twice max_entries lines.
+    """
+    def __init__(self, cache_file=None, max_entries=10000):
+        """
+        Args:
+            cache_file: Path of the JSONL file the grades are kept in, None keeps them in memory only
+            max_entries: Maximum number of grades kept
+        """
+        self.cache_file = cache_file
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if cache_file and os.path.exists(cache_file): self.load()
+
+    @staticmethod
+    def key(grade_model=None, grade_prompt=None, expected=None, given=None):
+        """Hash of everything that the grade depends on"""
+        graded = json.dumps([grade_model, grade_prompt, expected, given], sort_keys=True)
+        return hashlib.sha256(graded.encode()).hexdigest()
+
+    def get(self, key):
+        """The cached grade, or None on a miss"""
+        with self.lock:
+            grade = self.entries.get(key)
+            if grade is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return grade
+
+    def put(self, key, grade):
+        """Cache a grade, and append it to the cache_file"""
+        with self.lock:
+            self._remember(key, grade)
+            if self.cache_file:
+                with open(self.cache_file, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"key": key, "grade": grade}) + "\n")
+
+    def load(self):
+        """Load the grades from the cache_file, and compact it if it has grown"""
+        lines = 0
+        with open(self.cache_file, encoding="utf-8") as f:
+            for line in f:
+                lines += 1
+                try:
+                    cached = json.loads(line)
+                    self._remember(cached["key"], cached["grade"])
+                except (json.JSONDecodeError, KeyError):
+                    logger.warning(f"Skipping invalid grade in {self.cache_file}: {line[:60]}")
+        logger.info(f"Loaded {len(self.entries)} grades from {self.cache_file}")
+        if lines > 2 * self.max_entries: self.compact()
+
+    def compact(self):
+        """Rewrite the cache_file with only the cached grades"""
+        temp_file = f"{self.cache_file}.tmp"
+        with open(temp_file, "w", encoding="utf-8") as f:
+            for key, grade in self.entries.items():
+                f.write(json.dumps({"key": key, "grade": grade}) + "\n")
+        os.replace(temp_file, self.cache_file)
+
+    def get_stats(self):
+        """Number of grades, hits and misses, and the hit rate"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+    def _remember(self, key, grade):
+        self.entries[key] = grade
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
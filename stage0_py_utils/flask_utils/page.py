@@ -0,0 +1,31 @@
+from bson import ObjectId
+from flask import request
+from stage0_py_utils.config.config import Config
+
+class InvalidPageError(Exception):
+    """Raised when the after cursor of a page request is not a valid document _id"""
+    pass
+
+def create_flask_page():
+    """
+    Create keyset pagination values (after, limit) from the query string.
+    The limit defaults to config.PAGE_SIZE, and is capped at config.MAX_PAGE_SIZE.
+
+    Raises:
+        InvalidPageError: If after is not a valid document _id
+    """
+    config = Config.get_instance()
+    limit = request.args.get('limit', default=config.PAGE_SIZE, type=int)
+    after = request.args.get('after') or None
+    if after is not None and not ObjectId.is_valid(after):
+        raise InvalidPageError(f"Invalid page cursor {after}")
+    return {
+        "after": after,
+        "limit": min(limit, config.MAX_PAGE_SIZE) if limit and limit > 0 else config.PAGE_SIZE
+    }
+
+def create_flask_page_headers(documents, page):
+    """Create the X-Next-Cursor header, an after value for the next page, when a full page was returned."""
+    if not documents or len(documents) < page["limit"]:
+        return {}
+    return {"X-Next-Cursor": str(documents[-1]["_id"])}
@@ -1,6 +1,9 @@
 import sys
+import threading
+import time
 from bson import ObjectId 
 from pymongo import MongoClient, ASCENDING, DESCENDING
+from pymongo.monitoring import ConnectionPoolListener
 from pymongo.operations import IndexModel
 from stage0_py_utils.config.config import Config
 from bson import json_util
@@ -8,33 +11,106 @@ from bson import json_util
 import logging
 logger = logging.getLogger(__name__)
 
-# TODO: - Refactor to use connection pooling
-
 class TestDataLoadError(Exception):
     def __init__(self, message, details=None):
         super().__init__(message)
         self.details = details
 
+class PoolStatsListener(ConnectionPoolListener):
+    """Connection pool listener that tracks pool utilization for MongoIO.get_pool_stats"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.open_connections = 0
+        self.checked_out = 0
+        self.max_checked_out = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+        self.pools_cleared = 0
+        self.checkout_started = threading.local()
+
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_closed(self, event): pass
+
+    def pool_cleared(self, event):
+        with self.lock:
+            self.pools_cleared += 1
+
+    def connection_created(self, event):
+        with self.lock:
+            self.open_connections += 1
+
+    def connection_ready(self, event): pass
+
+    def connection_closed(self, event):
+        with self.lock:
+            self.open_connections -= 1
+
+    def connection_check_out_started(self, event):
+        self.checkout_started.at = time.perf_counter()
+
+    def connection_check_out_failed(self, event):
+        with self.lock:
+            self.checkout_failures += 1
+
+    def connection_checked_out(self, event):
+        started = getattr(self.checkout_started, "at", None)
+        wait_ms = (time.perf_counter() - started) * 1000 if started else 0.0
+        with self.lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.max_checked_out = max(self.max_checked_out, self.checked_out)
+            self.total_wait_ms += wait_ms
+            self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+
+    def connection_checked_in(self, event):
+        with self.lock:
+            self.checked_out -= 1
+
+    def as_dict(self):
+        """Get a snapshot of the pool statistics"""
+        with self.lock:
+            return {
+                "open_connections": self.open_connections,
+                "checked_out": self.checked_out,
+                "max_checked_out": self.max_checked_out,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "average_wait_ms": self.total_wait_ms / self.checkouts if self.checkouts else 0.0,
+                "max_wait_ms": self.max_wait_ms,
+                "pools_cleared": self.pools_cleared
+            }
+
 class MongoIO:
     _instance = None
 
     def __new__(cls, *args, **kwargs):
         if cls._instance is None:
             cls._instance = super(MongoIO, cls).__new__(cls, *args, **kwargs)
-            
-            
-            # TODO: Add timeout configs to Client and use here in client constructor
             config = Config.get_instance()
+            pool_stats = PoolStatsListener()
             client = MongoClient(
                 config.MONGO_CONNECTION_STRING, 
-                serverSelectionTimeoutMS=2000, 
-                socketTimeoutMS=5000
+                serverSelectionTimeoutMS=config.MONGO_SERVER_SELECTION_TIMEOUT_MS, 
+                connectTimeoutMS=config.MONGO_CONNECT_TIMEOUT_MS,
+                socketTimeoutMS=config.MONGO_SOCKET_TIMEOUT_MS,
+                maxPoolSize=config.MONGO_MAX_POOL_SIZE,
+                minPoolSize=config.MONGO_MIN_POOL_SIZE,
+                maxIdleTimeMS=config.MONGO_MAX_IDLE_TIME_MS or None,
+                waitQueueTimeoutMS=config.MONGO_WAIT_QUEUE_TIMEOUT_MS or None,
+                event_listeners=[pool_stats],
+                **({"compressors": config.MONGO_COMPRESSORS} if config.MONGO_COMPRESSORS else {})
             )
             client.admin.command('ping')  # Force connection
 
             cls._instance.config = config
             cls._instance.client = client
+            cls._instance.pool_stats = pool_stats
             cls._instance.db = client.get_database(config.MONGO_DB_NAME)
+            cls._instance.collections = {}
+            cls._instance.collections_lock = threading.Lock()
             cls._instance.connected = True
             logger.info(f"Connected to MongoDB")
         return cls._instance
@@ -45,15 +121,34 @@ class MongoIO:
             
         try:
             if self.client:
+                self.collections.clear()
                 self.client.close()
                 logger.info("Disconnected from MongoDB")
         except Exception as e:
             logger.fatal(f"Failed to disconnect from MongoDB: {e} - exiting")
             sys.exit(1) # fail fast 
 
+    def get_pool_stats(self):
+        """Get connection pool utilization statistics.
+        
+        Returns:
+            dict: Pool configuration along with open/checked out connection counts, 
+                checkout totals and failures, and average/max checkout wait times in ms.
+        """
+        if not self.connected: raise Exception("get_pool_stats when Mongo Not Connected")
+
+        stats = self.pool_stats.as_dict()
+        stats["max_pool_size"] = self.config.MONGO_MAX_POOL_SIZE
+        stats["min_pool_size"] = self.config.MONGO_MIN_POOL_SIZE
+        return stats
+
     def get_collection(self, collection_name):
         """Get a collection, creating it if it doesn't exist.
         
+        The collection is verified (and created if needed) the first time it 
+        is requested, after that the cached handle is returned without a 
+        round trip to the server. drop_collection invalidates the cache entry.
+        
         Args:
             collection_name (str): Name of the collection to get/create
             
@@ -62,14 +157,23 @@ class MongoIO:
         """
         if not self.connected: raise Exception("get_collection when Mongo Not Connected")
         
+        collection = self.collections.get(collection_name)
+        if collection is not None:
+            return collection
+
         try:
-            # Check if collection exists
-            if collection_name not in self.db.list_collection_names():
-                # Create collection if it doesn't exist
-                self.db.create_collection(collection_name)
-                logger.info(f"Created collection: {collection_name}")
-            
-            return self.db.get_collection(collection_name)
+            with self.collections_lock:
+                collection = self.collections.get(collection_name)
+                if collection is None:
+                    # Check if collection exists
+                    if collection_name not in self.db.list_collection_names():
+                        # Create collection if it doesn't exist
+                        self.db.create_collection(collection_name)
+                        logger.info(f"Created collection: {collection_name}")
+                    
+                    collection = self.db.get_collection(collection_name)
+                    self.collections[collection_name] = collection
+            return collection
         except Exception as e:
             logger.error(f"Failed to get/create collection: {collection_name} {e}")
             raise e
@@ -86,6 +190,8 @@ class MongoIO:
         if not self.connected: raise Exception("drop_collection when Mongo Not Connected")
 
         try:
+            with self.collections_lock:
+                self.collections.pop(collection_name, None)
             if collection_name in self.db.list_collection_names():
                 self.db.drop_collection(collection_name)
                 logger.info(f"Dropped collection: {collection_name}")
@@ -95,37 +201,76 @@ class MongoIO:
             logger.error(f"Failed to drop collection: {e}")
             raise e
       
-    def get_documents(self, collection_name, match=None, project=None, sort_by=None):
+    def get_documents(self, collection_name, match=None, project=None, sort_by=None, after=None, limit=None):
         """
         Retrieve a list of documents based on a match, projection, and optional sorting.
+        
+        Keyset pagination is supported with after/limit. When either is provided the 
+        documents are ordered by _id, and only documents with an _id greater than after 
+        are returned. The _id of the last document is the after value for the next page.
 
         Args:
             collection_name (str): Name of the collection to query.
             match (dict, optional): MongoDB match filter. Defaults to {}.
             project (dict, optional): Fields to include or exclude. Defaults to None.
             sort_by (list of tuple, optional): Sorting criteria (e.g., [('field1', ASCENDING), ('field2', DESCENDING)]). Defaults to None.
+            after (str, optional): Return documents with an _id after this value. Defaults to None.
+            limit (int, optional): Maximum number of documents to return. Defaults to None.
 
         Returns:
             list: List of documents matching the query.
         """
         if not self.connected: raise Exception("get_documents when Mongo Not Connected")
 
+        if after or limit:
+            sort_by = [("_id", ASCENDING)]
+        if after:
+            after_match = {"_id": {"$gt": ObjectId(after)}}
+            match = {"$and": [match, after_match]} if match else after_match
+
+        documents = list(self.iter_documents(collection_name, match, project, sort_by, limit=limit))
+        return documents
+
+    def iter_documents(self, collection_name, match=None, project=None, sort_by=None, batch_size=None, limit=None):
+        """
+        Stream documents based on a match, projection, and optional sorting.
+        Documents are fetched from the server batch_size at a time, so memory 
+        use is bounded by the batch size rather than the size of the result set.
+
+        Args:
+            collection_name (str): Name of the collection to query.
+            match (dict, optional): MongoDB match filter. Defaults to {}.
+            project (dict, optional): Fields to include or exclude. Defaults to None.
+            sort_by (list of tuple, optional): Sorting criteria. Defaults to None.
+            batch_size (int, optional): Number of documents per server round trip. Defaults to the server default.
+            limit (int, optional): Maximum number of documents to return. Defaults to no limit.
+
+        Yields:
+            dict: Documents matching the query.
+        """
+        if not self.connected: raise Exception("iter_documents when Mongo Not Connected")
+
         # Default match and projection
         match = match or {}
         project = project or None
         sort_by = sort_by or None
+        cursor = None
         try:
             collection = self.get_collection(collection_name)
             cursor = collection.find(match, project)
             if sort_by: cursor = cursor.sort(sort_by)
+            if batch_size: cursor = cursor.batch_size(batch_size)
+            if limit: cursor = cursor.limit(limit)
 
-            documents = list(cursor)
-            return documents
+            for document in cursor:
+                yield document
         except Exception as e:
             logger.error(f"Failed to get documents from collection '{collection_name}': {e}")
             raise e
+        finally:
+            if cursor is not None: cursor.close()
                 
-    def update_document(self, collection_name, document_id=None, match=None, set_data=None, push_data=None, add_to_set_data=None, pull_data=None):
+    def update_document(self, collection_name, document_id=None, match=None, set_data=None, push_data=None, add_to_set_data=None, pull_data=None, inc_data=None, set_on_insert_data=None, project=None, upsert=False):
         """
         Update a document in the specified collection with optional set, push, add_to_set, and pull operations.
 
@@ -136,6 +281,10 @@ class MongoIO:
             push_data (dict, optional): Fields to push items into arrays. Defaults to None.
             add_to_set_data (dict, optional): Fields to add unique items to arrays. Defaults to None.
             pull_data (dict, optional): Fields to remove items from arrays. Defaults to None.
+            inc_data (dict, optional): Numeric fields to increment. Defaults to None.
+            set_on_insert_data (dict, optional): Fields to set only when an upsert inserts a document. Defaults to None.
+            project (dict, optional): Fields of the updated document to return. Defaults to None (all).
+            upsert (bool, optional): Insert a document built from the match if none exists. Defaults to False.
 
         Returns:
             dict: The updated document if successful, otherwise None.
@@ -159,8 +308,12 @@ class MongoIO:
                 pipeline["$addToSet"] = add_to_set_data
             if pull_data:
                 pipeline["$pull"] = pull_data
+            if inc_data:
+                pipeline["$inc"] = inc_data
+            if set_on_insert_data:
+                pipeline["$setOnInsert"] = set_on_insert_data
 
-            updated = document_collection.find_one_and_update(match, pipeline, return_document=True)
+            updated = document_collection.find_one_and_update(match, pipeline, projection=project, upsert=upsert, return_document=True)
 
         except Exception as e:
             logger.error(f"Failed to update document: {e}")
@@ -337,13 +490,17 @@ class MongoIO:
         
         Args:
             collection_name (str): Name of the collection
-            indexes (list): List of index specifications, each containing 'name' and 'key' fields
+            indexes (list): List of index specifications, each containing 'name' and 'key' fields,
+                and optional index options such as 'unique' or 'partialFilterExpression'
         """
         if not self.connected: raise Exception("create_index when Mongo Not Connected")
         
         try:
             collection = self.get_collection(collection_name)
-            index_models = [IndexModel(index["key"], name=index["name"]) for index in indexes]
+            index_models = [
+                IndexModel(index["key"], name=index["name"], **{option: value for option, value in index.items() if option not in ("key", "name")}) 
+                for index in indexes
+            ]
             collection.create_indexes(index_models)
             logger.info(f"Created {len(indexes)} indexes")
         except Exception as e:
@@ -385,6 +542,46 @@ class MongoIO:
             logger.error(f"Failed to get indexes: {e}")
             raise e
 
+    def ensure_indexes(self, collection_name, indexes):
+        """Create any of the declared indexes that do not exist, and report on the rest.
+
+        Indexes are matched by name, so calling this on every startup is cheap and idempotent.
+
+        Args:
+            collection_name (str): Name of the collection
+            indexes (list): List of index specifications, see create_index
+
+        Returns:
+            dict: Index report with the 'created' (were missing), 'unknown' (not declared),
+                and 'unused' (no operations since the server started) index names
+        """
+        if not self.connected: raise Exception("ensure_indexes when Mongo Not Connected")
+
+        existing = [index["name"] for index in self.get_indexes(collection_name)]
+        missing = [index for index in indexes if index["name"] not in existing]
+        if missing:
+            self.create_index(collection_name, missing)
+
+        declared = [index["name"] for index in indexes]
+        report = {
+            "collection": collection_name,
+            "created": [index["name"] for index in missing],
+            "unknown": [name for name in existing if name != "_id_" and name not in declared],
+            "unused": []
+        }
+
+        # $indexStats needs the indexStats privilege, the report is best effort without it
+        try:
+            stats = self.execute_pipeline(collection_name, [{"$indexStats": {}}])
+            report["unused"] = [stat["name"] for stat in stats if stat["name"] != "_id_" and stat["accesses"]["ops"] == 0]
+        except Exception as e:
+            logger.warning(f"Index usage not available for {collection_name}: {e}")
+
+        if report["created"]: logger.info(f"Created missing indexes {report['created']} on {collection_name}")
+        if report["unknown"]: logger.warning(f"Undeclared indexes {report['unknown']} on {collection_name}")
+        if report["unused"]: logger.info(f"Unused indexes {report['unused']} on {collection_name}")
+        return report
+
     def execute_pipeline(self, collection_name, pipeline):
         """Execute a MongoDB aggregation pipeline.
         
@@ -394,14 +591,38 @@ class MongoIO:
         """
         if not self.connected: raise Exception("execute_pipeline when Mongo Not Connected")
         
+        result = list(self.iter_pipeline(collection_name, pipeline))
+        logger.info(f"Executed pipeline on collection: {collection_name}")
+        return result
+    
+    def iter_pipeline(self, collection_name, pipeline, batch_size=None, allow_disk_use=None):
+        """Stream the results of a MongoDB aggregation pipeline.
+        
+        Args:
+            collection_name (str): Name of the collection
+            pipeline (list): List of pipeline stages to execute
+            batch_size (int, optional): Number of documents per server round trip. Defaults to the server default.
+            allow_disk_use (bool, optional): Allow stages to spill to disk when they exceed the memory limit.
+
+        Yields:
+            dict: Documents produced by the pipeline.
+        """
+        if not self.connected: raise Exception("iter_pipeline when Mongo Not Connected")
+        
+        options = {}
+        if batch_size: options["batchSize"] = batch_size
+        if allow_disk_use is not None: options["allowDiskUse"] = allow_disk_use
+        cursor = None
         try:
             collection = self.get_collection(collection_name)
-            result = list(collection.aggregate(pipeline))
-            logger.info(f"Executed pipeline on collection: {collection_name}")
-            return result
+            cursor = collection.aggregate(pipeline, **options)
+            for document in cursor:
+                yield document
         except Exception as e:
             logger.error(f"Failed to execute pipeline: {e}")
             raise e
+        finally:
+            if cursor is not None: cursor.close()
     
     def load_test_data(self, collection_name, data_file):
         """Load test data from a file into a collection."""
@@ -1,6 +1,7 @@
 from stage0_py_utils.services.bot_services import BotServices
 from stage0_py_utils.flask_utils.breadcrumb import create_flask_breadcrumb
 from stage0_py_utils.flask_utils.token import create_flask_token
+from stage0_py_utils.flask_utils.page import create_flask_page, create_flask_page_headers, InvalidPageError
 
 import logging
 logger = logging.getLogger(__name__)
@@ -11,16 +12,20 @@ from flask import Blueprint, Response, jsonify, request
 def create_bot_routes():
     bot_routes = Blueprint('bot_routes', __name__)
 
-    # GET /api/bots - Return a list of bots that match query
+    # GET /api/bots?after=&limit= - Return a page of bots that match query
     @bot_routes.route('', methods=['GET'])
     def get_bots():
         try:
             token = create_flask_token()
             breadcrumb = create_flask_breadcrumb(token)
+            page = create_flask_page()
             query = request.args.get('query') or ""
-            bots = BotServices.get_bots(query, token)
+            bots = BotServices.get_bots(query, token, after=page["after"], limit=page["limit"])
             logger.info(f"get_bots Success {str(breadcrumb['at_time'])}, {breadcrumb['correlation_id']}")
-            return jsonify(bots), 200
+            return jsonify(bots), 200, create_flask_page_headers(bots, page)
+        except InvalidPageError as e:
+            logger.info(f"get_bots Bad Request: {e}")
+            return jsonify({"error": str(e)}), 400
         except Exception as e:
             logger.warning(f"get_bots Error has occurred: {e}")
             return jsonify({"error": "A processing error occurred"}), 500
@@ -2,6 +2,7 @@ from stage0_py_utils.echo.message import Message
 from stage0_py_utils.services.conversation_services import ConversationServices
 from stage0_py_utils.flask_utils.breadcrumb import create_flask_breadcrumb
 from stage0_py_utils.flask_utils.token import create_flask_token
+from stage0_py_utils.flask_utils.page import create_flask_page, create_flask_page_headers, InvalidPageError
 
 import logging
 logger = logging.getLogger(__name__)
@@ -12,26 +13,31 @@ from flask import Blueprint, Response, jsonify, request
 def create_conversation_routes():
     conversation_routes = Blueprint('conversation_routes', __name__)
 
-    # GET /api/conversations - Return a list of latest active conversations
+    # GET /api/conversations?after=&limit= - Return a page of latest active conversations
     @conversation_routes.route('', methods=['GET'])
     def get_conversations():
         try:
             token = create_flask_token()
             breadcrumb = create_flask_breadcrumb(token)
-            conversations = ConversationServices.get_conversations(token=token)
+            page = create_flask_page()
+            conversations = ConversationServices.get_conversations(token=token, after=page["after"], limit=page["limit"])
             logger.info(f"get_conversations Success {str(breadcrumb['at_time'])}, {breadcrumb['correlation_id']}")
-            return jsonify(conversations), 200
+            return jsonify(conversations), 200, create_flask_page_headers(conversations, page)
+        except InvalidPageError as e:
+            logger.info(f"get_conversations Bad Request: {e}")
+            return jsonify({"error": str(e)}), 400
         except Exception as e:
             logger.warning(f"get_conversations Error has occurred: {e}")
             return jsonify({"error": "A processing error occurred"}), 500
         
-    # GET /api/conversation/channel_id - Return a specific conversation
+    # GET /api/conversation/channel_id?window= - Return a specific conversation, optionally only the last window messages
     @conversation_routes.route('/<string:channel_id>', methods=['GET'])
     def get_conversation(channel_id):
         try:
             token = create_flask_token()
             breadcrumb = create_flask_breadcrumb(token)
-            conversation = ConversationServices.get_conversation(channel_id=channel_id, token=token, breadcrumb=breadcrumb)
+            window = request.args.get('window', type=int)
+            conversation = ConversationServices.get_conversation(channel_id=channel_id, token=token, breadcrumb=breadcrumb, window=window)
             logger.info(f"get_conversation Success {str(breadcrumb['at_time'])}, {breadcrumb['correlation_id']}")
             return jsonify(conversation), 200
         except Exception as e:
@@ -15,6 +15,11 @@ from stage0_py_utils import Config, MongoIO
 config = Config.get_instance()
 mongo = MongoIO.get_instance()
 
+# Create the indexes the bot and conversation services depend on
+from stage0_py_utils import BotServices, ConversationServices
+BotServices.create_indexes()
+ConversationServices.create_indexes()
+
 # Initialize Logging
 import logging
 logging.getLogger("werkzeug").setLevel(logging.WARNING)
@@ -24,8 +29,11 @@ logger.info(f"============= Starting Server Initialization ===============")
 
 # Initialize Echo Discord Bot - this will register the default Bot/Conversation/Echo Agents
 from stage0_py_utils import Echo
-from stage0_py_utils import OllamaLLMClient
-llm_client = OllamaLLMClient(base_url=config.OLLAMA_HOST, model=config.FRAN_MODEL_NAME)
+from stage0_py_utils import OllamaLLMClient, OllamaRouterClient
+if config.OLLAMA_HOSTS:
+    llm_client = OllamaRouterClient(model=config.FRAN_MODEL_NAME)
+else:
+    llm_client = OllamaLLMClient(base_url=config.OLLAMA_HOST, model=config.FRAN_MODEL_NAME)
 echo = Echo("Fran", bot_id=config.FRAN_BOT_ID, model=config.FRAN_MODEL_NAME, client=llm_client)
 # from echo.mock_llm_client import MockLLMClient
 # echo = Echo("Fran", bot_id=config.FRAN_BOT_ID, model=config.FRAN_MODEL_NAME, client=MockLLMClient())
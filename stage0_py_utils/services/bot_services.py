@@ -12,14 +12,28 @@ class BotServices:
         return # No access control implemented yet
 
     @staticmethod
-    def get_bots(query, token):
-        """Get a list of bot names and ids"""
+    def create_indexes():
+        """
+        Create the indexes the bot services depend on, if they do not exist.
+        Bots are only read by _id, so no indexes are declared beyond the 
+        default _id index, but the report still lists undeclared or unused indexes.
+
+        Returns:
+            dict: Index report from MongoIO.ensure_indexes
+        """
+        config = Config.get_instance()
+        mongo = MongoIO.get_instance()
+        return mongo.ensure_indexes(config.BOT_COLLECTION_NAME, [])
+
+    @staticmethod
+    def get_bots(query, token, after=None, limit=None):
+        """Get a list of bot names and ids, optionally a page of limit bots after the given _id"""
         BotServices._check_user_access(token)
         config = Config.get_instance()
         mongo = MongoIO.get_instance()
         match = None
         project = {"_id":1, "name":1, "description": 1}
-        bots = mongo.get_documents(config.BOT_COLLECTION_NAME, match, project)
+        bots = mongo.get_documents(config.BOT_COLLECTION_NAME, match, project, after=after, limit=limit)
         return bots
 
     @staticmethod
@@ -0,0 +1,194 @@
+import threading
+from collections import OrderedDict
+
+import logging
+logger = logging.getLogger(__name__)
+
+class ConversationCache:
+    """_summary_
+    In-process write-behind cache of active conversation messages.
+
+    Channels are kept in least recently used order, and evicted when there
+    are more than max_channels, or the cached messages exceed max_bytes.
+    New messages are appended in memory and written to the database in
+    batches, by a background thread every flush_interval_ms, or as soon as
+    a channel has flush_size pending messages. Pending messages of an evicted
+    channel are kept, and retried, until they are written.
+    """
+    def __init__(self, write_function=None, max_channels=100, max_bytes=16777216, flush_interval_ms=500, flush_size=20):
+        """
+        :param write_function: function(channel_id, messages, breadcrumb) that appends messages to the conversation
+        :param max_channels: Maximum number of channels to cache
+        :param max_bytes: Maximum approximate size of all cached messages
+        :param flush_interval_ms: Milliseconds between background flushes
+        :param flush_size: Number of pending messages that triggers an immediate flush of a channel
+        """
+        self.write = write_function
+        self.max_channels = max_channels
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval_ms / 1000
+        self.flush_size = flush_size
+        self.channels = OrderedDict()
+        self.bytes = 0
+        self.evicted = []
+        self.loading = {}
+        self.lock = threading.RLock()
+        self.flush_lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.flusher = None
+
+    @staticmethod
+    def message_size(message):
+        """Approximate size of a cached message"""
+        return len(message["content"]) + len(message["role"])
+
+    def add_message(self, channel_id, message, breadcrumb=None, load_function=None):
+        """
+        Append a message to a cached conversation, loading the conversation on a miss.
+
+        :param load_function: function() that returns the conversation messages on a cache miss
+        :return: A copy of all of the cached messages in the conversation
+        """
+        loaded = None
+        load = None
+        while True:
+            with self.lock:
+                if load is not None:
+                    self._end_load(channel_id, load)
+                entry = self.channels.get(channel_id)
+                if entry is None and loaded is not None and not load["stale"]:
+                    messages = loaded
+                    entry = {"messages": messages, "pending": [], "breadcrumb": None, "bytes": sum(self.message_size(m) for m in messages)}
+                    self.channels[channel_id] = entry
+                    self.bytes += entry["bytes"]
+                if entry is not None:
+                    self.channels.move_to_end(channel_id)
+                    size = self.message_size(message)
+                    entry["messages"].append(message)
+                    entry["pending"].append(message)
+                    entry["breadcrumb"] = breadcrumb
+                    entry["bytes"] += size
+                    self.bytes += size
+                    messages = list(entry["messages"])
+                    flush_now = len(entry["pending"]) >= self.flush_size
+                    evicted = self._evict_over_limit(keep=channel_id)
+                    break
+
+                # A miss, or the channel was evicted with pending messages while it was
+                # loading, so the load may not include them. Load (again) outside the lock,
+                # the load function may flush the cache, which takes the flush lock.
+                load = {"stale": False}
+                self.loading.setdefault(channel_id, []).append(load)
+            try:
+                loaded = list(load_function()) if load_function else []
+            except Exception:
+                with self.lock:
+                    self._end_load(channel_id, load)
+                raise
+
+        self._start_flusher()
+        for evicted_id in evicted:
+            self.flush(evicted_id)
+        if flush_now:
+            self.flush(channel_id)
+        return messages
+
+    def flush(self, channel_id=None):
+        """Write the pending messages of one, or all, cached channels to the database"""
+        with self.flush_lock:
+            with self.lock:
+                channel_ids = [channel_id] if channel_id is not None else list(self.channels.keys())
+                # Messages of evicted channels are older than the cached ones, write them first
+                batches = [batch for batch in self.evicted if channel_id is None or batch[0] == channel_id]
+                self.evicted = [batch for batch in self.evicted if channel_id is not None and batch[0] != channel_id]
+                evicted_count = len(batches)
+                for cached_id in channel_ids:
+                    entry = self.channels.get(cached_id)
+                    if entry and entry["pending"]:
+                        batches.append((cached_id, entry["pending"], entry["breadcrumb"]))
+                        entry["pending"] = []
+
+            failed = []
+            failed_ids = set()
+            for index, batch in enumerate(batches):
+                # Keep the messages of a channel in order, skip its later batches after a failure
+                if batch[0] in failed_ids or not self._write(*batch):
+                    failed.append((index < evicted_count, batch))
+                    failed_ids.add(batch[0])
+
+            # Put the messages back so they are retried by the next flush
+            with self.lock:
+                retry = []
+                for was_evicted, batch in failed:
+                    entry = self.channels.get(batch[0])
+                    if entry is not None and not was_evicted and not any(evicted[0] == batch[0] for evicted in self.evicted):
+                        entry["pending"] = batch[1] + entry["pending"]
+                    else:
+                        retry.append(batch)
+                self.evicted = retry + self.evicted
+
+    def evict(self, channel_id):
+        """Flush and remove a channel, used before the conversation is changed in the database"""
+        with self.lock:
+            entry = self.channels.pop(channel_id, None)
+            if entry is not None: self._removed(channel_id, entry)
+        self.flush(channel_id)
+
+    def close(self):
+        """Stop the background flusher and write all pending messages"""
+        self.stop_event.set()
+        if self.flusher is not None:
+            self.flusher.join(timeout=self.flush_interval * 2)
+            self.flusher = None
+        self.flush()
+        self.stop_event.clear()
+
+    def _evict_over_limit(self, keep=None):
+        """Remove least recently used channels beyond the limits, caller must hold the lock
+
+        :return: The ids of evicted channels with pending messages
+        """
+        evicted = []
+        while len(self.channels) > 1 and (len(self.channels) > self.max_channels or self.bytes > self.max_bytes):
+            oldest_id = next(iter(self.channels))
+            if oldest_id == keep: break
+            entry = self.channels.pop(oldest_id)
+            self._removed(oldest_id, entry)
+            if entry["pending"]: evicted.append(oldest_id)
+        return evicted
+
+    def _removed(self, channel_id, entry):
+        """Account for a channel removed from the cache, caller must hold the lock"""
+        self.bytes -= entry["bytes"]
+        if entry["pending"]:
+            # The pending messages are written by the next flush of the channel,
+            # loads that are in progress may have read the conversation without them
+            self.evicted.append((channel_id, entry["pending"], entry["breadcrumb"]))
+            for load in self.loading.get(channel_id, []): load["stale"] = True
+
+    def _end_load(self, channel_id, load):
+        """Stop tracking a load of a channel, caller must hold the lock"""
+        loads = [other for other in self.loading[channel_id] if other is not load]
+        if loads: self.loading[channel_id] = loads
+        else: del self.loading[channel_id]
+
+    def _write(self, channel_id, messages, breadcrumb):
+        """Write a batch of messages, returns False if the write failed"""
+        try:
+            self.write(channel_id, messages, breadcrumb)
+            return True
+        except Exception as e:
+            logger.error(f"Failed to write {len(messages)} cached messages to {channel_id}: {e}")
+            return False
+
+    def _start_flusher(self):
+        """Start the background flush thread on first use"""
+        if self.flusher is not None: return
+        with self.lock:
+            if self.flusher is not None: return
+            self.flusher = threading.Thread(target=self._flush_loop, name="conversation-cache-flush", daemon=True)
+            self.flusher.start()
+
+    def _flush_loop(self):
+        while not self.stop_event.wait(self.flush_interval):
+            self.flush()
@@ -1,7 +1,11 @@
 import csv
 from io import StringIO
+from itertools import groupby
+from pymongo import ASCENDING
+from pymongo.errors import DuplicateKeyError, OperationFailure
 from stage0_py_utils.mongo_utils.mongo_io import MongoIO
 from stage0_py_utils.config.config import Config
+from stage0_py_utils.services.conversation_cache import ConversationCache
 from stage0_py_utils.echo.message import Message
 from datetime import datetime
 import logging
@@ -12,6 +16,13 @@ class ConversationServices:
     CYAN = "\033[36m "
     BLUE = "\033[94m"
     RESET = "\033[0m"        
+    
+    # Message storage modes (config.MESSAGE_STORAGE)
+    EMBEDDED_STORAGE = "embedded"   # messages array in the conversation document
+    BUCKET_STORAGE = "bucket"       # fixed size message bucket documents
+
+    # Write-behind conversation cache (config.CONVERSATION_CACHE)
+    _cache = None
 
     @staticmethod 
     def _check_user_access(token):
@@ -19,12 +30,115 @@ class ConversationServices:
         return # No RBAC yet
 
     @staticmethod
-    def get_conversations(token=None):
+    def get_cache():
+        """
+        Get the in-process conversation cache, None unless config.CONVERSATION_CACHE is enabled.
+        """
+        config = Config.get_instance()
+        if not config.CONVERSATION_CACHE: return None
+        if ConversationServices._cache is None:
+            ConversationServices._cache = ConversationCache(
+                write_function=ConversationServices._write_messages,
+                max_channels=config.CONVERSATION_CACHE_CHANNELS,
+                max_bytes=config.CONVERSATION_CACHE_BYTES,
+                flush_interval_ms=config.CONVERSATION_FLUSH_INTERVAL_MS,
+                flush_size=config.CONVERSATION_FLUSH_SIZE
+            )
+        return ConversationServices._cache
+
+    @staticmethod
+    def close_cache():
+        """Write any cached messages to the database, used when Echo is closed"""
+        if ConversationServices._cache is not None:
+            ConversationServices._cache.close()
+
+    @staticmethod
+    def create_indexes():
+        """
+        Create the indexes the conversation services depend on, if they do not exist.
+
+        - active_channel is unique, it allows only one active/latest conversation 
+          per channel, which makes the add_message upsert race free. Duplicate 
+          active conversations are archived first, if the index still can not be 
+          created the error is logged and the other indexes are created without it.
+        - channel_version_status serves channel lookups, and prefix searches by name.
+        - version_status serves the paged list of active conversations.
+        - conversation_sequence is unique, it serves reading and upserting message buckets.
+
+        Returns:
+            list: Index reports from MongoIO.ensure_indexes for each collection
+        """
+        config = Config.get_instance()
+        mongo = MongoIO.get_instance()
+        conversation_indexes = [
+            {
+                "name": "active_channel",
+                "key": [("channel_id", ASCENDING)],
+                "unique": True,
+                "partialFilterExpression": {"version": config.LATEST_VERSION, "status": config.ACTIVE_STATUS}
+            },
+            {
+                "name": "channel_version_status",
+                "key": [("channel_id", ASCENDING), ("version", ASCENDING), ("status", ASCENDING)]
+            },
+            {
+                "name": "version_status",
+                "key": [("version", ASCENDING), ("status", ASCENDING), ("_id", ASCENDING)]
+            }
+        ]
+        message_indexes = [
+            {
+                "name": "conversation_sequence",
+                "key": [("conversation_id", ASCENDING), ("sequence", ASCENDING)],
+                "unique": True
+            }
+        ]
+        ConversationServices.archive_duplicate_conversations()
+        try:
+            reports = [mongo.ensure_indexes(config.CONVERSATION_COLLECTION_NAME, conversation_indexes)]
+        except OperationFailure as e:
+            logger.error(f"Unable to create the unique active_channel index on {config.CONVERSATION_COLLECTION_NAME}, "
+                         f"concurrent messages to a new channel may create duplicate conversations: {e}")
+            reports = [mongo.ensure_indexes(config.CONVERSATION_COLLECTION_NAME, conversation_indexes[1:])]
+        if config.MESSAGE_STORAGE == ConversationServices.BUCKET_STORAGE:
+            reports.append(mongo.ensure_indexes(config.MESSAGE_COLLECTION_NAME, message_indexes))
+        return reports
+
+    @staticmethod
+    def archive_duplicate_conversations():
+        """
+        Archive all but the oldest active/latest conversation of each channel. Databases 
+        saved before the active_channel index existed can have duplicates, which would 
+        stop the unique index from being created.
+
+        Returns:
+            int: The number of conversations archived
+        """
+        config = Config.get_instance()
+        mongo = MongoIO.get_instance()
+        pipeline = [
+            {"$match": {"version": config.LATEST_VERSION, "status": config.ACTIVE_STATUS}},
+            {"$sort": {"_id": 1}},
+            {"$group": {"_id": "$channel_id", "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+            {"$match": {"count": {"$gt": 1}}}
+        ]
+        archived = 0
+        for duplicate in mongo.execute_pipeline(config.CONVERSATION_COLLECTION_NAME, pipeline):
+            for conversation_id in duplicate["ids"][1:]:
+                mongo.update_document(config.CONVERSATION_COLLECTION_NAME, document_id=conversation_id, set_data={"status": config.ARCHIVED_STATUS})
+                archived += 1
+            logger.warning(f"Archived {duplicate['count'] - 1} duplicate active conversations for channel {duplicate['_id']}")
+        return archived
+
+    @staticmethod
+    def get_conversations(token=None, after=None, limit=None):
         """
         Get a list of the latest segment of all active conversations
 
         Args:
             token (token): Access Token from the requesting agent
+            after (str): Optional _id of the last conversation on the previous page
+            limit (int): Optional maximum number of conversations to return
 
         Returns:
             list: List of currently active conversations. (_id, name)
@@ -37,7 +151,7 @@ class ConversationServices:
             {"status": config.ACTIVE_STATUS}
         ]}
         project = {"_id":1, "channel_id":1}
-        conversations = mongo.get_documents(config.CONVERSATION_COLLECTION_NAME, match, project)
+        conversations = mongo.get_documents(config.CONVERSATION_COLLECTION_NAME, match, project, after=after, limit=limit)
         return conversations
 
     @staticmethod
@@ -46,7 +160,8 @@ class ConversationServices:
         Get a list of conversation _id and name (channel_id)
 
         Args:
-            query (str): Regex of channel_id values to return
+            query (str): Regex of channel_id values to return, anchored to the 
+                start of the name so that it can use the channel_id index
             token (token): Access Token from the requesting agent
 
         Returns:
@@ -57,40 +172,164 @@ class ConversationServices:
         ConversationServices._check_user_access(token)
         config = Config.get_instance()
         mongo = MongoIO.get_instance()
+        if query and not query.startswith("^"):
+            query = f"^{query}"
         match = {"channel_id": {"$regex": query}} if query else None
         project = {"_id":1, "channel_id":1}
         conversations = mongo.get_documents(config.CONVERSATION_COLLECTION_NAME, match, project)
         return conversations
 
     @staticmethod
-    def get_conversation(channel_id=None, token=None, breadcrumb=None):
-        """Get the specified conversation"""
+    def window_start(count=0, window=None):
+        """
+        Index of the first message in a window of the most recent messages
+
+        The start of the window moves config.LLM_CONTEXT_TRIM_STEP messages at a time, 
+        so a window holds from window to window + step - 1 messages, and the start 
+        of the LLM prompt stays the same for several turns.
+
+        Args:
+            count (int): Number of (non pinned) messages in the conversation
+            window (int): Minimum number of the most recent messages to include
+
+        Returns:
+            int: The index of the first message in the window
+        """
+        step = max(1, Config.get_instance().LLM_CONTEXT_TRIM_STEP)
+        return max(count - window, 0) // step * step
+
+    @staticmethod
+    def window_projection(window=None):
+        """
+        Projection that limits the messages returned with a conversation
+
+        Args:
+            window (int): Number of the most recent messages to return, 
+                pinned (system role) messages such as a personality are always returned. 
+
+        Returns:
+            dict: A projection with the pinned messages followed by the last window messages,
+                and a message_count of all messages in the conversation. None if window is not set. 
+                The window start is aligned the same way as window_start.
+        """
+        if not window: return None
+        step = max(1, Config.get_instance().LLM_CONTEXT_TRIM_STEP)
+        pinned = {"$eq": ["$$this.role", Message.SYSTEM_ROLE]}
+        start = {"$multiply": [{"$floor": {"$divide": [{"$max": [{"$subtract": [{"$size": "$$recent"}, window]}, 0]}, step]}}, step]}
+        return {
+            "channel_id": 1,
+            "status": 1,
+            "version": 1,
+            "last_saved": 1,
+            "message_count": {"$size": "$messages"},
+            "messages": {"$concatArrays": [
+                {"$filter": {"input": "$messages", "cond": pinned}},
+                {"$let": {
+                    "vars": {"recent": {"$filter": {"input": "$messages", "cond": {"$not": [pinned]}}}},
+                    "in": {"$slice": ["$$recent", {"$toInt": start}, window + step - 1]}
+                }}
+            ]}
+        }
+
+    @staticmethod
+    def window_messages(messages=None, window=None):
+        """
+        Apply the window_projection to a list of messages in memory
+
+        Args:
+            messages (list): All of the messages in a conversation
+            window (int): Number of the most recent messages to return, 
+                pinned (system role) messages are always returned. 
+
+        Returns:
+            list: The pinned messages followed by the last window messages, all messages if window is not set.
+        """
+        if not window: return messages
+        pinned = [message for message in messages if message["role"] == Message.SYSTEM_ROLE]
+        recent = [message for message in messages if message["role"] != Message.SYSTEM_ROLE]
+        return pinned + recent[ConversationServices.window_start(len(recent), window):]
+
+    @staticmethod
+    def get_conversation(channel_id=None, token=None, breadcrumb=None, window=None):
+        """Get the specified conversation, optionally with only a window of the most recent messages"""
         ConversationServices._check_user_access(token)
         config = Config.get_instance()
         mongo = MongoIO.get_instance()
+        ConversationServices._flush_cached(channel_id)
+        bucket_storage = config.MESSAGE_STORAGE == ConversationServices.BUCKET_STORAGE
         match = {"$and": [
             {"channel_id": channel_id},
             {"version": config.LATEST_VERSION},
             {"status": config.ACTIVE_STATUS}
         ]}
-        conversations = mongo.get_documents(collection_name=config.CONVERSATION_COLLECTION_NAME, match=match)
+        project = None if bucket_storage else ConversationServices.window_projection(window)
+        conversations = mongo.get_documents(collection_name=config.CONVERSATION_COLLECTION_NAME, match=match, project=project)
         if len(conversations) == 0:
+            # Upsert the new conversation, channel_id/version/status are taken from the match
             data = {}
-            data["channel_id"] = channel_id
-            data["status"] = config.ACTIVE_STATUS
-            data["version"] = config.LATEST_VERSION
             data["last_saved"] = breadcrumb
-            data["messages"] = []
-            new_id = mongo.create_document(collection_name=config.CONVERSATION_COLLECTION_NAME, document=data)
-            conversation = mongo.get_document(collection_name=config.CONVERSATION_COLLECTION_NAME, document_id=new_id)
-            return conversation
+            if bucket_storage:
+                data["message_count"] = 0
+                data["pinned"] = []
+            else:
+                data["messages"] = []
+            conversation = ConversationServices._upsert(match=match, set_on_insert_data=data, project=project)
         else:
-            return conversations[0]
+            conversation = conversations[0]
+
+        if bucket_storage:
+            conversation["messages"] = ConversationServices._get_bucket_messages(conversation=conversation, window=window)
+            conversation.pop("pinned", None)
+        return conversation
         
+    @staticmethod
+    def get_messages(channel_id=None, start=0, end=None, token=None):
+        """
+        Get a range of messages from the active conversation
+
+        Args:
+            channel_id (str): The channel_id of the conversation
+            start (int): Index of the first message to return
+            end (int): Index after the last message to return, None for all remaining messages
+            token (token): Access Token from the requesting agent
+
+        Returns:
+            list: The messages[start:end] from the conversation, only the 
+                buckets holding the range are read when using bucket storage.
+        """
+        ConversationServices._check_user_access(token)
+        config = Config.get_instance()
+        mongo = MongoIO.get_instance()
+        if end is not None and end <= start: return []
+        ConversationServices._flush_cached(channel_id)
+        match = {"$and": [
+            {"channel_id": channel_id},
+            {"version": config.LATEST_VERSION},
+            {"status": config.ACTIVE_STATUS}
+        ]}
+        if config.MESSAGE_STORAGE != ConversationServices.BUCKET_STORAGE:
+            count = end - start if end is not None else 2**31 - 1
+            project = {"_id": 0, "messages": {"$slice": [start, count]}}
+            conversations = mongo.get_documents(config.CONVERSATION_COLLECTION_NAME, match=match, project=project)
+            return conversations[0]["messages"] if conversations else []
+
+        conversations = mongo.get_documents(config.CONVERSATION_COLLECTION_NAME, match=match, project={"_id": 1})
+        if not conversations: return []
+        size = config.MESSAGE_BUCKET_SIZE
+        sequence_range = {"$gte": start // size}
+        if end is not None: sequence_range["$lte"] = (end - 1) // size
+        buckets = mongo.get_documents(config.MESSAGE_COLLECTION_NAME, 
+            match={"conversation_id": conversations[0]["_id"], "sequence": sequence_range},
+            project={"_id": 0, "messages": 1}, sort_by=[("sequence", ASCENDING)])
+        messages = ConversationServices._bucket_messages(buckets)
+        offset = start - (start // size) * size
+        return messages[offset:] if end is None else messages[offset:offset + end - start]
+
     @staticmethod
     def update_conversation(channel_id=None, data=None, token=None, breadcrumb=None):
         """Update the latest version of the specified conversation"""
         ConversationServices._check_user_access(token)
+        ConversationServices._evict_cached(channel_id)
         config = Config.get_instance()
         mongo = MongoIO.get_instance()
         match = {"$and": [
@@ -103,18 +342,38 @@ class ConversationServices:
         return conversation
     
     @staticmethod
-    def add_message(channel_id=None, message=None, token=None, breadcrumb=None):
-        """Add a message to the conversation and generate a reply"""
+    def add_message(channel_id=None, message=None, token=None, breadcrumb=None, window=None):
+        """
+        Add a message to the conversation 
+        
+        Returns the pinned (system) messages and the last window messages of the 
+        conversation, window defaults to config.MESSAGE_WINDOW, 0 returns all messages.
+        """
         ConversationServices._check_user_access(token)
         config = Config.get_instance()
         mongo = MongoIO.get_instance()
+        window = config.MESSAGE_WINDOW if window is None else window
+
+        cache = ConversationServices.get_cache()
+        if cache is not None:
+            # Append in memory, the cache writes the message to the database in a later batch
+            load = lambda: ConversationServices.get_messages(channel_id=channel_id, token=token)
+            messages = cache.add_message(channel_id, message, breadcrumb=breadcrumb, load_function=load)
+            if len(messages) >= config.MAX_MESSAGES:
+                ConversationServices.reset_conversation(channel_id=channel_id, token=token, breadcrumb=breadcrumb)
+            ConversationServices.colorful_log(["Message cached for:", channel_id, " with role:", message["role"], " content:", message["content"][:60]])
+            return ConversationServices.window_messages(messages, window)
+
+        if config.MESSAGE_STORAGE == ConversationServices.BUCKET_STORAGE:
+            conversation = ConversationServices._push_bucket_messages(channel_id=channel_id, messages=[message], token=token, breadcrumb=breadcrumb)
+            messages = ConversationServices._get_bucket_messages(conversation=conversation, window=window)
+            if conversation["message_count"] >= config.MAX_MESSAGES:
+                ConversationServices.reset_conversation(channel_id=channel_id, token=token, breadcrumb=breadcrumb)
+            ConversationServices.colorful_log(["Message added to:", channel_id, " with role:", message["role"], " content:", message["content"][:60]])
+            return messages
         
-        # Fetch the existing conversation, create it if needed
-        conversation = ConversationServices.get_conversation(channel_id=channel_id, token=token, breadcrumb=breadcrumb)
-        if len(conversation["messages"]) > 1000: #TODO: Add config.MAX_MESSAGES
-            conversation = ConversationServices.reset_conversation(channel_id=channel_id, token=token, breadcrumb=breadcrumb)
-        
-        # Update Conversation - push message onto messages
+        # Create or append to the conversation in one round trip
+        project = ConversationServices.window_projection(window)
         match = {"$and": [
             {"channel_id": channel_id},
             {"version": config.LATEST_VERSION},
@@ -122,16 +381,49 @@ class ConversationServices:
         ]}
         set_data = {"last_saved": breadcrumb}
         push_data = {"messages": message}
-        reply = mongo.update_document(config.CONVERSATION_COLLECTION_NAME, match=match, set_data=set_data, push_data=push_data)
+        reply = ConversationServices._upsert(match=match, set_data=set_data, push_data=push_data, project=project)
         messages = reply["messages"]
+
+        # Roll over a full conversation, the next message will start a new one
+        message_count = reply["message_count"] if "message_count" in reply else len(messages)
+        if message_count >= config.MAX_MESSAGES:
+            ConversationServices.reset_conversation(channel_id=channel_id, token=token, breadcrumb=breadcrumb)
         
         ConversationServices.colorful_log(["Message added to:", channel_id, " with role:", message["role"], " content:", message["content"][:60]])
         return messages
 
+    @staticmethod
+    def add_messages(channel_id=None, messages=None, token=None, breadcrumb=None):
+        """
+        Add a batch of messages to the conversation in a single write
+
+        Returns the number of messages in the conversation
+        """
+        ConversationServices._check_user_access(token)
+        config = Config.get_instance()
+        if not messages: return 0
+
+        cache = ConversationServices.get_cache()
+        if cache is not None:
+            load = lambda: ConversationServices.get_messages(channel_id=channel_id, token=token)
+            for message in messages:
+                conversation = cache.add_message(channel_id, message, breadcrumb=breadcrumb, load_function=load)
+            message_count = len(conversation)
+        else:
+            message_count = ConversationServices._write_messages(channel_id, messages, breadcrumb)
+
+        # Roll over a full conversation, the next message will start a new one
+        if message_count >= config.MAX_MESSAGES:
+            ConversationServices.reset_conversation(channel_id=channel_id, token=token, breadcrumb=breadcrumb)
+
+        ConversationServices.colorful_log(["Messages added to:", channel_id, " count:", str(len(messages))])
+        return message_count
+
     @staticmethod
     def reset_conversation(channel_id=None, token=None, breadcrumb=None):
         """Move the active conversation to complete and set the version string"""
         ConversationServices._check_user_access(token)
+        ConversationServices._evict_cached(channel_id)
         config = Config.get_instance()
         mongo = MongoIO.get_instance()
         reply = {}
@@ -155,6 +447,8 @@ class ConversationServices:
     def load_named_conversation(channel_id=None, named_conversation=None, token=None, breadcrumb=None):
         """Copy the messages from the named conversation to the channels conversation."""
         ConversationServices._check_user_access(token)
+        ConversationServices._evict_cached(channel_id)
+        ConversationServices._flush_cached(named_conversation)
         config = Config.get_instance()
         mongo = MongoIO.get_instance()
         
@@ -170,6 +464,11 @@ class ConversationServices:
         if len(source_conversation_list) > 1:
             logger.warning(f"Non-Unique Named Conversation! {len(source_conversation_list)} conversations named {named_conversation} were found")
         source_conversation = source_conversation_list[0]
+        if config.MESSAGE_STORAGE == ConversationServices.BUCKET_STORAGE:
+            source_messages = ConversationServices._get_bucket_messages(conversation=source_conversation)
+            target_conversation = ConversationServices._push_bucket_messages(channel_id=channel_id, messages=source_messages, token=token, breadcrumb=breadcrumb)
+            ConversationServices.colorful_log(["Conversation:", named_conversation, " has loaded ", str(len(source_messages)), " messages into ", channel_id])
+            return target_conversation
         
         # Add the Messages from the source to the Channel Conversation
         # Make sure the target conversation exists first. 
@@ -192,6 +491,7 @@ class ConversationServices:
     def load_given_conversation(channel_id=None, csv_data=None, token=None, breadcrumb=None):
         """Copy the messages from the csv_data to the channels conversation."""
         ConversationServices._check_user_access(token)
+        ConversationServices._evict_cached(channel_id)
         config = Config.get_instance()
         mongo = MongoIO.get_instance()
         
@@ -206,6 +506,10 @@ class ConversationServices:
             ).as_llm_message()
             for row in reader
         ]        
+        if config.MESSAGE_STORAGE == ConversationServices.BUCKET_STORAGE:
+            target_conversation = ConversationServices._push_bucket_messages(channel_id=channel_id, messages=messages, token=token, breadcrumb=breadcrumb)
+            ConversationServices.colorful_log(["Conversation:", channel_id, " has loaded ", str(len(messages)), " messages from the provided csv data"])
+            return target_conversation
         
         # Make sure the target conversation exists first. 
         target_conversation = ConversationServices.get_conversation(channel_id=channel_id, token=token, breadcrumb=breadcrumb)
@@ -225,6 +529,134 @@ class ConversationServices:
         ConversationServices.colorful_log(["Conversation:", channel_id, " has loaded ", str(len(messages)), " messages from the provided csv data"])
         return target_conversation
 
+    @staticmethod
+    def _push_bucket_messages(channel_id=None, messages=None, token=None, breadcrumb=None):
+        """
+        Append messages to the active conversation using bucket storage.
+        The conversation message_count is incremented to reserve a range of message 
+        indexes, and each message is pushed to bucket (index // MESSAGE_BUCKET_SIZE),
+        so an append is one header write and one write per bucket touched. 
+        Messages are stored with their index and kept sorted by it, so concurrent 
+        appends to a bucket stay in order. Pinned (system) messages are also kept 
+        in the header, so windowed reads only read the most recent buckets.
+
+        Returns:
+            dict: The updated conversation header (_id, message_count, ...)
+        """
+        config = Config.get_instance()
+        mongo = MongoIO.get_instance()
+        match = {"$and": [
+            {"channel_id": channel_id},
+            {"version": config.LATEST_VERSION},
+            {"status": config.ACTIVE_STATUS}
+        ]}
+        set_data = {"last_saved": breadcrumb}
+        inc_data = {"message_count": len(messages)}
+        pinned = [message for message in messages if message["role"] == Message.SYSTEM_ROLE]
+        if pinned:
+            conversation = ConversationServices._upsert(match=match, set_data=set_data, inc_data=inc_data, push_data={"pinned": {"$each": pinned}})
+        else:
+            conversation = ConversationServices._upsert(match=match, set_data=set_data, inc_data=inc_data, set_on_insert_data={"pinned": []})
+
+        size = config.MESSAGE_BUCKET_SIZE
+        first_index = conversation["message_count"] - len(messages)
+        for sequence, indexed_messages in groupby(enumerate(messages, first_index), key=lambda item: item[0] // size):
+            bucket_match = {"conversation_id": conversation["_id"], "sequence": sequence}
+            push_data = {"messages": {
+                "$each": [{**message, "index": index} for index, message in indexed_messages],
+                "$sort": {"index": ASCENDING}
+            }}
+            mongo.update_document(config.MESSAGE_COLLECTION_NAME, match=bucket_match, push_data=push_data, project={"_id": 1}, upsert=True)
+        return conversation
+
+    @staticmethod
+    def _write_messages(channel_id, messages, breadcrumb):
+        """Append a batch of messages to the active conversation, and return the new message count"""
+        config = Config.get_instance()
+        if config.MESSAGE_STORAGE == ConversationServices.BUCKET_STORAGE:
+            conversation = ConversationServices._push_bucket_messages(channel_id=channel_id, messages=messages, breadcrumb=breadcrumb)
+            return conversation["message_count"]
+        match = {"$and": [
+            {"channel_id": channel_id},
+            {"version": config.LATEST_VERSION},
+            {"status": config.ACTIVE_STATUS}
+        ]}
+        set_data = {"last_saved": breadcrumb}
+        push_data = {"messages": {"$each": messages}}
+        project = {"message_count": {"$size": "$messages"}}
+        conversation = ConversationServices._upsert(match=match, set_data=set_data, push_data=push_data, project=project)
+        return conversation["message_count"]
+
+    @staticmethod
+    def _flush_cached(channel_id):
+        """Write any cached messages for the channel, so that a database read includes them"""
+        if ConversationServices._cache is not None:
+            ConversationServices._cache.flush(channel_id)
+
+    @staticmethod
+    def _evict_cached(channel_id):
+        """Flush and drop the cached channel, so that a database change is not overwritten"""
+        if ConversationServices._cache is not None:
+            ConversationServices._cache.evict(channel_id)
+
+    @staticmethod
+    def _upsert(match=None, **update):
+        """
+        Update the active conversation, creating it if it does not exist. 
+        If a concurrent upsert created the conversation first, the unique 
+        active_channel index rejects the duplicate and the update is retried. 
+        This depends on create_indexes having created that index.
+        """
+        config = Config.get_instance()
+        mongo = MongoIO.get_instance()
+        try:
+            return mongo.update_document(config.CONVERSATION_COLLECTION_NAME, match=match, upsert=True, **update)
+        except DuplicateKeyError:
+            return mongo.update_document(config.CONVERSATION_COLLECTION_NAME, match=match, upsert=True, **update)
+
+    @staticmethod
+    def _get_bucket_messages(conversation=None, window=None):
+        """
+        Read the messages of a conversation from bucket storage. With a window only the 
+        buckets holding the last window messages are read, and the pinned (system) messages
+        come from the conversation header. Conversations saved before the header had pinned 
+        messages read them from the older buckets instead.
+
+        Returns:
+            list: The pinned messages followed by the last window messages, or all messages.
+        """
+        config = Config.get_instance()
+        mongo = MongoIO.get_instance()
+        match = {"conversation_id": conversation["_id"]}
+        project = {"_id": 0, "messages": 1}
+        pinned_messages = conversation.get("pinned")
+        if window:
+            first_index = ConversationServices.window_start(conversation.get("message_count", 0), window)
+            first_sequence = first_index // config.MESSAGE_BUCKET_SIZE
+            if pinned_messages is not None:
+                match["sequence"] = {"$gte": first_sequence}
+            else:
+                pinned = {"$filter": {"input": "$messages", "cond": {"$eq": ["$$this.role", Message.SYSTEM_ROLE]}}}
+                project = {"_id": 0, "messages": {"$cond": [{"$gte": ["$sequence", first_sequence]}, "$messages", pinned]}}
+        buckets = mongo.get_documents(config.MESSAGE_COLLECTION_NAME, match=match, project=project, sort_by=[("sequence", ASCENDING)])
+        messages = ConversationServices._bucket_messages(buckets)
+        if not window: return messages
+
+        # The full buckets are last, skip the messages in them before the window start
+        window_offset = max(len(messages) - (conversation.get("message_count", 0) - first_index), 0)
+        if pinned_messages is None:
+            pinned_messages = [message for message in messages if message["role"] == Message.SYSTEM_ROLE]
+        recent_messages = [message for message in messages[window_offset:] if message["role"] != Message.SYSTEM_ROLE]
+        return pinned_messages + recent_messages
+
+    @staticmethod
+    def _bucket_messages(buckets=None):
+        """The messages of a list of buckets, without the stored message index"""
+        return [
+            {key: value for key, value in message.items() if key != "index"}
+            for bucket in buckets for message in bucket["messages"]
+        ]
+
     @staticmethod
     def colorful_log(strings=None):
         """Logs a list of strings with alternating BLUE and CYAN colors."""
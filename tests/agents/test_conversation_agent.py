@@ -13,6 +13,7 @@ class TestConversationAgent(unittest.TestCase):
         self.get_conversation = self.conversation_agent.actions["get_conversation"]["function"]
         self.update_conversation = self.conversation_agent.actions["update_conversation"]["function"]
         self.add_message = self.conversation_agent.actions["add_message"]["function"]
+        self.add_messages = self.conversation_agent.actions["add_messages"]["function"]
 
     @patch("stage0_py_utils.agents.conversation_agent.create_echo_token")  
     @patch("stage0_py_utils.agents.conversation_agent.create_echo_breadcrumb")  
@@ -201,6 +202,37 @@ class TestConversationAgent(unittest.TestCase):
         mock_create_echo_breadcrumb.assert_called_once_with("fake_token")
         mock_add_message.assert_called_once_with(channel_id=arguments["channel_id"], message=arguments["message"], token="fake_token", breadcrumb=fake_breadcrumb)
         self.assertEqual(result, "error")
+
+    @patch("stage0_py_utils.agents.conversation_agent.create_echo_token")  
+    @patch("stage0_py_utils.agents.conversation_agent.create_echo_breadcrumb")  
+    @patch("stage0_py_utils.ConversationServices.add_messages")
+    def test_add_messages_success(self, mock_add_messages, mock_create_echo_breadcrumb, mock_create_echo_token):
+        """Test successful execution of add_messages action."""
+        mock_create_echo_token.return_value = "fake_token"
+        fake_breadcrumb = {"at_time":"sometime", "correlation_id":"correlation_ID"}
+        mock_create_echo_breadcrumb.return_value = fake_breadcrumb
+        mock_add_messages.return_value = 3
+        
+        arguments = {
+            "channel_id": "channel_1",
+            "messages": ["One", "Two"]
+        }
+        result = self.add_messages(arguments)
+        
+        mock_add_messages.assert_called_once_with(channel_id=arguments["channel_id"], messages=arguments["messages"], token="fake_token", breadcrumb=fake_breadcrumb)
+        self.assertEqual(result, 3)
+
+    @patch("stage0_py_utils.agents.conversation_agent.create_echo_token")  
+    @patch("stage0_py_utils.agents.conversation_agent.create_echo_breadcrumb")  
+    @patch("stage0_py_utils.ConversationServices.add_messages")
+    def test_add_messages_fail(self, mock_add_messages, mock_create_echo_breadcrumb, mock_create_echo_token):
+        """Test fail of add_messages action."""
+        mock_create_echo_token.return_value = "fake_token"
+        mock_create_echo_breadcrumb.return_value = {"atTime":"sometime", "correlationId":"correlation_ID"}
+        mock_add_messages.side_effect = Exception("Test Exception")
+        
+        result = self.add_messages({"channel_id": "channel_1", "messages": ["One"]})
+        self.assertEqual(result, "error")
                     
 if __name__ == "__main__":
     unittest.main()
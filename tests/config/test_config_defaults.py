@@ -25,6 +25,10 @@ class TestConfigDefaults(unittest.TestCase):
         for key, default in self.config.config_string_secrets.items():
             self.assertEqual(getattr(self.config, key), default)
 
+    def test_default_json_properties(self):
+        for key, default in self.config.config_jsons.items():
+            self.assertEqual(getattr(self.config, key), json.loads(default))
+
     def test_default_json_secret_properties(self):
         for key, default in self.config.config_json_secrets.items():
             self.assertEqual(getattr(self.config, key), json.loads(default))
@@ -39,7 +43,7 @@ class TestConfigDefaults(unittest.TestCase):
         self.assertIsInstance(result_dict["token"], dict)
         
     def test_default_string_ci(self):
-        for key, default in {**self.config.config_strings, **self.config.config_ints}.items():
+        for key, default in {**self.config.config_strings, **self.config.config_ints, **self.config.config_jsons}.items():
             self._test_config_default_value(key, default)
 
     def test_default_secret_ci(self):
@@ -20,7 +20,7 @@ class TestConfigEnvironment(unittest.TestCase):
         for key, default in self.config.config_booleans.items():
             os.environ[key] = "true"
 
-        for key, default in self.config.config_json_secrets.items():
+        for key, default in {**self.config.config_jsons, **self.config.config_json_secrets}.items():
             os.environ[key] = '{"foo":"bar"}'
 
         # Initialize the Config object
@@ -28,7 +28,7 @@ class TestConfigEnvironment(unittest.TestCase):
         self.config.initialize()
         
         # Reset environment variables 
-        for key, default in {**self.config.config_strings, **self.config.config_ints, **self.config.config_string_secrets, **self.config.config_json_secrets}.items():
+        for key, default in {**self.config.config_strings, **self.config.config_ints, **self.config.config_booleans, **self.config.config_jsons, **self.config.config_string_secrets, **self.config.config_json_secrets}.items():
             if key != "BUILT_AT" and key != "CONFIG_FOLDER":
                 del os.environ[key]
             
@@ -45,6 +45,11 @@ class TestConfigEnvironment(unittest.TestCase):
         for key, default in self.config.config_booleans.items():
             self.assertEqual(getattr(self.config, key), True)
             
+    def test_env_json_properties(self):
+        for key, default in self.config.config_jsons.items():
+            self.assertEqual(getattr(self.config, key), {"foo":"bar"})
+            self._test_config_environment_value(key, '{"foo":"bar"}')
+
     def test_env_json_secret_properties(self):
         for key, default in self.config.config_json_secrets.items():
             self.assertEqual(getattr(self.config, key), {"foo":"bar"})
@@ -30,6 +30,11 @@ class TestConfigFiles(unittest.TestCase):
         for key, default in self.config.config_booleans.items():
             self.assertEqual(getattr(self.config, key), True)
 
+    def test_file_json_properties(self):
+        for key, default in self.config.config_jsons.items():
+            self.assertEqual(getattr(self.config, key), {"foo":"bat"})
+            self._test_config_file_value(key, '{"foo":"bat"}')
+
     def test_file_json_secret_properties(self):
         for key, default in self.config.config_json_secrets.items():
             self.assertEqual(getattr(self.config, key), {"foo":"bat"})
@@ -0,0 +1,48 @@
+import unittest
+from unittest.mock import patch
+from stage0_py_utils.echo.action_cache import ActionCache
+
+class TestActionCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = ActionCache(max_entries=2)
+
+    def test_key_ignores_argument_order(self):
+        self.assertEqual(ActionCache.key("bot", "get_bot", {"a": 1, "b": 2}), ActionCache.key("bot", "get_bot", {"b": 2, "a": 1}))
+        self.assertNotEqual(ActionCache.key("bot", "get_bot", "1"), ActionCache.key("bot", "get_channels", "1"))
+
+    def test_get_and_put(self):
+        key = ActionCache.key("bot", "get_bot", "1")
+        self.assertEqual(self.cache.get(key), (False, None))
+        self.cache.put(key, {"name": "bot"})
+        self.assertEqual(self.cache.get(key), (True, {"name": "bot"}))
+        self.assertEqual(self.cache.get_stats(), {"entries": 1, "hits": 1, "misses": 1, "hit_rate": 0.5})
+
+    @patch("stage0_py_utils.echo.action_cache.time.monotonic")
+    def test_entries_expire(self, mock_monotonic):
+        key = ActionCache.key("bot", "get_bot", "1")
+        mock_monotonic.return_value = 100
+        self.cache.put(key, "value", ttl=10)
+        mock_monotonic.return_value = 109
+        self.assertTrue(self.cache.get(key)[0])
+        mock_monotonic.return_value = 110
+        self.assertFalse(self.cache.get(key)[0])
+        self.assertEqual(self.cache.get_stats()["entries"], 0)
+
+    def test_lru_eviction(self):
+        self.cache.put("one", 1)
+        self.cache.put("two", 2)
+        self.cache.get("one")
+        self.cache.put("three", 3)
+        self.assertEqual(list(self.cache.entries.keys()), ["one", "three"])
+
+    def test_invalidate_agent(self):
+        self.cache.put(ActionCache.key("bot", "get_bot", "1"), 1)
+        self.cache.put(ActionCache.key("echo", "get_agents", None), 2)
+        self.cache.invalidate("bot")
+        self.assertEqual([key[0] for key in self.cache.entries], ["echo"])
+        self.cache.invalidate()
+        self.assertEqual(len(self.cache.entries), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -21,6 +21,14 @@ class TestEchoAgent(unittest.TestCase):
         )
 
         self.assertIn("test_action", self.agent.get_actions())
+        self.assertFalse(self.agent.actions["test_action"]["cacheable"])
+
+    def test_register_cacheable_action(self):
+        """Ensure the cacheable flag and ttl are registered with the action."""
+        self.agent.register_action("test_action", lambda args: "Executed", "Test description", 
+                                   {"type": "object"}, {"type": "string"}, cacheable=True, ttl=5)
+        self.assertTrue(self.agent.actions["test_action"]["cacheable"])
+        self.assertEqual(self.agent.actions["test_action"]["ttl"], 5)
 
     def test_register_action_missing_description(self):
         """Ensure registering an action without a description raises an error."""
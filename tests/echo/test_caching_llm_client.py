@@ -0,0 +1,127 @@
+import unittest
+import threading
+from unittest.mock import MagicMock, patch
+from stage0_py_utils import CachingLLMClient, Config, Message
+
+class TestCachingLLMClient(unittest.TestCase):
+
+    def setUp(self):
+        Config.get_instance().initialize()
+        self.llm_client = MagicMock()
+        self.llm_client.model = "test-model"
+        self.llm_client.chat.return_value = {"message": {"role": Message.ASSISTANT_ROLE, "content": "From:Echo To:group I can help"}}
+        self.client = CachingLLMClient(llm_client=self.llm_client, last_n=1, ttl=60, max_entries=2, persist=False)
+        self.system = {"role": Message.SYSTEM_ROLE, "content": "Be nice"}
+
+    def prompt(self, text, user="mike"):
+        return [self.system, {"role": Message.USER_ROLE, "content": f"From:{user} To:group {text}"}]
+
+    def test_normalize(self):
+        self.assertEqual(CachingLLMClient.normalize("From:mike To:group  What can   you do? "), "to:group what can you do")
+
+    def test_repeated_prompt_is_cached(self):
+        first = self.client.chat(messages=self.prompt("What can you do?"))
+        second = self.client.chat(messages=self.prompt("what can you do", user="fred"))
+        self.assertEqual(first["message"], second["message"])
+        self.llm_client.chat.assert_called_once()
+        self.assertEqual(self.client.get_stats(), {"entries": 1, "hits": 1, "misses": 1, "hit_rate": 0.5})
+
+    def test_key_includes_model_and_system(self):
+        key = self.client.key(self.prompt("Hi"))
+        self.assertNotEqual(key, self.client.key([{"role": Message.SYSTEM_ROLE, "content": "Be rude"}] + self.prompt("Hi")[1:]))
+        self.client.model = "other-model"
+        self.assertNotEqual(key, self.client.key(self.prompt("Hi")))
+
+    def test_key_uses_last_n(self):
+        earlier = [{"role": Message.USER_ROLE, "content": "From:mike To:group Something else"}]
+        self.assertEqual(self.client.key(self.prompt("Hi")), self.client.key(earlier + self.prompt("Hi")))
+        self.client.last_n = 2
+        self.assertNotEqual(self.client.key(self.prompt("Hi")), self.client.key(earlier + self.prompt("Hi")))
+
+    @patch("stage0_py_utils.echo.caching_llm_client.time.monotonic")
+    def test_replies_expire(self, mock_monotonic):
+        mock_monotonic.return_value = 100
+        self.client.chat(messages=self.prompt("Hi"))
+        mock_monotonic.return_value = 160
+        self.client.chat(messages=self.prompt("Hi"))
+        self.assertEqual(self.llm_client.chat.call_count, 2)
+
+    def test_lru_eviction(self):
+        for text in ["One", "Two", "One", "Three", "One"]:
+            self.client.chat(messages=self.prompt(text))
+        self.assertEqual(self.llm_client.chat.call_count, 3)
+        self.assertEqual(len(self.client.entries), 2)
+
+    def test_explicit_zero_settings(self):
+        client = CachingLLMClient(llm_client=self.llm_client, last_n=0, ttl=0, max_entries=0, persist=False)
+        self.assertEqual((client.last_n, client.ttl, client.max_entries), (0, 0, 0))
+
+    def test_passes_through_attributes(self):
+        self.assertEqual(self.client.async_chat, self.llm_client.async_chat)
+
+    @patch('stage0_py_utils.echo.caching_llm_client.MongoIO.get_instance')
+    def test_persisted_replies(self, mock_mongo):
+        mock_mongo_instance = MagicMock()
+        mock_mongo.return_value = mock_mongo_instance
+        mock_mongo_instance.get_documents.return_value = []
+        client = CachingLLMClient(llm_client=self.llm_client, persist=True, collection_name="llm_cache")
+        mock_mongo_instance.ensure_indexes.assert_called_once()
+
+        client.chat(messages=self.prompt("Hi"))
+        kwargs = mock_mongo_instance.update_document.call_args.kwargs
+        self.assertTrue(kwargs["upsert"])
+        self.assertEqual(kwargs["set_data"]["message"]["content"], "From:Echo To:group I can help")
+
+        # A new process finds the reply in MongoDB
+        mock_mongo_instance.get_documents.return_value = [{"_id": "key", "message": kwargs["set_data"]["message"]}]
+        restarted = CachingLLMClient(llm_client=self.llm_client, persist=True, collection_name="llm_cache")
+        self.assertEqual(restarted.chat(messages=self.prompt("Hi"))["message"]["content"], "From:Echo To:group I can help")
+        self.llm_client.chat.assert_called_once()
+
+    @patch('stage0_py_utils.echo.caching_llm_client.MongoIO.get_instance')
+    def test_persistence_failure_is_a_miss(self, mock_mongo):
+        mock_mongo.return_value.get_documents.side_effect = Exception("Mongo down")
+        mock_mongo.return_value.update_document.side_effect = Exception("Mongo down")
+        client = CachingLLMClient(llm_client=self.llm_client, persist=True)
+        self.assertEqual(client.chat(messages=self.prompt("Hi"))["message"]["content"], "From:Echo To:group I can help")
+
+class TestCachingLLMClientStream(unittest.IsolatedAsyncioTestCase):
+
+    async def test_chat_stream_caches_reply(self):
+        Config.get_instance().initialize()
+        llm_client = MagicMock()
+        llm_client.model = "test-model"
+        async def chat_stream(messages=None):
+            for token in ["From:Echo ", "To:group ", "Hello"]:
+                yield {"message": {"role": Message.ASSISTANT_ROLE, "content": token}, "done": False}
+        llm_client.chat_stream = MagicMock(side_effect=chat_stream)
+        client = CachingLLMClient(llm_client=llm_client, persist=False)
+        messages = [{"role": Message.USER_ROLE, "content": "From:mike To:group Hi"}]
+
+        first = [chunk async for chunk in client.chat_stream(messages=messages)]
+        second = [chunk async for chunk in client.chat_stream(messages=messages)]
+
+        self.assertEqual(len(first), 3)
+        self.assertEqual(second, [{"message": {"role": Message.ASSISTANT_ROLE, "content": "From:Echo To:group Hello"}, "done": True}])
+        llm_client.chat_stream.assert_called_once()
+
+    async def test_chat_stream_persists_off_the_event_loop(self):
+        Config.get_instance().initialize()
+        llm_client = MagicMock()
+        llm_client.model = "test-model"
+        async def chat_stream(messages=None):
+            yield {"message": {"role": Message.ASSISTANT_ROLE, "content": "From:Echo To:group Hello"}, "done": True}
+        llm_client.chat_stream = chat_stream
+        with patch.object(CachingLLMClient, "create_indexes"):
+            client = CachingLLMClient(llm_client=llm_client, persist=True)
+        threads = []
+        client.load = MagicMock(side_effect=lambda key: threads.append(threading.current_thread()))
+        client.save = MagicMock(side_effect=lambda key, message: threads.append(threading.current_thread()))
+
+        [chunk async for chunk in client.chat_stream(messages=[{"role": Message.USER_ROLE, "content": "Hi"}])]
+
+        self.assertEqual(len(threads), 2)
+        self.assertNotIn(threading.current_thread(), threads)
+
+if __name__ == '__main__':
+    unittest.main()
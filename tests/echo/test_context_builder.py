@@ -0,0 +1,77 @@
+import unittest
+from unittest.mock import patch
+from stage0_py_utils import Config, ContextBuilder, ConversationServices, Message
+
+class TestContextBuilder(unittest.TestCase):
+
+    def setUp(self):
+        self.config = Config.get_instance()
+        self.config.initialize()
+        self.system = {"role": Message.SYSTEM_ROLE, "content": "x" * 36}
+        self.messages = [{"role": Message.USER_ROLE, "content": f"{i:02d}" + "y" * 34} for i in range(10)]
+
+    def test_approximate_tokens(self):
+        self.assertEqual(ContextBuilder.approximate_tokens(""), 1)
+        self.assertEqual(ContextBuilder.approximate_tokens("x" * 400), 101)
+
+    def test_build_keeps_recent_messages_in_budget(self):
+        # Each message is 10 + 4 tokens, so a budget of 45 fits three
+        builder = ContextBuilder(token_budget=45, trim_step=1)
+        context = builder.build(self.messages)
+        self.assertEqual(context, self.messages[-3:])
+
+    def test_build_always_keeps_system_messages(self):
+        builder = ContextBuilder(token_budget=45, trim_step=1)
+        context = builder.build([self.system] + self.messages)
+        self.assertEqual(context, [self.system] + self.messages[-2:])
+
+    def test_build_keeps_latest_message_over_budget(self):
+        builder = ContextBuilder(token_budget=5)
+        context = builder.build(self.messages)
+        self.assertEqual(context, self.messages[-1:])
+
+    def test_build_fits_everything(self):
+        builder = ContextBuilder(token_budget=10000)
+        self.assertEqual(builder.build([self.system] + self.messages), [self.system] + self.messages)
+
+    def test_pluggable_tokenizer(self):
+        builder = ContextBuilder(token_budget=10, tokenizer=lambda text: 1, trim_step=1)
+        context = builder.build(self.messages)
+        self.assertEqual(context, self.messages[-2:])
+
+    def test_build_trims_in_steps(self):
+        # Three messages fit, trimming four at a time keeps the context start stable
+        builder = ContextBuilder(token_budget=45, trim_step=4)
+        self.assertEqual(builder.build(self.messages), self.messages[8:])
+        self.assertEqual(builder.build(self.messages[:9]), self.messages[8:9])
+        self.assertEqual(builder.build(self.messages[:7]), self.messages[4:7])
+        self.assertEqual(builder.build(self.messages[:6]), self.messages[4:6])
+
+    def test_build_trim_step_keeps_latest(self):
+        builder = ContextBuilder(token_budget=45, trim_step=100)
+        self.assertEqual(builder.build(self.messages), self.messages[-1:])
+
+    def test_prefix_stable_past_message_window(self):
+        # Simulate a long conversation read through the sliding MESSAGE_WINDOW
+        for content_size in [200, 20]:
+            builder = ContextBuilder(token_budget=4096, trim_step=8)
+            conversation = [self.system]
+            previous_start = None
+            changes = 0
+            with patch.object(self.config, "LLM_CONTEXT_TRIM_STEP", 8):
+                for turn in range(200):
+                    conversation.append({"role": Message.USER_ROLE, "content": f"{turn:03d}" + "y" * content_size})
+                    context = builder.build(ConversationServices.window_messages(conversation, 100))
+                    start = context[1]["content"]
+                    if turn >= 100 and start != previous_start: changes += 1
+                    previous_start = start
+            self.assertLessEqual(changes, 100 // 8 + 1)
+
+    def test_budget_from_config(self):
+        self.assertEqual(ContextBuilder(model="llama3.2:latest").token_budget, self.config.LLM_TOKEN_BUDGET)
+        with patch.object(self.config, "LLM_MODEL_TOKEN_BUDGETS", {"llama3.2:latest": 131072}):
+            self.assertEqual(ContextBuilder(model="llama3.2:latest").token_budget, 131072)
+            self.assertEqual(ContextBuilder(model="other").token_budget, self.config.LLM_TOKEN_BUDGET)
+
+if __name__ == '__main__':
+    unittest.main()
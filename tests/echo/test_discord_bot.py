@@ -1,3 +1,6 @@
+import asyncio
+import threading
+import time
 import unittest
 from unittest.mock import AsyncMock, MagicMock, PropertyMock, patch
 import json
@@ -35,6 +38,17 @@ class TestDiscordBot(unittest.IsolatedAsyncioTestCase):
         self.mock_handle_command.assert_called_once_with(f"/bot/get_channels/{json.dumps('BOT-123', separators=(',', ':'))}")
         self.assertEqual(self.bot.active_channels, ["12345", "67890"])
 
+    async def test_on_ready_uses_invoke_function(self):
+        """Test that the bot invokes actions directly when given an invoke function."""
+        mock_invoke = MagicMock(return_value=["12345", "67890"])
+        self.bot.invoke_function = mock_invoke
+
+        await self.bot.on_ready()
+
+        mock_invoke.assert_called_once_with("bot", "get_channels", "BOT-123")
+        self.mock_handle_command.assert_not_called()
+        self.assertEqual(self.bot.active_channels, ["12345", "67890"])
+
     async def test_on_message_processes_active_channel_message(self):
         """Test that the bot processes messages from active channels."""
         message = MagicMock()
@@ -104,5 +118,161 @@ class TestDiscordBot(unittest.IsolatedAsyncioTestCase):
         message.channel.send.assert_called_once_with("✅ Channel: 12345 removed from active channels list.")
         self.assertNotIn("12345", self.bot.active_channels)
 
+    def channel_message(self, channel_id, content):
+        message = MagicMock()
+        message.guild = True
+        message.channel.id = channel_id
+        message.author = MagicMock()
+        message.author.id = "USER-1"
+        message.author.name = "Alice"
+        message.content = content
+        message.channel.send = AsyncMock()
+        return message
+
+    async def test_on_message_does_not_block_other_channels(self):
+        """A slow LLM reply in one channel does not hold up another channel."""
+        self.bot.active_channels = ["12345", "67890"]
+        slow_started = threading.Event()
+        release_slow = threading.Event()
+        def handle_message(channel=None, text=None, **kwargs):
+            if channel == "12345":
+                slow_started.set()
+                release_slow.wait(timeout=5)
+            return f"Reply to {text}"
+        self.mock_handle_message.side_effect = handle_message
+
+        slow = self.channel_message("12345", "Slow")
+        fast = self.channel_message("67890", "Fast")
+        slow_task = asyncio.create_task(self.bot.on_message(slow))
+        await asyncio.get_running_loop().run_in_executor(None, slow_started.wait, 5)
+
+        await asyncio.wait_for(self.bot.on_message(fast), timeout=2)
+        fast.channel.send.assert_called_once_with("Reply to Fast")
+        slow.channel.send.assert_not_called()
+
+        release_slow.set()
+        await slow_task
+        slow.channel.send.assert_called_once_with("Reply to Slow")
+
+    async def test_on_message_keeps_channel_order(self):
+        """Messages in the same channel are processed in the order they arrived."""
+        processed = []
+        def handle_message(channel=None, text=None, **kwargs):
+            time.sleep(0.05)
+            processed.append(text)
+            return text
+        self.mock_handle_message.side_effect = handle_message
+
+        first = self.channel_message("12345", "First")
+        second = self.channel_message("12345", "@bot leave")
+        third = self.channel_message("12345", "Third")
+        second.mentions = [self.bot.user]
+        self.mock_handle_command.return_value = ["12345"]
+        await asyncio.gather(*[self.bot.on_message(message) for message in [first, second, third]])
+        self.assertEqual(processed, ["First", "Third"])
+        self.mock_handle_command.assert_called_once()
+        self.assertEqual(self.bot.channel_queues, {})
+        self.assertEqual(self.bot.channel_workers, {})
+
+    async def test_on_message_cancelled_while_queued(self):
+        """A cancelled on_message task does not stop the channel worker."""
+        messages = [self.channel_message("12345", text) for text in ["One", "Two", "Three"]]
+        first = await self.start_first_message(messages)
+        second = asyncio.create_task(self.bot.on_message(messages[1]))
+        await asyncio.sleep(0)
+        second.cancel()
+        await asyncio.wait_for(asyncio.gather(first, self.bot.on_message(messages[2]), return_exceptions=True), timeout=5)
+        messages[2].channel.send.assert_called_once_with("Reply to Three")
+        self.assertEqual(self.bot.channel_workers, {})
+
+    async def test_on_message_worker_stopped(self):
+        """Queued messages fail when the channel worker is cancelled."""
+        messages = [self.channel_message("12345", text) for text in ["One", "Two"]]
+        first = await self.start_first_message(messages)
+        second = asyncio.create_task(self.bot.on_message(messages[1]))
+        await asyncio.sleep(0)
+        self.bot.channel_workers["12345"].cancel()
+        results = await asyncio.wait_for(asyncio.gather(first, second, return_exceptions=True), timeout=5)
+        self.assertTrue(all(isinstance(result, asyncio.CancelledError) for result in results))
+        self.assertEqual(self.bot.channel_queues, {})
+
+    async def start_first_message(self, messages):
+        """Start processing the first message, and wait until its LLM call is in flight"""
+        started = threading.Event()
+        def handle_message(channel=None, text=None, **kwargs):
+            started.set()
+            time.sleep(0.05)
+            return f"Reply to {text}"
+        self.mock_handle_message.side_effect = handle_message
+        first = asyncio.create_task(self.bot.on_message(messages[0]))
+        await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+        return first
+
+    async def test_on_message_coalesces_messages(self):
+        """Chat messages that arrive during an LLM call are answered with one follow-up turn."""
+        mock_invoke = MagicMock()
+        self.bot.invoke_function = mock_invoke
+        messages = [self.channel_message("12345", text) for text in ["One", "Two", "Three"]]
+
+        first = await self.start_first_message(messages)
+        await asyncio.gather(first, *[self.bot.on_message(message) for message in messages[1:]])
+
+        # One LLM turn for the first message, and one for the coalesced messages
+        self.assertEqual(self.mock_handle_message.call_count, 2)
+        self.assertEqual(self.mock_handle_message.call_args.kwargs["text"], "Three")
+        agent, action, arguments = mock_invoke.call_args.args
+        self.assertEqual((agent, action), ("conversation", "add_message"))
+        self.assertIn("Two", arguments["message"]["content"])
+        messages[0].channel.send.assert_called_once_with("Reply to One")
+        messages[2].channel.send.assert_called_once_with("Reply to Three")
+        messages[1].channel.send.assert_not_called()
+
+    async def test_on_message_busy_when_queue_is_full(self):
+        """Messages beyond the max queue depth get a busy reply instead of an LLM call."""
+        self.bot.max_queue_depth = 1
+        messages = [self.channel_message("12345", text) for text in ["One", "Two", "Three"]]
+
+        first = await self.start_first_message(messages)
+        await asyncio.gather(first, *[self.bot.on_message(message) for message in messages[1:]])
+
+        messages[2].channel.send.assert_called_once_with(DiscordBot.BUSY_REPLY)
+        self.assertEqual(self.mock_handle_message.call_count, 2)
+
+    async def test_on_message_streams_reply(self):
+        """The reply is sent when the first text arrives, and edited as it grows."""
+        async def stream_message(channel=None, text=None, **kwargs):
+            for reply in ["Hello", "Hello there", "Hello there Alice"]:
+                yield reply
+        self.bot.stream_message = stream_message
+        self.bot.STREAM_EDIT_INTERVAL = 0
+        message = self.channel_message("12345", "Hi")
+        sent_reply = MagicMock()
+        sent_reply.edit = AsyncMock()
+        message.channel.send = AsyncMock(return_value=sent_reply)
+
+        await self.bot.on_message(message)
+
+        message.channel.send.assert_called_once_with("Hello")
+        self.assertEqual(sent_reply.edit.call_count, 2)
+        sent_reply.edit.assert_called_with(content="Hello there Alice")
+        self.mock_handle_message.assert_not_called()
+
+    async def test_on_message_stream_edits_are_rate_limited(self):
+        """Edits are skipped inside the edit interval, but the final reply is always shown."""
+        async def stream_message(channel=None, text=None, **kwargs):
+            for reply in ["One", "One Two", "One Two Three"]:
+                yield reply
+        self.bot.stream_message = stream_message
+        self.bot.STREAM_EDIT_INTERVAL = 60
+        message = self.channel_message("12345", "Hi")
+        sent_reply = MagicMock()
+        sent_reply.edit = AsyncMock()
+        message.channel.send = AsyncMock(return_value=sent_reply)
+
+        await self.bot.on_message(message)
+
+        message.channel.send.assert_called_once_with("One")
+        sent_reply.edit.assert_called_once_with(content="One Two Three")
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -1,7 +1,7 @@
 import re
 import unittest
 import json
-from stage0_py_utils import Agent, Echo
+from stage0_py_utils import Agent, CachingLLMClient, Config, Echo, MockLLMClient
 from unittest.mock import MagicMock, Mock, patch
 
 import logging
@@ -111,5 +111,67 @@ class TestEcho(unittest.TestCase):
         self.assertIn("Unknown action 'unknown_action'", result)
         self.assertIn("Available actions: test_action", result)
 
+    def test_invoke_valid(self):
+        """Ensure invoke passes the arguments to the action without JSON encoding."""
+        arguments = {"key": "value"}
+        self.mock_action.return_value = "Action executed successfully"
+        result = self.echo.invoke("test_agent", "test_action", arguments)
+
+        self.assertEqual(result, "Action executed successfully")
+        self.assertIs(self.mock_action.call_args.args[0], arguments)
+
+    def test_invoke_unknown_agent(self):
+        result = self.echo.invoke("unknown_agent", "test_action", None)
+        self.assertEqual(result[:50], "Unknown Agent unknown_agent. Available agents are:")
+
+    def test_invoke_unknown_action(self):
+        result = self.echo.invoke("test_agent", "unknown_action", None)
+        self.assertIn("Unknown action 'unknown_action'", result)
+
+    def test_handlers_use_invoke(self):
+        """Ensure the LLM handler and Discord bot are wired to invoke."""
+        self.assertEqual(self.echo.llm_handler.invoke_function, self.echo.invoke)
+        self.assertEqual(self.echo.bot.invoke_function, self.echo.invoke)
+
+    def test_llm_cache_wraps_client(self):
+        """Ensure the LLM client is wrapped with the response cache when it is enabled."""
+        with patch.object(Config.get_instance(), "LLM_CACHE", True), patch.object(Config.get_instance(), "LLM_CACHE_PERSIST", False):
+            echo = Echo(client=MockLLMClient())
+        self.assertIsInstance(echo.llm_client, CachingLLMClient)
+        self.assertIs(echo.llm_handler.llm, echo.llm_client)
+        self.assertIsNotNone(echo.bot.stream_message)
+
+    def test_invoke_cacheable_action(self):
+        """Ensure cacheable actions are served from the cache until a mutating action runs."""
+        read_action = MagicMock(return_value={"channels": ["CHANNEL_1"]})
+        write_action = MagicMock(return_value="ok")
+        self.mock_agent.register_action("read", read_action, "description", "arguments_schema", "output_schema", cacheable=True)
+        self.mock_agent.register_action("write", write_action, "description", "arguments_schema", "output_schema")
+
+        first = self.echo.invoke("test_agent", "read", {"id": 1})
+        second = self.echo.handle_command('/test_agent/read/{"id": 1}')
+        self.assertEqual(first, second)
+        self.assertEqual(read_action.call_count, 1)
+
+        self.echo.invoke("test_agent", "read", {"id": 2})
+        self.assertEqual(read_action.call_count, 2)
+
+        self.echo.invoke("test_agent", "write", {"id": 1})
+        self.echo.invoke("test_agent", "read", {"id": 1})
+        self.assertEqual(read_action.call_count, 3)
+
+    def test_invoke_cache_returns_copies(self):
+        read_action = MagicMock(return_value={"channels": ["CHANNEL_1"]})
+        self.mock_agent.register_action("read", read_action, "description", "arguments_schema", "output_schema", cacheable=True)
+        self.echo.invoke("test_agent", "read", None)["channels"].append("CHANNEL_2")
+        self.assertEqual(self.echo.invoke("test_agent", "read", None), {"channels": ["CHANNEL_1"]})
+
+    def test_invoke_does_not_cache_errors(self):
+        read_action = MagicMock(return_value="error")
+        self.mock_agent.register_action("read", read_action, "description", "arguments_schema", "output_schema", cacheable=True)
+        self.echo.invoke("test_agent", "read", None)
+        self.echo.invoke("test_agent", "read", None)
+        self.assertEqual(read_action.call_count, 2)
+
 if __name__ == "__main__":
     unittest.main()
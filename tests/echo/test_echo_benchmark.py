@@ -0,0 +1,47 @@
+import os
+import timeit
+import unittest
+from unittest.mock import MagicMock
+from stage0_py_utils import Agent, Echo, LLMHandler, Message
+
+import logging
+logger = logging.getLogger(__name__)
+
+class TestEchoBenchmark(unittest.TestCase):
+    """
+    Compare the per-message overhead of posting a conversation message with
+    Echo.invoke, against the /conversation/add_message/{json} command path.
+    The add_message action is replaced with a no-op, so only the dispatch is measured.
+    Timings depend on the machine, set RUN_BENCHMARKS to run them.
+    """
+    ITERATIONS = 2000
+
+    def setUp(self):
+        self.echo = Echo("Benchmark", client=MagicMock())
+        agent = Agent("conversation")
+        agent.register_action("add_message", lambda arguments: [arguments["message"]], "description", "arguments_schema", "output_schema")
+        self.echo.register_agent(agent)
+        self.message = Message(user="benchmark", role=Message.USER_ROLE, dialog=Message.GROUP_DIALOG, text="Lorem ipsum dolor sit amet " * 150)
+
+    def time_post_message(self, handler):
+        seconds = timeit.timeit(lambda: handler.post_message(channel="CHANNEL_1", message=self.message), number=self.ITERATIONS)
+        return seconds / self.ITERATIONS * 1_000_000
+
+    def test_invoke_matches_command(self):
+        command_handler = LLMHandler(handle_command_function=self.echo.handle_command)
+        invoke_handler = LLMHandler(handle_command_function=self.echo.handle_command, invoke_function=self.echo.invoke)
+        self.assertEqual(command_handler.post_message(channel="CHANNEL_1", message=self.message),
+                         invoke_handler.post_message(channel="CHANNEL_1", message=self.message))
+
+    @unittest.skipUnless(os.environ.get("RUN_BENCHMARKS"), "set RUN_BENCHMARKS to run timing benchmarks")
+    def test_invoke_overhead(self):
+        command_handler = LLMHandler(handle_command_function=self.echo.handle_command)
+        invoke_handler = LLMHandler(handle_command_function=self.echo.handle_command, invoke_function=self.echo.invoke)
+
+        command_us = self.time_post_message(command_handler)
+        invoke_us = self.time_post_message(invoke_handler)
+        logger.info(f"post_message overhead: command {command_us:.1f}us, invoke {invoke_us:.1f}us per message")
+        self.assertLess(invoke_us, command_us)
+
+if __name__ == '__main__':
+    unittest.main()
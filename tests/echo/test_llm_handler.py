@@ -52,12 +52,12 @@ class TestLLMHandler(unittest.TestCase):
         message1 = {"role": Message.USER_ROLE, "content": f"From:unknown To:{Message.GROUP_DIALOG} Simple Message"}
         message2 = {"role": Message.ASSISTANT_ROLE, "content": f"From:TEST_BOT To:{Message.GROUP_DIALOG} LLM Response"}
         message1_add = {"channel_id": "CHANNEL_1", "message": message1}
-        message2_add = {"channel_id": "CHANNEL_1", "message": message2}
+        message2_add = {"channel_id": "CHANNEL_1", "messages": [message2]}
         llm_response = {"message": {"role": Message.ASSISTANT_ROLE, "content": f"From:TEST_BOT To:{Message.GROUP_DIALOG} LLM Response"}}
         
         self.mock_handle_command.side_effect = [
             [message1],
-            [message1, message2]
+            2
         ]
         self.mock_llm_client.chat.return_value = llm_response
 
@@ -68,7 +68,36 @@ class TestLLMHandler(unittest.TestCase):
         self.assertEqual(result, "LLM Response")
         self.mock_llm_client.chat.assert_called_once()
         self.mock_handle_command.assert_any_call(f"/conversation/add_message/{json.dumps(message1_add, separators=(',', ':'))}")
-        self.mock_handle_command.assert_any_call(f"/conversation/add_message/{json.dumps(message2_add, separators=(',', ':'))}")
+        self.mock_handle_command.assert_any_call(f"/conversation/add_messages/{json.dumps(message2_add, separators=(',', ':'))}")
+
+    def test_handle_simple_message_with_invoke(self):
+        """Ensure conversation messages are posted with the invoke function when provided."""
+        message1 = {"role": Message.USER_ROLE, "content": f"From:unknown To:{Message.GROUP_DIALOG} Simple Message"}
+        message2 = {"role": Message.ASSISTANT_ROLE, "content": f"From:TEST_BOT To:{Message.GROUP_DIALOG} LLM Response"}
+        mock_invoke = MagicMock(side_effect=[[message1], 2])
+        self.llm_handler.invoke_function = mock_invoke
+        self.mock_llm_client.chat.return_value = {"message": message2}
+
+        result = self.llm_handler.handle_message(channel="CHANNEL_1", text="Simple Message")
+
+        self.assertEqual(result, "LLM Response")
+        self.mock_handle_command.assert_not_called()
+        mock_invoke.assert_any_call("conversation", "add_message", {"channel_id": "CHANNEL_1", "message": message1})
+        mock_invoke.assert_any_call("conversation", "add_messages", {"channel_id": "CHANNEL_1", "messages": [message2]})
+
+    def test_handle_message_uses_context_builder(self):
+        """Ensure only the messages selected by the context builder are sent to the LLM."""
+        message1 = {"role": Message.USER_ROLE, "content": f"From:unknown To:{Message.GROUP_DIALOG} Simple Message"}
+        context = [{"role": Message.SYSTEM_ROLE, "content": "Be nice"}, message1]
+        self.llm_handler.context = MagicMock()
+        self.llm_handler.context.build.return_value = context
+        self.mock_handle_command.side_effect = [[message1] * 10, []]
+        self.mock_llm_client.chat.return_value = {"message": {"role": Message.ASSISTANT_ROLE, "content": "From:TEST_BOT To:group Hi"}}
+
+        self.llm_handler.handle_message(channel="CHANNEL_1", text="Simple Message")
+
+        self.llm_handler.context.build.assert_called_once_with([message1] * 10)
+        self.mock_llm_client.chat.assert_called_once_with(messages=context)
 
     def test_handle_message_with_agent_call(self):
         """Ensure user making agent call messages are correctly processed."""
@@ -113,16 +142,12 @@ class TestLLMHandler(unittest.TestCase):
         message4 =             {"role": Message.ASSISTANT_ROLE, "content": text4}
         
         message_add1 = f"/conversation/add_message/{json.dumps({"channel_id": "CHANNEL_1", "message":message1}, separators=(',', ':'))}"
-        message_add2 = f"/conversation/add_message/{json.dumps({"channel_id": "CHANNEL_1", "message":message2}, separators=(',', ':'))}"
-        message_add3 = f"/conversation/add_message/{json.dumps({"channel_id": "CHANNEL_1", "message":message3}, separators=(',', ':'))}"
-        message_add4 = f"/conversation/add_message/{json.dumps({"channel_id": "CHANNEL_1", "message":message4}, separators=(',', ':'))}"
+        messages_add = f"/conversation/add_messages/{json.dumps({"channel_id": "CHANNEL_1", "messages":[message2, message3, message4]}, separators=(',', ':'))}"
 
         self.mock_handle_command.side_effect = [
             [message1],
-            [message1, message2],
             agent_reply,
-            [message1, message2, message3],
-            [message1, message2, message3, message4]
+            4
         ]
         self.mock_llm_client.chat.side_effect = [
             llm_rep1, llm_rep2
@@ -133,9 +158,9 @@ class TestLLMHandler(unittest.TestCase):
         # Assert
         self.assertEqual(result, "Looks like string1, and string2")
         self.mock_handle_command.assert_any_call(message_add1)
-        self.mock_handle_command.assert_any_call(message_add2)
-        self.mock_handle_command.assert_any_call(message_add3)
-        self.mock_handle_command.assert_any_call(message_add4)
+        self.mock_handle_command.assert_any_call("/test_agent/test_command")
+        self.mock_handle_command.assert_any_call(messages_add)
+        self.assertEqual(self.mock_handle_command.call_count, 3)
         self.assertEqual(self.mock_llm_client.chat.call_count, 2)
 
     def test_handle_message_recursive_llm_agent_call(self):
@@ -163,21 +188,13 @@ class TestLLMHandler(unittest.TestCase):
         message6 =             {"role": Message.ASSISTANT_ROLE, "content": text6}
         
         message_add1 = f"/conversation/add_message/{json.dumps({"channel_id": "CHANNEL_1", "message":message1}, separators=(',', ':'))}"
-        message_add2 = f"/conversation/add_message/{json.dumps({"channel_id": "CHANNEL_1", "message":message2}, separators=(',', ':'))}"
-        message_add3 = f"/conversation/add_message/{json.dumps({"channel_id": "CHANNEL_1", "message":message3}, separators=(',', ':'))}"
-        message_add4 = f"/conversation/add_message/{json.dumps({"channel_id": "CHANNEL_1", "message":message4}, separators=(',', ':'))}"
-        message_add5 = f"/conversation/add_message/{json.dumps({"channel_id": "CHANNEL_1", "message":message5}, separators=(',', ':'))}"
-        message_add6 = f"/conversation/add_message/{json.dumps({"channel_id": "CHANNEL_1", "message":message6}, separators=(',', ':'))}"
+        messages_add = f"/conversation/add_messages/{json.dumps({"channel_id": "CHANNEL_1", "messages":[message2, message3, message4, message5, message6]}, separators=(',', ':'))}"
 
         self.mock_handle_command.side_effect = [
             [message1],
-            [message1, message2],
             agent_reply1,
-            [message1, message2, message3],
-            [message1, message2, message3, message4],
             agent_reply2,
-            [message1, message2, message3, message4, message5],
-            [message1, message2, message3, message4, message5, message6]
+            6
         ]
         self.mock_llm_client.chat.side_effect = [
             llm_rep1, llm_rep2, llm_rep3
@@ -189,13 +206,87 @@ class TestLLMHandler(unittest.TestCase):
         # Assert
         self.assertEqual(result, "Looks like foo is bar")
         self.mock_handle_command.assert_any_call(message_add1)
-        self.mock_handle_command.assert_any_call(message_add2)
-        self.mock_handle_command.assert_any_call(message_add3)
-        self.mock_handle_command.assert_any_call(message_add4)
-        self.mock_handle_command.assert_any_call(message_add5)
-        self.mock_handle_command.assert_any_call(message_add6)
+        self.mock_handle_command.assert_any_call("/test_agent/test_command1")
+        self.mock_handle_command.assert_any_call("/test_agent/test_command2")
+        self.mock_handle_command.assert_any_call(messages_add)
+        self.assertEqual(self.mock_handle_command.call_count, 4)
         self.assertEqual(self.mock_llm_client.chat.call_count, 3)
 
+        # The tool hops are sent to the LLM without being read back from the conversation
+        last_prompt = self.mock_llm_client.chat.call_args.kwargs["messages"]
+        self.assertEqual(last_prompt, [message1, message2, message3, message4, message5])
+
+    def test_handle_message_stops_at_max_tool_hops(self):
+        """Ensure an llm that keeps calling tools is stopped after max_tool_hops"""
+        self.llm_handler.max_tool_hops = 2
+        message1 = {"role": Message.USER_ROLE, "content": "From:mike To:group loop forever"}
+        tool_call = {"message": {"role": Message.ASSISTANT_ROLE, "content": "From:TEST_BOT To:tools /test_agent/test_command"}}
+        self.mock_handle_command.side_effect = [[message1], "reply", "reply", 6]
+        self.mock_llm_client.chat.return_value = tool_call
+
+        result = self.llm_handler.handle_message(channel="CHANNEL_1", text="loop forever")
+
+        self.assertEqual(result, "I stopped after 2 tool calls without finding an answer.")
+        self.assertEqual(self.mock_llm_client.chat.call_count, 3)
+        batch = json.loads(self.mock_handle_command.call_args.args[0][len("/conversation/add_messages/"):])
+        self.assertEqual(len(batch["messages"]), 5)
+        self.assertEqual(batch["messages"][-1]["content"], "From:TEST_BOT To:group I stopped after 2 tool calls without finding an answer.")
+
+class TestLLMHandlerStream(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.mock_invoke = MagicMock(return_value=[])
+        self.mock_handle_command = MagicMock()
+        self.mock_llm_client = MagicMock()
+        self.llm_handler = LLMHandler(echo_bot_name="TEST_BOT", handle_command_function=self.mock_handle_command, 
+                                      llm_client=self.mock_llm_client, invoke_function=self.mock_invoke)
+
+    def stream_of(self, *contents):
+        """Build a chat_stream replacement that streams each content a few characters at a time"""
+        replies = list(contents)
+        async def chat_stream(messages=None):
+            content = replies.pop(0)
+            for index in range(0, len(content), 4):
+                yield {"message": {"role": Message.ASSISTANT_ROLE, "content": content[index:index + 4]}, "done": False}
+            yield {"message": {"role": Message.ASSISTANT_ROLE, "content": ""}, "done": True}
+        return chat_stream
+
+    async def test_stream_message_yields_growing_reply(self):
+        self.mock_llm_client.chat_stream = self.stream_of("From:TEST_BOT To:group Hello there Alice")
+
+        replies = [text async for text in self.llm_handler.stream_message(channel="CHANNEL_1", text="Hi")]
+
+        self.assertGreater(len(replies), 2)
+        self.assertEqual(replies[-1], "Hello there Alice")
+        self.assertTrue(all("Hello there Alice".startswith(reply) for reply in replies))
+        agent, action, arguments = self.mock_invoke.call_args.args
+        self.assertEqual(action, "add_messages")
+        self.assertEqual(arguments["messages"][0]["content"], "From:TEST_BOT To:group Hello there Alice")
+
+    async def test_stream_message_processes_tool_calls(self):
+        self.mock_handle_command.return_value = {"foo": "bar"}
+        self.mock_llm_client.chat_stream = self.stream_of(
+            "From:TEST_BOT To:tools /test_agent/test_command",
+            "From:TEST_BOT To:group foo is bar"
+        )
+
+        replies = [text async for text in self.llm_handler.stream_message(channel="CHANNEL_1", text="What is foo?")]
+
+        self.mock_handle_command.assert_called_once_with("/test_agent/test_command")
+        self.assertFalse(any("/test_agent" in reply for reply in replies))
+        self.assertEqual(replies[-1], "foo is bar")
+        agent, action, arguments = self.mock_invoke.call_args.args
+        self.assertEqual([message["content"] for message in arguments["messages"]], [
+            "From:TEST_BOT To:tools /test_agent/test_command",
+            "From:test_agent To:tools {\"foo\":\"bar\"}",
+            "From:TEST_BOT To:group foo is bar"
+        ])
+
+    async def test_stream_message_agent_call(self):
+        self.mock_handle_command.return_value = "Agent Reply"
+        replies = [text async for text in self.llm_handler.stream_message(channel="CHANNEL_1", text="/test_agent/test_action")]
+        self.assertEqual(replies, ['"Agent Reply"'])
+        self.mock_llm_client.chat_stream.assert_not_called()
+
 if __name__ == "__main__":
     unittest.main()
 
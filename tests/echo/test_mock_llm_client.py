@@ -1,3 +1,4 @@
+import time
 import unittest
 from unittest.mock import patch
 from stage0_py_utils import MockLLMClient  # Adjust import path as needed
@@ -27,5 +28,30 @@ class TestMockLLMClient(unittest.TestCase):
         mock_random_choice.assert_called_once_with(self.client.replies)
         self.assertEqual(response, "group:helpdesk staff need a lesson on what's funny and what's not.")
 
+class TestMockLLMClientStream(unittest.IsolatedAsyncioTestCase):
+
+    async def test_chat_stream_yields_reply_tokens(self):
+        client = MockLLMClient()
+        with patch("random.choice", return_value=client.replies[0]):
+            chunks = [chunk async for chunk in client.chat_stream(messages=[])]
+
+        content = "".join(chunk["message"]["content"] for chunk in chunks)
+        self.assertEqual(content, client.replies[0]["message"]["content"])
+        self.assertTrue(chunks[-1]["done"])
+        self.assertFalse(any(chunk["done"] for chunk in chunks[:-1]))
+
+    async def test_chat_stream_token_delay(self):
+        client = MockLLMClient(token_delay=0.01)
+        with patch("random.choice", return_value=client.replies[-1]):
+            start = time.perf_counter()
+            chunks = [chunk async for chunk in client.chat_stream(messages=[])]
+            elapsed = time.perf_counter() - start
+        self.assertGreaterEqual(elapsed, 0.01 * (len(chunks) - 1))
+
+    async def test_async_chat(self):
+        client = MockLLMClient()
+        response = await client.async_chat(messages=[])
+        self.assertIn(response, client.replies)
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
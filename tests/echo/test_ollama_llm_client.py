@@ -1,9 +1,13 @@
 import unittest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, AsyncMock, MagicMock
+from stage0_py_utils import Config
 from stage0_py_utils.echo.ollama_llm_client import OllamaLLMClient
 
 class TestOllamaLLMClient(unittest.TestCase):
 
+    def setUp(self):
+        Config.get_instance().initialize()
+
     @patch("stage0_py_utils.echo.ollama_llm_client.ollama.Client")
     def test_chat_returns_expected_response(self, MockOllamaClient):
         # Arrange: setup mock
@@ -21,7 +25,77 @@ class TestOllamaLLMClient(unittest.TestCase):
 
         # Assert
         self.assertEqual(result, expected_response)
-        mock_instance.chat.assert_called_once_with(model="test-model", messages=messages)
+        mock_instance.chat.assert_called_once_with(model="test-model", messages=messages, keep_alive="30m")
+
+    @patch("stage0_py_utils.echo.ollama_llm_client.ollama.Client")
+    def test_chat_options(self, MockOllamaClient):
+        MockOllamaClient.return_value.chat.return_value = {"message": {"role": "assistant", "content": "Hello!"}}
+
+        client = OllamaLLMClient(model="test-model", keep_alive="1h", num_ctx=8192, num_predict=256)
+        client.chat(messages=[])
+
+        MockOllamaClient.return_value.chat.assert_called_once_with(
+            model="test-model", messages=[], keep_alive="1h", options={"num_ctx": 8192, "num_predict": 256})
+
+    @patch("stage0_py_utils.echo.ollama_llm_client.ollama.Client")
+    def test_prefix_stats(self, MockOllamaClient):
+        MockOllamaClient.return_value.chat.return_value = {
+            "message": {"role": "assistant", "content": "Hello!"},
+            "prompt_eval_count": 10,
+            "prompt_eval_duration": 4_000_000
+        }
+        system = {"role": "system", "content": "Be nice"}
+        first = {"role": "user", "content": "Hi"}
+        second = {"role": "user", "content": "Again"}
+
+        client = OllamaLLMClient(model="test-model")
+        client.chat(messages=[system, first])
+        client.chat(messages=[system, first, second])
+        client.chat(messages=[system, second])
+        stats = client.get_stats()
+
+        self.assertEqual(stats["calls"], 3)
+        self.assertEqual(stats["prefix_hits"], 1)
+        self.assertEqual(stats["prefix_messages"], 3)
+        self.assertEqual(stats["prompt_messages"], 7)
+        self.assertEqual(stats["prompt_eval_count"], 30)
+        self.assertAlmostEqual(stats["avg_prompt_eval_ms"], 4.0)
+        self.assertAlmostEqual(stats["prefix_hit_rate"], 1 / 3)
+
+class TestOllamaLLMClientAsync(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        Config.get_instance().initialize()
+
+    @patch("stage0_py_utils.echo.ollama_llm_client.ollama.AsyncClient")
+    async def test_async_chat(self, MockAsyncClient):
+        expected_response = {"message": {"role": "assistant", "content": "Hello!"}}
+        MockAsyncClient.return_value.chat = AsyncMock(return_value=expected_response)
+
+        client = OllamaLLMClient(model="test-model")
+        messages = [{"role": "user", "content": "Hi"}]
+        result = await client.async_chat(messages=messages)
+
+        self.assertEqual(result, expected_response)
+        MockAsyncClient.return_value.chat.assert_awaited_once_with(model="test-model", messages=messages, keep_alive="30m")
+
+    @patch("stage0_py_utils.echo.ollama_llm_client.ollama.AsyncClient")
+    async def test_chat_stream(self, MockAsyncClient):
+        chunks = [
+            {"message": {"role": "assistant", "content": "Hel"}, "done": False},
+            {"message": {"role": "assistant", "content": "lo!"}, "done": True, "prompt_eval_count": 5}
+        ]
+        async def stream():
+            for chunk in chunks: yield chunk
+        MockAsyncClient.return_value.chat = AsyncMock(return_value=stream())
+
+        client = OllamaLLMClient(model="test-model")
+        messages = [{"role": "user", "content": "Hi"}]
+        result = [chunk async for chunk in client.chat_stream(messages=messages)]
+
+        self.assertEqual(result, chunks)
+        MockAsyncClient.return_value.chat.assert_awaited_once_with(model="test-model", messages=messages, stream=True, keep_alive="30m")
+        self.assertEqual(client.get_stats()["prompt_eval_count"], 5)
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
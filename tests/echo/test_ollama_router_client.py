@@ -0,0 +1,119 @@
+import unittest
+import ollama
+from unittest.mock import AsyncMock, MagicMock, patch
+from stage0_py_utils import Config, OllamaRouterClient
+
+class TestOllamaRouterClient(unittest.TestCase):
+
+    def setUp(self):
+        Config.get_instance().initialize()
+        self.clients = {}
+        def client_factory(base_url, model):
+            client = MagicMock()
+            client.chat.return_value = {"message": {"role": "assistant", "content": base_url}}
+            self.clients[base_url] = client
+            return client
+        self.router = OllamaRouterClient(hosts=["http://one", "http://two"], model="test-model", 
+                                         health_check_interval_ms=60000, client_factory=client_factory)
+        for host in self.router.hosts:
+            host["health_client"] = MagicMock()
+            host["async_health_client"] = AsyncMock()
+
+    def test_configured_hosts(self):
+        config = Config.get_instance()
+        self.assertEqual(OllamaRouterClient.configured_hosts(), [config.OLLAMA_HOST])
+        with patch.object(config, "OLLAMA_HOSTS", "http://one:11434, http://two:11434"):
+            self.assertEqual(OllamaRouterClient.configured_hosts(), ["http://one:11434", "http://two:11434"])
+
+    def test_balances_requests(self):
+        replies = [self.router.chat(messages=[])["message"]["content"] for _ in range(4)]
+        self.assertEqual(replies, ["http://one", "http://two", "http://one", "http://two"])
+
+    def test_least_outstanding(self):
+        self.router.hosts[0]["outstanding"] = 3
+        self.assertEqual(self.router.chat(messages=[])["message"]["content"], "http://two")
+        self.assertEqual(self.router.chat(messages=[])["message"]["content"], "http://two")
+
+    def test_fails_over(self):
+        self.clients["http://one"].chat.side_effect = ConnectionError("Connection refused")
+        self.assertEqual(self.router.chat(messages=[])["message"]["content"], "http://two")
+        self.assertEqual(self.router.chat(messages=[])["message"]["content"], "http://two")
+        self.clients["http://one"].chat.assert_called_once()
+        stats = self.router.get_stats()
+        self.assertFalse(stats[0]["healthy"])
+        self.assertEqual(stats[0]["failures"], 1)
+        self.assertEqual(stats[0]["outstanding"], 0)
+
+    def test_down_host_recovers_after_health_check(self):
+        self.clients["http://one"].chat.side_effect = [ConnectionError("Connection refused"), {"message": {"content": "back"}}]
+        self.router.chat(messages=[])
+        self.router.hosts[0]["check_after"] = 0
+        self.router.hosts[1]["outstanding"] = 1
+        self.assertEqual(self.router.chat(messages=[])["message"]["content"], "back")
+        self.router.hosts[0]["health_client"].list.assert_called_once()
+
+    def test_failed_health_check_stays_down(self):
+        self.router.hosts[0]["healthy"] = False
+        self.router.hosts[0]["health_client"].list.side_effect = ConnectionError("Connection refused")
+        self.assertEqual(self.router.check_all(), 1)
+        self.assertFalse(self.router.hosts[0]["healthy"])
+
+    def test_request_error_does_not_mark_down(self):
+        self.clients["http://one"].chat.side_effect = ollama.ResponseError("model not found", 404)
+        self.assertEqual(self.router.chat(messages=[])["message"]["content"], "http://two")
+        self.assertTrue(self.router.get_stats()[0]["healthy"])
+        self.clients["http://one"].chat.side_effect = ollama.ResponseError("server error", 500)
+        self.router.chat(messages=[])
+        self.assertFalse(self.router.get_stats()[0]["healthy"])
+
+    def test_health_check_timeout(self):
+        router = OllamaRouterClient(hosts=["http://one"], health_check_timeout_ms=500)
+        self.assertEqual(router.health_check_timeout, 0.5)
+        self.assertEqual(router.hosts[0]["health_client"]._client.timeout.connect, 0.5)
+
+    def test_all_hosts_down(self):
+        for client in self.clients.values(): client.chat.side_effect = ConnectionError("Connection refused")
+        with self.assertRaises(Exception):
+            self.router.chat(messages=[])
+        # Every host is down, so they are all tried again
+        with self.assertRaises(Exception):
+            self.router.chat(messages=[])
+        self.assertEqual(self.clients["http://one"].chat.call_count, 2)
+
+class TestOllamaRouterClientAsync(unittest.IsolatedAsyncioTestCase):
+
+    async def test_chat_stream_fails_over_before_first_chunk(self):
+        Config.get_instance().initialize()
+        def client_factory(base_url, model):
+            client = MagicMock()
+            async def chat_stream(messages=None):
+                if base_url == "http://one": raise ConnectionError("Connection refused")
+                yield {"message": {"role": "assistant", "content": base_url}}
+            client.chat_stream = chat_stream
+            return client
+        router = OllamaRouterClient(hosts=["http://one", "http://two"], client_factory=client_factory)
+
+        chunks = [chunk async for chunk in router.chat_stream(messages=[])]
+
+        self.assertEqual(chunks, [{"message": {"role": "assistant", "content": "http://two"}}])
+        self.assertEqual([host["outstanding"] for host in router.get_stats()], [0, 0])
+
+    async def test_async_chat_checks_health_without_blocking(self):
+        Config.get_instance().initialize()
+        def client_factory(base_url, model):
+            client = MagicMock()
+            client.async_chat = AsyncMock(return_value={"message": {"role": "assistant", "content": base_url}})
+            return client
+        router = OllamaRouterClient(hosts=["http://one"], client_factory=client_factory)
+        router.hosts[0]["health_client"] = MagicMock()
+        router.hosts[0]["async_health_client"] = AsyncMock()
+        router.hosts[0]["healthy"] = False
+
+        reply = await router.async_chat(messages=[])
+
+        self.assertEqual(reply["message"]["content"], "http://one")
+        router.hosts[0]["async_health_client"].list.assert_awaited_once()
+        router.hosts[0]["health_client"].list.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
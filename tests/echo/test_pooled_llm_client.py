@@ -0,0 +1,137 @@
+import asyncio
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+from stage0_py_utils import Config, LLMRequestQueue, PooledLLMClient, QueueTimeoutError
+from stage0_py_utils.echo.pooled_llm_client import llm_channel
+
+class TestLLMRequestQueue(unittest.TestCase):
+
+    def setUp(self):
+        Config.get_instance().initialize()
+        self.queue = LLMRequestQueue(max_in_flight=1, timeout_ms=2000)
+
+    def test_limits_requests_in_flight(self):
+        active = []
+        peak = []
+        def request():
+            with self.queue.slot():
+                active.append(1)
+                peak.append(len(active))
+                time.sleep(0.01)
+                active.pop()
+        threads = [threading.Thread(target=request) for _ in range(5)]
+        for thread in threads: thread.start()
+        for thread in threads: thread.join()
+        self.assertEqual(max(peak), 1)
+        stats = self.queue.get_stats()
+        self.assertEqual(stats["requests"], 5)
+        self.assertEqual(stats["in_flight"], 0)
+        self.assertGreater(stats["max_queue_ms"], 0)
+
+    def test_channels_take_turns(self):
+        order = []
+        started = []
+        def request(channel, name):
+            ticket = self.queue.ticket(channel)
+            started.append(name)
+            self.queue.acquire(ticket)
+            order.append(name)
+            self.queue.release()
+
+        # Hold the only slot while three requests from A and one from B are queued
+        with self.queue.slot(channel="A"):
+            threads = []
+            for channel, name in [("A", "A1"), ("A", "A2"), ("A", "A3"), ("B", "B1")]:
+                thread = threading.Thread(target=request, args=(channel, name))
+                thread.start()
+                threads.append(thread)
+                while self.queue.get_stats()["queued"] < len(threads): time.sleep(0.001)
+        for thread in threads: thread.join()
+        self.assertEqual(order, ["A1", "B1", "A2", "A3"])
+
+    def test_queue_timeout(self):
+        queue = LLMRequestQueue(max_in_flight=1, timeout_ms=10)
+        with queue.slot():
+            with self.assertRaises(QueueTimeoutError):
+                with queue.slot(): pass
+        stats = queue.get_stats()
+        self.assertEqual(stats["timeouts"], 1)
+        self.assertEqual(stats["queued"], 0)
+        self.assertEqual(stats["in_flight"], 0)
+
+    def test_unlimited(self):
+        queue = LLMRequestQueue(max_in_flight=0, timeout_ms=10)
+        with queue.slot(), queue.slot(), queue.slot():
+            self.assertEqual(queue.get_stats()["in_flight"], 3)
+
+    def test_channel_from_context(self):
+        llm_channel.set("CHANNEL_1")
+        self.assertEqual(self.queue.ticket()["channel"], "CHANNEL_1")
+        llm_channel.set(None)
+
+class TestPooledLLMClient(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        Config.get_instance().initialize()
+        self.queue = LLMRequestQueue(max_in_flight=1, timeout_ms=2000)
+        self.llm_client = MagicMock()
+        self.llm_client.model = "test-model"
+        self.client = PooledLLMClient(llm_client=self.llm_client, request_queue=self.queue)
+
+    def test_chat(self):
+        self.llm_client.chat.return_value = {"message": {"role": "assistant", "content": "Hi"}}
+        self.assertEqual(self.client.chat(messages=[])["message"]["content"], "Hi")
+        self.assertEqual(self.client.model, "test-model")
+        self.assertEqual(self.client.get_stats()["requests"], 1)
+
+    async def test_async_chat_cancelled_in_queue(self):
+        async def async_chat(messages=None): return {"message": {"role": "assistant", "content": "Hi"}}
+        self.llm_client.async_chat = async_chat
+        with self.queue.slot():
+            task = asyncio.create_task(self.client.async_chat(messages=[]))
+            while self.queue.get_stats()["queued"] == 0: await asyncio.sleep(0.001)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError): await task
+        await asyncio.sleep(0.05)
+        stats = self.queue.get_stats()
+        self.assertEqual(stats["queued"], 0)
+        self.assertEqual(stats["in_flight"], 0)
+        self.assertEqual((await self.client.async_chat(messages=[]))["message"]["content"], "Hi")
+
+    async def test_async_chat_waits_for_release(self):
+        async def async_chat(messages=None): return {"message": {"role": "assistant", "content": "Hi"}}
+        self.llm_client.async_chat = async_chat
+        threads = threading.active_count()
+        ticket = self.queue.ticket()
+        self.queue.acquire(ticket)
+        task = asyncio.create_task(self.client.async_chat(messages=[]))
+        while self.queue.get_stats()["queued"] == 0: await asyncio.sleep(0.001)
+        self.assertEqual(threading.active_count(), threads)
+        threading.Thread(target=self.queue.release).start()
+        self.assertEqual((await task)["message"]["content"], "Hi")
+        self.assertEqual(self.queue.get_stats()["in_flight"], 0)
+
+    async def test_async_chat_queue_timeout(self):
+        client = PooledLLMClient(llm_client=self.llm_client, request_queue=self.queue, timeout_ms=10)
+        with self.queue.slot():
+            with self.assertRaises(QueueTimeoutError):
+                await client.async_chat(messages=[])
+        stats = self.queue.get_stats()
+        self.assertEqual(stats["timeouts"], 1)
+        self.assertEqual(stats["queued"], 0)
+        self.assertEqual(stats["in_flight"], 0)
+
+    async def test_chat_stream_holds_slot(self):
+        async def chat_stream(messages=None):
+            for token in ["Hel", "lo"]:
+                self.assertEqual(self.queue.get_stats()["in_flight"], 1)
+                yield {"message": {"role": "assistant", "content": token}}
+        self.llm_client.chat_stream = chat_stream
+        chunks = [chunk async for chunk in self.client.chat_stream(messages=[])]
+        self.assertEqual(len(chunks), 2)
+        self.assertEqual(self.queue.get_stats()["in_flight"], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,10 @@
+import json
+import os
+import tempfile
+import threading
 import unittest
-from unittest.mock import patch, mock_open
-from stage0_py_utils import Evaluator
+from unittest.mock import MagicMock, patch, mock_open
+from stage0_py_utils import Evaluator, LLMRequestQueue, MockLLMClient
 
 class TestEvaluator(unittest.TestCase):
 
@@ -69,6 +73,52 @@ class TestEvaluator(unittest.TestCase):
         self.assertIsInstance(message["content"], str)
         self.assertIsInstance(latency, int)
 
+    def test_chat_model_client(self):
+        """Test chat uses the injected model client, and measures the latency."""
+        self.evaluator.model_client = MockLLMClient(model="mock")
+        message, latency = self.evaluator.chat(messages=[{"role":"user", "content":"Hi"}])
+        self.assertEqual(message["role"], "assistant")
+        self.assertIn(message, [reply["message"] for reply in self.evaluator.model_client.replies])
+        self.assertIsInstance(latency, int)
+
+    def test_chat_waits_past_queue_timeout(self):
+        """Test chat queues again when the request queue times out, instead of failing the run."""
+        self.evaluator.model_client = MockLLMClient(model="mock")
+        queue = LLMRequestQueue(max_in_flight=1, timeout_ms=20)
+        with patch.object(LLMRequestQueue, "_instance", queue):
+            queue.acquire(queue.ticket("busy"))
+            threading.Timer(0.1, queue.release).start()
+            message, latency = self.evaluator.chat(messages=[{"role":"user", "content":"Hi"}])
+        self.assertEqual(message["role"], "assistant")
+        self.assertGreaterEqual(queue.get_stats()["timeouts"], 1)
+        self.assertEqual(queue.get_stats()["in_flight"], 0)
+
+    def test_chat_raises_client_timeout(self):
+        """Test a timeout raised by the client is not retried."""
+        self.evaluator.model_client = MockLLMClient(model="mock")
+        self.evaluator.model_client.chat = MagicMock(side_effect=TimeoutError("read timed out"))
+        with self.assertRaises(TimeoutError):
+            self.evaluator.chat(messages=[{"role":"user", "content":"Hi"}])
+        self.evaluator.model_client.chat.assert_called_once()
+
+    def test_evaluate_with_clients(self):
+        """Test evaluate runs offline against injected model and grade clients."""
+        self.evaluator.model_client = MockLLMClient(model="mock")
+        self.evaluator.grade_client = MockLLMClient(model="grader")
+        self.evaluator.grade_client.replies = [{"message": {"role": "assistant", "content": "the grade is 0.5"}, "total_duration": 10}]
+
+        grades = self.evaluator.evaluate()
+
+        self.assertEqual(len(grades["filename1.csv"]), 4)
+        self.assertEqual(len(grades["filename2.csv"]), 6)
+        self.assertTrue(all(graded["grade"] == 0.5 for graded in grades["filename2.csv"]))
+
+    def test_default_client(self):
+        """Test the default client is an OllamaLLMClient created once per model."""
+        client = self.evaluator.client("llama3.2:latest")
+        self.assertEqual(client.model, "llama3.2:latest")
+        self.assertIs(self.evaluator.client("llama3.2:latest"), client)
+
     @patch.object(Evaluator, 'chat')
     def test_grade_reply_valid_float(self, mock_chat):
         """Test grade_reply when LLM returns a valid float string."""
@@ -82,7 +132,17 @@ class TestEvaluator(unittest.TestCase):
 
         # Assert        
         self.assertEqual(grade, 0.85)
-        mock_chat.assert_called_with(model=None, messages=messages)
+        mock_chat.assert_called_with(model=None, messages=messages, grading=True)
+
+    @patch.object(Evaluator, 'chat')
+    def test_grade_reply_cached(self, mock_chat):
+        """Test grade_reply only asks the grader once for the same pair."""
+        mock_chat.return_value = ({"content": "the grade is 0.85"}, 12345)
+        self.assertEqual(self.evaluator.grade_reply(expected="Good Answer", given="Great Answer!"), 0.85)
+        self.assertEqual(self.evaluator.grade_reply(expected="Good Answer", given="Great Answer!"), 0.85)
+        self.assertEqual(self.evaluator.grade_reply(expected="Good Answer", given="Other Answer"), 0.85)
+        self.assertEqual(mock_chat.call_count, 2)
+        self.assertEqual(self.evaluator.grade_cache.get_stats()["hits"], 1)
 
     @patch.object(Evaluator, 'chat')
     def test_grade_reply_invalid_float(self, mock_chat):
@@ -96,6 +156,56 @@ class TestEvaluator(unittest.TestCase):
         # Assert        
         self.assertIsNone(grade)
 
+    @patch.object(Evaluator, 'chat')
+    def test_grade_replies_batch(self, mock_chat):
+        """Test grade_replies grades several pairs with one grader request."""
+        mock_chat.return_value = ({"content": '{"grades": [0.5, 1, 0.75]}'}, 12345)
+        pairs = [("Expected 1", "Given 1"), ("Expected 2", "Given 2"), ("Expected 3", "Given 3")]
+
+        grades = self.evaluator.grade_replies(pairs)
+
+        self.assertEqual(grades, [0.5, 1.0, 0.75])
+        self.assertEqual(mock_chat.call_count, 1)
+        self.assertIn("Pair 3:\nGiven:\nGiven 3\nExpected:\nExpected 3", mock_chat.call_args.kwargs["messages"][-1]["content"])
+        self.assertEqual(self.evaluator.grade_replies(pairs), grades)
+        self.assertEqual(mock_chat.call_count, 1)
+
+    @patch.object(Evaluator, 'chat')
+    def test_grade_replies_fallback(self, mock_chat):
+        """Test grade_replies grades one pair at a time when the batch reply is not valid."""
+        mock_chat.side_effect = [
+            ({"content": '{"grades": [0.5]}'}, 12345),
+            ({"content": "the grade is 0.25"}, 12345),
+            ({"content": "the grade is 0.75"}, 12345),
+        ]
+
+        grades = self.evaluator.grade_replies([("Expected 1", "Given 1"), ("Expected 2", "Given 2")])
+
+        self.assertEqual(grades, [0.25, 0.75])
+        self.assertEqual(mock_chat.call_count, 3)
+
+    @patch.object(Evaluator, 'chat')
+    def test_grade_conversation_batched(self, mock_chat):
+        """Test grade_conversation with a grade_batch_size sends the replies to the grader in batches."""
+        self.evaluator.grade_batch_size = 2
+        mock_chat.side_effect = [
+            ({"role":"assistant", "content":"Reply 1"}, 1234),
+            ({"role":"assistant", "content":"Reply 2"}, 5678),
+            ({"content": "[1.0, 2.0]"}, 1),
+            ({"role":"assistant", "content":"Reply 3"}, 9012),
+            ({"content": "the grade is 3.0"}, 1),
+        ]
+        conversation = [
+            {"role":"user", "content":"Q1"}, {"role":"assistant", "content":"A1"},
+            {"role":"user", "content":"Q2"}, {"role":"assistant", "content":"A2"},
+            {"role":"user", "content":"Q3"}, {"role":"assistant", "content":"A3"},
+        ]
+
+        grades = self.evaluator.grade_conversation(conversation)
+
+        self.assertEqual([graded["grade"] for graded in grades], [1.0, 2.0, 3.0])
+        self.assertEqual(mock_chat.call_count, 5)
+
     @patch.object(Evaluator, 'grade_reply')
     @patch.object(Evaluator, 'chat')
     def test_grade_conversation(self, mock_chat, mock_grade_reply):
@@ -146,5 +256,88 @@ class TestEvaluator(unittest.TestCase):
         # Assert
         self.assertCountEqual(grades, expected)
 
+    @patch.object(Evaluator, 'grade_reply')
+    @patch.object(Evaluator, 'chat')
+    def test_evaluate_parallel(self, mock_chat, mock_grade_reply):
+        """Parallel evaluation returns the same grades, in the order of the conversations"""
+        mock_chat.side_effect = lambda model=None, messages=None: ({"role":"assistant", "content":f"Reply to {messages[-1]['content']}"}, 1)
+        mock_grade_reply.side_effect = lambda expected=None, given=None: float(len(given))
+        sequential = self.evaluator.evaluate()
+
+        self.evaluator.workers = 2
+        self.evaluator.grade_workers = 3
+        parallel = self.evaluator.evaluate()
+
+        self.assertEqual(parallel, sequential)
+        self.assertEqual(list(parallel.keys()), ["filename1.csv", "filename2.csv"])
+        self.assertEqual(len(parallel["filename2.csv"]), 6)
+        self.assertEqual(parallel["filename1.csv"][0]["given"], "Reply to Message1")
+        self.assertEqual(parallel["filename1.csv"][0]["grade"], float(len("Reply to Message1")))
+
+    def reply_to(self, model=None, messages=None):
+        return {"role":"assistant", "content":f"Reply to {messages[-1]['content']}"}, 1
+
+    @patch.object(Evaluator, 'grade_reply', return_value=0.5)
+    @patch.object(Evaluator, 'chat')
+    def test_evaluate_writes_results_file(self, mock_chat, mock_grade_reply):
+        mock_chat.side_effect = self.reply_to
+        with tempfile.TemporaryDirectory() as folder:
+            self.evaluator.results_file = os.path.join(folder, "results.jsonl")
+            grades = self.evaluator.evaluate()
+            results = list(Evaluator.read_results(self.evaluator.results_file))
+
+        self.assertEqual(len(results), 10)
+        self.assertEqual(results[0], {"conversation": "filename1.csv", "turn": 0, **grades["filename1.csv"][0]})
+        self.assertEqual(results[-1]["conversation"], "filename2.csv")
+        self.assertEqual(results[-1]["turn"], 5)
+
+    @patch.object(Evaluator, 'grade_reply', return_value=0.5)
+    @patch.object(Evaluator, 'chat')
+    def test_evaluate_resume(self, mock_chat, mock_grade_reply):
+        mock_chat.side_effect = self.reply_to
+        with tempfile.TemporaryDirectory() as folder:
+            results_file = os.path.join(folder, "results.jsonl")
+            self.evaluator.results_file = results_file
+            expected = self.evaluator.evaluate()
+
+            # Keep the first 5 results, and a partly written 6th
+            with open(results_file, encoding="utf-8") as f: lines = f.readlines()
+            with open(results_file, "w", encoding="utf-8") as f: f.writelines(lines[:5] + [lines[5][:20]])
+            mock_chat.reset_mock()
+            mock_grade_reply.reset_mock()
+
+            self.evaluator.resume = True
+            self.evaluator.workers = 2
+            grades = self.evaluator.evaluate()
+            results = list(Evaluator.read_results(results_file))
+
+        self.assertEqual(grades, expected)
+        self.assertEqual(mock_chat.call_count, 5)
+        self.assertEqual(mock_grade_reply.call_count, 5)
+        self.assertEqual(len(results), 10)
+        self.assertEqual(sorted((result["conversation"], result["turn"]) for result in results), 
+                         sorted((name, turn) for name in expected for turn in range(len(expected[name]))))
+
+    @patch.object(Evaluator, 'grade_reply', return_value=0.5)
+    @patch.object(Evaluator, 'chat')
+    def test_evaluate_resume_regrades_missing_grades(self, mock_chat, mock_grade_reply):
+        mock_chat.side_effect = self.reply_to
+        with tempfile.TemporaryDirectory() as folder:
+            results_file = os.path.join(folder, "results.jsonl")
+            self.evaluator.results_file = results_file
+            self.evaluator.evaluate()
+
+            # The grader reply for the first turn could not be parsed
+            with open(results_file, encoding="utf-8") as f: results = [json.loads(line) for line in f]
+            results[0]["grade"] = None
+            with open(results_file, "w", encoding="utf-8") as f: f.writelines(json.dumps(result) + "\n" for result in results)
+            mock_grade_reply.reset_mock()
+
+            self.evaluator.resume = True
+            grades = self.evaluator.evaluate()
+
+        self.assertEqual(mock_grade_reply.call_count, 1)
+        self.assertEqual(grades[results[0]["conversation"]][results[0]["turn"]]["grade"], 0.5)
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,62 @@
+import os
+import tempfile
+import unittest
+from stage0_py_utils.evaluator.grade_cache import GradeCache
+
+class TestGradeCache(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.cache_file = os.path.join(self.folder.name, "grades.jsonl")
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_key(self):
+        prompt = [{"role": "user", "content": "Grade"}]
+        key = GradeCache.key("grader", prompt, "expected", "given")
+        self.assertEqual(key, GradeCache.key("grader", prompt, "expected", "given"))
+        self.assertNotEqual(key, GradeCache.key("other", prompt, "expected", "given"))
+        self.assertNotEqual(key, GradeCache.key("grader", [], "expected", "given"))
+        self.assertNotEqual(key, GradeCache.key("grader", prompt, "given", "expected"))
+
+    def test_get_put_and_stats(self):
+        cache = GradeCache()
+        self.assertIsNone(cache.get("key"))
+        cache.put("key", 0.5)
+        self.assertEqual(cache.get("key"), 0.5)
+        self.assertEqual(cache.get_stats(), {"entries": 1, "hits": 1, "misses": 1, "hit_rate": 0.5})
+
+    def test_lru_eviction(self):
+        cache = GradeCache(max_entries=2)
+        cache.put("one", 1.0)
+        cache.put("two", 2.0)
+        cache.get("one")
+        cache.put("three", 3.0)
+        self.assertEqual(list(cache.entries.keys()), ["one", "three"])
+
+    def test_persisted_between_runs(self):
+        GradeCache(cache_file=self.cache_file).put("key", 0.75)
+        self.assertEqual(GradeCache(cache_file=self.cache_file).get("key"), 0.75)
+
+    def test_load_compacts_file(self):
+        cache = GradeCache(cache_file=self.cache_file, max_entries=2)
+        for index in range(6): cache.put(f"key{index}", float(index))
+        with open(self.cache_file, "a", encoding="utf-8") as f: f.write('{"key": "partial')
+
+        reloaded = GradeCache(cache_file=self.cache_file, max_entries=2)
+        self.assertEqual(list(reloaded.entries.items()), [("key4", 4.0), ("key5", 5.0)])
+        with open(self.cache_file, encoding="utf-8") as f:
+            self.assertEqual(len(f.readlines()), 2)
+
+    def test_load_keeps_file_under_limit(self):
+        cache = GradeCache(cache_file=self.cache_file, max_entries=10)
+        for index in range(5): cache.put("key", float(index))
+
+        reloaded = GradeCache(cache_file=self.cache_file, max_entries=10)
+        self.assertEqual(list(reloaded.entries.items()), [("key", 4.0)])
+        with open(self.cache_file, encoding="utf-8") as f:
+            self.assertEqual(len(f.readlines()), 5)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+from flask import Flask
+from stage0_py_utils import Config, InvalidPageError, create_flask_page, create_flask_page_headers
+
+
+class TestCreatePage(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.config = Config.get_instance()
+
+    def test_create_flask_page_defaults(self):
+        with self.app.test_request_context('/some_endpoint'):
+            page = create_flask_page()
+
+            self.assertEqual(page, {"after": None, "limit": self.config.PAGE_SIZE})
+
+    def test_create_flask_page(self):
+        with self.app.test_request_context('/some_endpoint?after=eeee00000000000000000001&limit=5'):
+            page = create_flask_page()
+
+            self.assertEqual(page, {"after": "eeee00000000000000000001", "limit": 5})
+
+    def test_create_flask_page_invalid_limit(self):
+        with self.app.test_request_context('/some_endpoint?limit=-1'):
+            page = create_flask_page()
+
+            self.assertEqual(page["limit"], self.config.PAGE_SIZE)
+
+    def test_create_flask_page_max_limit(self):
+        with self.app.test_request_context('/some_endpoint?limit=1000000'):
+            page = create_flask_page()
+
+            self.assertEqual(page["limit"], self.config.MAX_PAGE_SIZE)
+
+    def test_create_flask_page_invalid_after(self):
+        with self.app.test_request_context('/some_endpoint?after=not-an-id'):
+            with self.assertRaises(InvalidPageError):
+                create_flask_page()
+
+    def test_create_flask_page_headers_full_page(self):
+        page = {"after": None, "limit": 2}
+        documents = [{"_id": "eeee00000000000000000001"}, {"_id": "eeee00000000000000000002"}]
+
+        headers = create_flask_page_headers(documents, page)
+
+        self.assertEqual(headers, {"X-Next-Cursor": "eeee00000000000000000002"})
+
+    def test_create_flask_page_headers_last_page(self):
+        page = {"after": None, "limit": 2}
+        documents = [{"_id": "eeee00000000000000000001"}]
+
+        headers = create_flask_page_headers(documents, page)
+
+        self.assertEqual(headers, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
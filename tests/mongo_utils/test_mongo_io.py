@@ -106,6 +106,25 @@ class TestMongoIO(unittest.TestCase):
         result = self.mongo_io.get_documents(self.test_collection_name, {}, {"name": 1, "sort_value": 1, "_id": 0}, order)
         self.assertEqual([doc["name"] for doc in result], ["Echo", "Delta", "Charlie", "Bravo", "Alpha"])
 
+    def test_iter_documents(self):
+        order = [("sort_value", ASCENDING)]
+        result = self.mongo_io.iter_documents(self.test_collection_name, {"status": "active"}, {"name": 1, "_id": 0}, order, batch_size=2)
+        self.assertNotIsInstance(result, list)
+        self.assertEqual([doc["name"] for doc in result], ["Alpha", "Bravo", "Echo"])
+
+    def test_iter_documents_limit(self):
+        order = [("sort_value", DESCENDING)]
+        result = list(self.mongo_io.iter_documents(self.test_collection_name, sort_by=order, limit=2))
+        self.assertEqual([doc["name"] for doc in result], ["Echo", "Delta"])
+
+    def test_get_documents_pages(self):
+        first_page = self.mongo_io.get_documents(self.test_collection_name, limit=2)
+        self.assertEqual([doc["name"] for doc in first_page], ["Alpha", "Bravo"])
+        second_page = self.mongo_io.get_documents(self.test_collection_name, after=str(first_page[-1]["_id"]), limit=2)
+        self.assertEqual([doc["name"] for doc in second_page], ["Charlie", "Delta"])
+        last_page = self.mongo_io.get_documents(self.test_collection_name, {"status": "active"}, after=str(second_page[-1]["_id"]), limit=2)
+        self.assertEqual([doc["name"] for doc in last_page], ["Echo"])
+
     def test_get_all_full_documents(self):
         result = self.mongo_io.get_documents(self.test_collection_name)
         self.assertIsInstance(result, list)
@@ -201,6 +220,16 @@ class TestMongoIO(unittest.TestCase):
         self.assertEqual(len(documents), 3)
         self.assertTrue(all(doc["status"] == "archived" for doc in documents))
 
+    def test_iter_pipeline(self):
+        pipeline = [
+            {"$match": {"status": "active"}},
+            {"$sort": {"sort_value": 1}},
+            {"$project": {"_id": 0, "name": 1}}
+        ]
+        result = self.mongo_io.iter_pipeline(self.test_collection_name, pipeline, batch_size=1, allow_disk_use=True)
+        self.assertNotIsInstance(result, list)
+        self.assertEqual([doc["name"] for doc in result], ["Alpha", "Bravo", "Echo"])
+
     def test_delete_document(self):
         test_id = self.mongo_io.create_document(self.test_collection_name, self.test_document)
         deleted_count = self.mongo_io.delete_document(self.test_collection_name, test_id)
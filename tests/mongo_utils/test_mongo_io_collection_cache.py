@@ -0,0 +1,67 @@
+"""
+MongoIO collection cache tests
+
+These tests mock the pymongo MongoClient, so they do not require a running MongoDB instance.
+They count the server calls made by the MongoIO hot path to show that a collection is
+only verified once, and that a warm add_message costs a single upsert round trip.
+"""
+import unittest
+from unittest.mock import MagicMock, patch
+from stage0_py_utils import Config, MongoIO, ConversationServices
+
+class TestMongoIOCollectionCache(unittest.TestCase):
+
+    def setUp(self):
+        Config.get_instance().initialize()
+        self.patcher = patch('stage0_py_utils.mongo_utils.mongo_io.MongoClient')
+        self.mock_client_class = self.patcher.start()
+        self.mock_client = self.mock_client_class.return_value
+        self.mock_db = self.mock_client.get_database.return_value
+        self.mock_collection = self.mock_db.get_collection.return_value
+        self.mock_db.list_collection_names.return_value = ["test_collection"]
+        MongoIO._instance = None
+        self.mongo_io = MongoIO.get_instance()
+
+    def tearDown(self):
+        MongoIO._instance = None
+        self.patcher.stop()
+
+    def test_get_collection_is_cached(self):
+        first = self.mongo_io.get_collection("test_collection")
+        second = self.mongo_io.get_collection("test_collection")
+        self.assertIs(first, second)
+        self.mock_db.list_collection_names.assert_called_once()
+        self.mock_db.create_collection.assert_not_called()
+
+    def test_get_collection_creates_missing_collection_once(self):
+        self.mongo_io.get_collection("new_collection")
+        self.mongo_io.get_collection("new_collection")
+        self.mock_db.create_collection.assert_called_once_with("new_collection")
+        self.mock_db.list_collection_names.assert_called_once()
+
+    def test_drop_collection_invalidates_cache(self):
+        self.mongo_io.get_collection("test_collection")
+        self.mongo_io.drop_collection("test_collection")
+        self.assertNotIn("test_collection", self.mongo_io.collections)
+        self.mongo_io.get_collection("test_collection")
+        self.assertEqual(self.mock_db.get_collection.call_count, 2)
+
+    def test_add_message_round_trips(self):
+        conversation = {"_id": "conv1", "channel_id": "CHANNEL_1", "messages": []}
+        message = {"role": "user", "content": "From:unknown To:group Hello"}
+        self.mock_collection.find_one_and_update.return_value = {**conversation, "messages": [message]}
+
+        # Cold - the collection is verified on first use
+        ConversationServices.add_message(channel_id="CHANNEL_1", message=message)
+        self.assertEqual(self.mock_db.list_collection_names.call_count, 1)
+
+        # Warm - a single find_one_and_update upsert, no read first
+        self.mock_db.reset_mock()
+        self.mock_collection.reset_mock()
+        ConversationServices.add_message(channel_id="CHANNEL_1", message=message)
+        self.mock_db.list_collection_names.assert_not_called()
+        round_trips = self.mock_collection.find.call_count + self.mock_collection.find_one_and_update.call_count
+        self.assertEqual(round_trips, 1)
+
+if __name__ == '__main__':
+    unittest.main()
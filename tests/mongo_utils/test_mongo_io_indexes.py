@@ -0,0 +1,67 @@
+"""
+MongoIO index bootstrap tests
+
+These tests mock the pymongo MongoClient, so they do not require a running MongoDB instance.
+"""
+import unittest
+from unittest.mock import MagicMock, patch
+from stage0_py_utils import MongoIO
+
+class TestMongoIOIndexes(unittest.TestCase):
+
+    def setUp(self):
+        self.patcher = patch('stage0_py_utils.mongo_utils.mongo_io.MongoClient')
+        self.mock_client_class = self.patcher.start()
+        self.mock_db = self.mock_client_class.return_value.get_database.return_value
+        self.mock_collection = self.mock_db.get_collection.return_value
+        self.mock_db.list_collection_names.return_value = ["test_collection"]
+        MongoIO._instance = None
+        self.mongo_io = MongoIO.get_instance()
+        self.indexes = [
+            {"name": "name_index", "key": [("name", 1)]},
+            {"name": "status_index", "key": [("status", 1)], "unique": True}
+        ]
+
+    def tearDown(self):
+        MongoIO._instance = None
+        self.patcher.stop()
+
+    def set_existing(self, names, stats):
+        self.mock_collection.list_indexes.return_value = [{"name": name} for name in names]
+        self.mock_collection.aggregate.return_value.__iter__.side_effect = lambda: iter([
+            {"name": name, "accesses": {"ops": ops}} for name, ops in stats.items()
+        ])
+
+    def test_ensure_indexes_creates_missing(self):
+        self.set_existing(["_id_", "name_index"], {"_id_": 0, "name_index": 5})
+        report = self.mongo_io.ensure_indexes("test_collection", self.indexes)
+
+        self.assertEqual(report["created"], ["status_index"])
+        models = self.mock_collection.create_indexes.call_args.args[0]
+        self.assertEqual(len(models), 1)
+        self.assertEqual(models[0].document["name"], "status_index")
+        self.assertTrue(models[0].document["unique"])
+
+    def test_ensure_indexes_is_idempotent(self):
+        self.set_existing(["_id_", "name_index", "status_index"], {"name_index": 5, "status_index": 1})
+        report = self.mongo_io.ensure_indexes("test_collection", self.indexes)
+
+        self.assertEqual(report["created"], [])
+        self.mock_collection.create_indexes.assert_not_called()
+
+    def test_ensure_indexes_reports_unknown_and_unused(self):
+        self.set_existing(["_id_", "name_index", "status_index", "old_index"], 
+                          {"_id_": 0, "name_index": 0, "status_index": 3, "old_index": 0})
+        report = self.mongo_io.ensure_indexes("test_collection", self.indexes)
+
+        self.assertEqual(report["unknown"], ["old_index"])
+        self.assertEqual(report["unused"], ["name_index", "old_index"])
+
+    def test_ensure_indexes_without_index_stats(self):
+        self.set_existing(["_id_", "name_index", "status_index"], {})
+        self.mock_collection.aggregate.side_effect = Exception("not authorized")
+        report = self.mongo_io.ensure_indexes("test_collection", self.indexes)
+        self.assertEqual(report["unused"], [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+"""
+MongoIO connection pool tests
+
+These tests mock the pymongo MongoClient, so they do not require a running MongoDB instance.
+"""
+import unittest
+from unittest.mock import MagicMock, patch
+from stage0_py_utils import Config, MongoIO
+from stage0_py_utils.mongo_utils.mongo_io import PoolStatsListener
+
+class TestMongoIOPool(unittest.TestCase):
+
+    def setUp(self):
+        self.config = Config.get_instance()
+        self.config.initialize()
+        self.patcher = patch('stage0_py_utils.mongo_utils.mongo_io.MongoClient')
+        self.mock_client_class = self.patcher.start()
+        MongoIO._instance = None
+
+    def tearDown(self):
+        MongoIO._instance = None
+        self.patcher.stop()
+
+    def test_client_uses_pool_config(self):
+        MongoIO.get_instance()
+        args, kwargs = self.mock_client_class.call_args
+        self.assertEqual(args[0], self.config.MONGO_CONNECTION_STRING)
+        self.assertEqual(kwargs["maxPoolSize"], self.config.MONGO_MAX_POOL_SIZE)
+        self.assertEqual(kwargs["minPoolSize"], self.config.MONGO_MIN_POOL_SIZE)
+        self.assertEqual(kwargs["serverSelectionTimeoutMS"], self.config.MONGO_SERVER_SELECTION_TIMEOUT_MS)
+        self.assertEqual(kwargs["connectTimeoutMS"], self.config.MONGO_CONNECT_TIMEOUT_MS)
+        self.assertEqual(kwargs["socketTimeoutMS"], self.config.MONGO_SOCKET_TIMEOUT_MS)
+        self.assertIsNone(kwargs["maxIdleTimeMS"])
+        self.assertIsNone(kwargs["waitQueueTimeoutMS"])
+        self.assertNotIn("compressors", kwargs)
+        self.assertIsInstance(kwargs["event_listeners"][0], PoolStatsListener)
+
+    def test_client_uses_compressors(self):
+        self.config.MONGO_COMPRESSORS = "zstd,snappy"
+        try:
+            MongoIO.get_instance()
+        finally:
+            self.config.initialize()
+        args, kwargs = self.mock_client_class.call_args
+        self.assertEqual(kwargs["compressors"], "zstd,snappy")
+
+    def test_get_pool_stats(self):
+        mongo_io = MongoIO.get_instance()
+        listener = mongo_io.pool_stats
+        event = MagicMock()
+        listener.connection_created(event)
+        listener.connection_check_out_started(event)
+        listener.connection_checked_out(event)
+        listener.connection_check_out_started(event)
+        listener.connection_checked_out(event)
+        listener.connection_checked_in(event)
+        listener.connection_check_out_failed(event)
+
+        stats = mongo_io.get_pool_stats()
+        self.assertEqual(stats["open_connections"], 1)
+        self.assertEqual(stats["checked_out"], 1)
+        self.assertEqual(stats["max_checked_out"], 2)
+        self.assertEqual(stats["checkouts"], 2)
+        self.assertEqual(stats["checkout_failures"], 1)
+        self.assertGreaterEqual(stats["max_wait_ms"], stats["average_wait_ms"])
+        self.assertEqual(stats["max_pool_size"], self.config.MONGO_MAX_POOL_SIZE)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -29,9 +29,41 @@ class TestBotRoutes(unittest.TestCase):
         # Assert
         mock_create_token.assert_called_once()
         mock_create_breadcrumb.assert_called_once_with(mock_token)
-        mock_get_bots.assert_called_once_with("", mock_token)
+        mock_get_bots.assert_called_once_with("", mock_token, after=None, limit=30)
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json, [{"id": "bot1", "name": "Test Bot"}])
+        self.assertNotIn("X-Next-Cursor", response.headers)
+
+    @patch('stage0_py_utils.routes.bot_routes.create_flask_token')
+    @patch('stage0_py_utils.routes.bot_routes.create_flask_breadcrumb')
+    @patch('stage0_py_utils.services.bot_services.BotServices.get_bots')
+    def test_get_bots_invalid_cursor(self, mock_get_bots, mock_create_breadcrumb, mock_create_token):
+        """Test GET /api/bot with a malformed after cursor is a bad request."""
+        response = self.client.get('/api/bot?after=not-an-id')
+
+        self.assertEqual(response.status_code, 400)
+        mock_get_bots.assert_not_called()
+
+    @patch('stage0_py_utils.routes.bot_routes.create_flask_token')
+    @patch('stage0_py_utils.routes.bot_routes.create_flask_breadcrumb')
+    @patch('stage0_py_utils.services.bot_services.BotServices.get_bots')
+    def test_get_bots_page(self, mock_get_bots, mock_create_breadcrumb, mock_create_token):
+        """Test GET /api/bot with keyset pagination."""
+        # Arrange
+        mock_token = {"user_id": "mock_user"}
+        mock_create_token.return_value = mock_token
+        fake_breadcrumb = {"at_time":"sometime", "correlation_id":"correlation_ID"}
+        mock_create_breadcrumb.return_value = fake_breadcrumb
+        mock_get_bots.return_value = [{"_id": "bot2", "name": "Test Bot"}]
+
+        # Act
+        response = self.client.get('/api/bot?after=eeee00000000000000000001&limit=1')
+
+        # Assert
+        mock_get_bots.assert_called_once_with("", mock_token, after="eeee00000000000000000001", limit=1)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json, [{"_id": "bot2", "name": "Test Bot"}])
+        self.assertEqual(response.headers["X-Next-Cursor"], "bot2")
 
     @patch('stage0_py_utils.routes.bot_routes.create_flask_token')
     @patch('stage0_py_utils.routes.bot_routes.create_flask_breadcrumb')
@@ -30,7 +30,38 @@ class TestConversationRoutes(unittest.TestCase):
         self.assertEqual(response.json, [{"id": "conversation1", "name": "Test Conversation"}])
         mock_create_token.assert_called_once()
         mock_create_breadcrumb.assert_called_once_with(mock_token)
-        mock_get_conversations.assert_called_once_with(token=mock_token)
+        mock_get_conversations.assert_called_once_with(token=mock_token, after=None, limit=30)
+        self.assertNotIn("X-Next-Cursor", response.headers)
+
+    @patch('stage0_py_utils.routes.conversation_routes.create_flask_token')
+    @patch('stage0_py_utils.routes.conversation_routes.create_flask_breadcrumb')
+    @patch('stage0_py_utils.services.conversation_services.ConversationServices.get_conversations')
+    def test_get_conversations_invalid_cursor(self, mock_get_conversations, mock_create_breadcrumb, mock_create_token):
+        """Test GET /api/conversation with a malformed after cursor is a bad request."""
+        response = self.client.get('/api/conversation?after=not-an-id')
+
+        self.assertEqual(response.status_code, 400)
+        mock_get_conversations.assert_not_called()
+
+    @patch('stage0_py_utils.routes.conversation_routes.create_flask_token')
+    @patch('stage0_py_utils.routes.conversation_routes.create_flask_breadcrumb')
+    @patch('stage0_py_utils.services.conversation_services.ConversationServices.get_conversations')
+    def test_get_conversations_page(self, mock_get_conversations, mock_create_breadcrumb, mock_create_token):
+        """Test GET /api/conversation with keyset pagination."""
+        # Arrange
+        mock_token = {"user_id": "mock_user"}
+        mock_create_token.return_value = mock_token
+        fake_breadcrumb = {"at_time":"sometime", "correlation_id":"correlation_ID"}
+        mock_create_breadcrumb.return_value = fake_breadcrumb
+        mock_get_conversations.return_value = [{"_id": "conversation2", "channel_id": "CHANNEL_2"}]
+
+        # Act
+        response = self.client.get('/api/conversation?after=eeee00000000000000000001&limit=1')
+
+        # Assert
+        self.assertEqual(response.status_code, 200)
+        mock_get_conversations.assert_called_once_with(token=mock_token, after="eeee00000000000000000001", limit=1)
+        self.assertEqual(response.headers["X-Next-Cursor"], "conversation2")
 
     @patch('stage0_py_utils.routes.conversation_routes.create_flask_token')
     @patch('stage0_py_utils.routes.conversation_routes.create_flask_breadcrumb')
@@ -68,7 +99,26 @@ class TestConversationRoutes(unittest.TestCase):
         self.assertEqual(response.json, mock_conversation)
         mock_create_token.assert_called_once()
         mock_create_breadcrumb.assert_called_once_with(mock_token)
-        mock_get_conversation.assert_called_once_with(channel_id='conversation1', token=mock_token, breadcrumb=fake_breadcrumb)
+        mock_get_conversation.assert_called_once_with(channel_id='conversation1', token=mock_token, breadcrumb=fake_breadcrumb, window=None)
+
+    @patch('stage0_py_utils.routes.conversation_routes.create_flask_token')
+    @patch('stage0_py_utils.routes.conversation_routes.create_flask_breadcrumb')
+    @patch('stage0_py_utils.services.conversation_services.ConversationServices.get_conversation')
+    def test_get_conversation_window(self, mock_get_conversation, mock_create_breadcrumb, mock_create_token):
+        """Test GET /api/conversation/{id}?window= passes the message window."""
+        # Arrange
+        mock_token = {"user_id": "mock_user"}
+        mock_create_token.return_value = mock_token
+        fake_breadcrumb = {"at_time":"sometime", "correlation_id":"correlation_ID"}
+        mock_create_breadcrumb.return_value = fake_breadcrumb
+        mock_get_conversation.return_value = {"id": "conversation1", "messages": []}
+
+        # Act
+        response = self.client.get('/api/conversation/conversation1?window=10')
+
+        # Assert
+        self.assertEqual(response.status_code, 200)
+        mock_get_conversation.assert_called_once_with(channel_id='conversation1', token=mock_token, breadcrumb=fake_breadcrumb, window=10)
 
     @patch('stage0_py_utils.routes.conversation_routes.create_flask_token')
     @patch('stage0_py_utils.routes.conversation_routes.create_flask_breadcrumb')
@@ -83,5 +83,17 @@ class TestBotServices(unittest.IsolatedAsyncioTestCase):
         result = BotServices.remove_channel("bot1", token, breadcrumb, "channel2")
         self.assertNotIn("channel2", result)
 
+    @patch('stage0_py_utils.MongoIO.get_instance')
+    @patch('stage0_py_utils.Config.get_instance')
+    def test_create_indexes(self, mock_config, mock_mongo):
+        mock_mongo_instance = MagicMock()
+        mock_mongo.return_value = mock_mongo_instance
+        mock_config.return_value = MagicMock(BOT_COLLECTION_NAME="bot")
+        mock_mongo_instance.ensure_indexes.return_value = {"collection": "bot", "created": [], "unknown": [], "unused": []}
+
+        report = BotServices.create_indexes()
+        self.assertEqual(report["collection"], "bot")
+        mock_mongo_instance.ensure_indexes.assert_called_once_with("bot", [])
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,125 @@
+import unittest
+import threading
+import time
+from unittest.mock import MagicMock
+from stage0_py_utils.services.conversation_cache import ConversationCache
+
+class TestConversationCache(unittest.TestCase):
+
+    def setUp(self):
+        self.writes = []
+        self.cache = ConversationCache(
+            write_function=lambda channel_id, messages, breadcrumb: self.writes.append((channel_id, list(messages))),
+            max_channels=2, max_bytes=1000, flush_interval_ms=60000, flush_size=3
+        )
+
+    def tearDown(self):
+        self.cache.close()
+
+    def message(self, text):
+        return {"role": "user", "content": text}
+
+    def test_add_message_loads_once(self):
+        load = MagicMock(return_value=[self.message("Old")])
+        self.cache.add_message("CHANNEL_1", self.message("One"), load_function=load)
+        messages = self.cache.add_message("CHANNEL_1", self.message("Two"), load_function=load)
+        load.assert_called_once()
+        self.assertEqual([m["content"] for m in messages], ["Old", "One", "Two"])
+        self.assertEqual(self.writes, [])
+
+    def test_flush_size_writes_batch(self):
+        for text in ["One", "Two", "Three"]:
+            self.cache.add_message("CHANNEL_1", self.message(text))
+        self.assertEqual(len(self.writes), 1)
+        channel_id, messages = self.writes[0]
+        self.assertEqual(channel_id, "CHANNEL_1")
+        self.assertEqual([m["content"] for m in messages], ["One", "Two", "Three"])
+
+    def test_flush_writes_pending(self):
+        self.cache.add_message("CHANNEL_1", self.message("One"))
+        self.cache.add_message("CHANNEL_2", self.message("Two"))
+        self.cache.flush()
+        self.assertEqual(len(self.writes), 2)
+        self.cache.flush()
+        self.assertEqual(len(self.writes), 2)
+
+    def test_failed_write_is_retried(self):
+        write = MagicMock(side_effect=[Exception("Mongo down"), None])
+        self.cache.write = write
+        self.cache.add_message("CHANNEL_1", self.message("One"))
+        self.cache.flush()
+        self.cache.flush()
+        self.assertEqual(write.call_count, 2)
+        self.assertEqual(write.call_args.args[1], [self.message("One")])
+
+    def test_lru_eviction_by_channel_count(self):
+        self.cache.add_message("CHANNEL_1", self.message("One"))
+        self.cache.add_message("CHANNEL_2", self.message("Two"))
+        self.cache.add_message("CHANNEL_1", self.message("Three"))
+        self.cache.add_message("CHANNEL_3", self.message("Four"))
+        self.assertEqual(list(self.cache.channels.keys()), ["CHANNEL_1", "CHANNEL_3"])
+        self.assertEqual(self.writes, [("CHANNEL_2", [self.message("Two")])])
+
+    def test_lru_eviction_by_bytes(self):
+        self.cache.add_message("CHANNEL_1", self.message("x" * 600))
+        self.cache.add_message("CHANNEL_2", self.message("y" * 600))
+        self.assertEqual(list(self.cache.channels.keys()), ["CHANNEL_2"])
+        self.assertLessEqual(self.cache.bytes, 1000)
+        self.assertEqual(self.writes[0][0], "CHANNEL_1")
+
+    def test_failed_eviction_write_is_retried(self):
+        write = MagicMock(side_effect=[Exception("Mongo down"), None])
+        self.cache.write = write
+        self.cache.add_message("CHANNEL_1", self.message("One"))
+        self.cache.add_message("CHANNEL_2", self.message("Two"))
+        self.cache.add_message("CHANNEL_3", self.message("Three"))
+        self.assertEqual(write.call_count, 1)
+        self.assertEqual(self.cache.evicted, [("CHANNEL_1", [self.message("One")], None)])
+        self.cache.flush("CHANNEL_1")
+        self.assertEqual(write.call_count, 2)
+        self.assertEqual(write.call_args.args[:2], ("CHANNEL_1", [self.message("One")]))
+        self.assertEqual(self.cache.evicted, [])
+
+    def test_evicted_while_loading_is_reloaded(self):
+        # Another thread caches and evicts the channel, with a pending message, during the load
+        loads = []
+        def load():
+            loads.append(1)
+            if len(loads) == 1:
+                self.cache.add_message("CHANNEL_1", self.message("One"))
+                self.cache.evict("CHANNEL_1")
+            return [m for _, batch in self.writes for m in batch]
+        messages = self.cache.add_message("CHANNEL_1", self.message("Two"), load_function=load)
+        self.assertEqual(len(loads), 2)
+        self.assertEqual([m["content"] for m in messages], ["One", "Two"])
+
+    def test_evict_flushes_and_removes(self):
+        self.cache.add_message("CHANNEL_1", self.message("One"))
+        self.cache.evict("CHANNEL_1")
+        self.assertNotIn("CHANNEL_1", self.cache.channels)
+        self.assertEqual(self.cache.bytes, 0)
+        self.assertEqual(len(self.writes), 1)
+
+    def test_close_flushes(self):
+        self.cache.add_message("CHANNEL_1", self.message("One"))
+        self.cache.close()
+        self.assertEqual(len(self.writes), 1)
+        self.assertIsNone(self.cache.flusher)
+
+    def test_concurrent_miss_and_flush(self):
+        # The load function flushes the cache, like ConversationServices.get_messages
+        self.cache.flush_interval = 0.001
+        def load():
+            time.sleep(0.002)
+            self.cache.flush("UNCACHED")
+            return []
+        def worker(n):
+            for i in range(20):
+                self.cache.add_message(f"CHANNEL_{n}_{i}", self.message("One"), load_function=load)
+        threads = [threading.Thread(target=worker, args=(n,), daemon=True) for n in range(4)]
+        for thread in threads: thread.start()
+        for thread in threads: thread.join(timeout=10)
+        self.assertFalse(any(thread.is_alive() for thread in threads))
+
+if __name__ == '__main__':
+    unittest.main()
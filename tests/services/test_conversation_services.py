@@ -1,10 +1,14 @@
 import unittest
 from stage0_py_utils.config.config import Config
 from unittest.mock import patch, MagicMock
+from pymongo.errors import DuplicateKeyError, OperationFailure
 from stage0_py_utils import ConversationServices
 from stage0_py_utils.config.config import Config
 
 class TestConversationServices(unittest.TestCase):
+
+    def setUp(self):
+        Config.get_instance().initialize()
     
     @patch('stage0_py_utils.MongoIO.get_instance')
     def test_get_conversations(self, mock_mongo):
@@ -19,6 +23,20 @@ class TestConversationServices(unittest.TestCase):
         self.assertEqual(len(result), 1)
         self.assertEqual(result[0]["channel_id"], "CHANNEL_ID")
 
+    @patch('stage0_py_utils.MongoIO.get_instance')
+    def test_get_conversations_page(self, mock_mongo):
+        mock_mongo_instance = MagicMock()
+        mock_mongo.return_value = mock_mongo_instance
+        mock_mongo_instance.get_documents.return_value = [{"_id": "conv2", "channel_id": "CHANNEL_ID"}]
+
+        token = {"user_id": "test_user"}
+        result = ConversationServices.get_conversations(token=token, after="conv1", limit=1)
+
+        self.assertEqual(len(result), 1)
+        args, kwargs = mock_mongo_instance.get_documents.call_args
+        self.assertEqual(kwargs["after"], "conv1")
+        self.assertEqual(kwargs["limit"], 1)
+
     @patch('stage0_py_utils.MongoIO.get_instance')
     def test_get_all_conversations_by_name(self, mock_mongo):
         mock_mongo_instance = MagicMock()
@@ -31,16 +49,27 @@ class TestConversationServices(unittest.TestCase):
 
         self.assertEqual(len(result), 1)
         self.assertIn("CHANNEL_1", [conv["channel_id"] for conv in result])
+        args, kwargs = mock_mongo_instance.get_documents.call_args
+        self.assertEqual(args[1], {"channel_id": {"$regex": "^Test"}})
+
+        ConversationServices.get_all_conversations_by_name(query="^Test", token=token)
+        args, kwargs = mock_mongo_instance.get_documents.call_args
+        self.assertEqual(args[1], {"channel_id": {"$regex": "^Test"}})
 
     @patch('stage0_py_utils.MongoIO.get_instance')
     def test_get_conversation(self, mock_mongo):
         mock_mongo_instance = MagicMock()
         mock_mongo.return_value = mock_mongo_instance
-        mock_mongo_instance.get_document.return_value = {"_id": "conv1", "channel_id": "CHANNEL_1"}
+        mock_mongo_instance.get_documents.return_value = []
+        mock_mongo_instance.update_document.return_value = {"_id": "conv1", "channel_id": "CHANNEL_1"}
 
         token = {"user_id": "test_user"}
         result = ConversationServices.get_conversation(channel_id="conv1", token=token)
         self.assertEqual(result["_id"], "conv1")
+        mock_mongo_instance.create_document.assert_not_called()
+        args, kwargs = mock_mongo_instance.update_document.call_args
+        self.assertTrue(kwargs["upsert"])
+        self.assertEqual(kwargs["set_on_insert_data"]["messages"], [])
 
     @patch('stage0_py_utils.MongoIO.get_instance')
     def test_update_conversation(self, mock_mongo):
@@ -76,6 +105,137 @@ class TestConversationServices(unittest.TestCase):
         )
         self.assertEqual(result, mock_update_return["messages"])
 
+    @patch('stage0_py_utils.MongoIO.get_instance')
+    def test_add_message_window(self, mock_mongo):
+        mock_mongo_instance = MagicMock()
+        mock_mongo.return_value = mock_mongo_instance
+        mock_mongo_instance.update_document.return_value = {"_id": "conv1", "message_count": 5, "messages": "Window Of Values"}
+
+        token = {"user_id": "test_user"}
+        breadcrumb = {"timestamp": "now"}
+        message = {"role":"user", "content": "New message"}
+
+        result = ConversationServices.add_message(
+            channel_id="conv1", message=message, 
+            token=token, breadcrumb=breadcrumb, window=10
+        )
+        self.assertEqual(result, "Window Of Values")
+        args, kwargs = mock_mongo_instance.update_document.call_args
+        self.assertEqual(kwargs["project"], ConversationServices.window_projection(10))
+        self.assertTrue(kwargs["upsert"])
+        mock_mongo_instance.get_documents.assert_not_called()
+
+    @patch('stage0_py_utils.ConversationServices.reset_conversation')
+    @patch('stage0_py_utils.MongoIO.get_instance')
+    def test_add_message_rollover(self, mock_mongo, mock_reset):
+        config = Config.get_instance()
+        mock_mongo_instance = MagicMock()
+        mock_mongo.return_value = mock_mongo_instance
+        mock_mongo_instance.update_document.return_value = {"_id": "conv1", "message_count": config.MAX_MESSAGES, "messages": []}
+
+        message = {"role":"user", "content": "New message"}
+        ConversationServices.add_message(channel_id="conv1", message=message, window=10)
+        mock_reset.assert_called_once()
+        mock_mongo_instance.update_document.assert_called_once()
+
+    @patch('stage0_py_utils.MongoIO.get_instance')
+    def test_add_message_duplicate_key_retry(self, mock_mongo):
+        mock_mongo_instance = MagicMock()
+        mock_mongo.return_value = mock_mongo_instance
+        mock_mongo_instance.update_document.side_effect = [
+            DuplicateKeyError("active_channel"),
+            {"_id": "conv1", "messages": ["Retried"]}
+        ]
+
+        message = {"role":"user", "content": "New message"}
+        result = ConversationServices.add_message(channel_id="conv1", message=message)
+        self.assertEqual(result, ["Retried"])
+        self.assertEqual(mock_mongo_instance.update_document.call_count, 2)
+
+    @patch('stage0_py_utils.MongoIO.get_instance')
+    def test_add_messages(self, mock_mongo):
+        mock_mongo_instance = MagicMock()
+        mock_mongo.return_value = mock_mongo_instance
+        mock_mongo_instance.update_document.return_value = {"_id": "conv1", "message_count": 3}
+
+        messages = [{"role":"assistant", "content": "One"}, {"role":"user", "content": "Two"}]
+        result = ConversationServices.add_messages(channel_id="conv1", messages=messages)
+        self.assertEqual(result, 3)
+        mock_mongo_instance.update_document.assert_called_once()
+        args, kwargs = mock_mongo_instance.update_document.call_args
+        self.assertEqual(kwargs["push_data"], {"messages": {"$each": messages}})
+
+    @patch('stage0_py_utils.MongoIO.get_instance')
+    def test_add_messages_empty(self, mock_mongo):
+        mock_mongo_instance = MagicMock()
+        mock_mongo.return_value = mock_mongo_instance
+        self.assertEqual(ConversationServices.add_messages(channel_id="conv1", messages=[]), 0)
+        mock_mongo_instance.update_document.assert_not_called()
+
+    @patch('stage0_py_utils.MongoIO.get_instance')
+    def test_create_indexes(self, mock_mongo):
+        mock_mongo_instance = MagicMock()
+        mock_mongo.return_value = mock_mongo_instance
+        config = Config.get_instance()
+
+        reports = ConversationServices.create_indexes()
+        self.assertEqual(len(reports), 1)
+        collection_name, indexes = mock_mongo_instance.ensure_indexes.call_args.args
+        self.assertEqual(collection_name, config.CONVERSATION_COLLECTION_NAME)
+        self.assertEqual(indexes[0]["name"], "active_channel")
+        self.assertTrue(indexes[0]["unique"])
+        self.assertEqual(indexes[1]["key"][0], ("channel_id", 1))
+
+    @patch('stage0_py_utils.MongoIO.get_instance')
+    def test_create_indexes_archives_duplicates(self, mock_mongo):
+        mock_mongo_instance = MagicMock()
+        mock_mongo.return_value = mock_mongo_instance
+        config = Config.get_instance()
+        mock_mongo_instance.execute_pipeline.return_value = [{"_id": "conv1", "ids": ["id1", "id2", "id3"], "count": 3}]
+
+        ConversationServices.create_indexes()
+
+        archived = [call.kwargs["document_id"] for call in mock_mongo_instance.update_document.call_args_list]
+        self.assertEqual(archived, ["id2", "id3"])
+        self.assertEqual(mock_mongo_instance.update_document.call_args.kwargs["set_data"], {"status": config.ARCHIVED_STATUS})
+
+    @patch('stage0_py_utils.MongoIO.get_instance')
+    def test_create_indexes_without_active_channel(self, mock_mongo):
+        mock_mongo_instance = MagicMock()
+        mock_mongo.return_value = mock_mongo_instance
+        mock_mongo_instance.execute_pipeline.return_value = []
+        mock_mongo_instance.ensure_indexes.side_effect = [OperationFailure("E11000 duplicate key error", 11000), {"created": []}]
+
+        reports = ConversationServices.create_indexes()
+
+        self.assertEqual(reports, [{"created": []}])
+        collection_name, indexes = mock_mongo_instance.ensure_indexes.call_args.args
+        self.assertNotIn("active_channel", [index["name"] for index in indexes])
+
+    @patch('stage0_py_utils.MongoIO.get_instance')
+    def test_create_indexes_bucket_storage(self, mock_mongo):
+        mock_mongo_instance = MagicMock()
+        mock_mongo.return_value = mock_mongo_instance
+        config = Config.get_instance()
+
+        with patch.object(config, "MESSAGE_STORAGE", ConversationServices.BUCKET_STORAGE):
+            reports = ConversationServices.create_indexes()
+        self.assertEqual(len(reports), 2)
+        collection_name, indexes = mock_mongo_instance.ensure_indexes.call_args.args
+        self.assertEqual(collection_name, config.MESSAGE_COLLECTION_NAME)
+        self.assertEqual(indexes[0]["name"], "conversation_sequence")
+
+    def test_window_projection(self):
+        self.assertIsNone(ConversationServices.window_projection(None))
+        self.assertIsNone(ConversationServices.window_projection(0))
+        project = ConversationServices.window_projection(10)
+        pinned, recent = project["messages"]["$concatArrays"]
+        self.assertEqual(pinned["$filter"]["cond"], {"$eq": ["$$this.role", "system"]})
+        step = Config.get_instance().LLM_CONTEXT_TRIM_STEP
+        self.assertEqual(recent["$let"]["in"]["$slice"][0], "$$recent")
+        self.assertEqual(recent["$let"]["in"]["$slice"][2], 10 + step - 1)
+        self.assertEqual(project["message_count"], {"$size": "$messages"})
+
     @patch('stage0_py_utils.MongoIO.get_instance')
     def test_reset_conversation(self, mock_mongo):
         mock_mongo_instance = MagicMock()
@@ -191,5 +351,178 @@ user,alice,group,How are you today?
         })
         self.assertEqual(kwargs["set_data"], {"last_saved": mock_breadcrumb})
 
+    @patch('stage0_py_utils.MongoIO.get_instance')
+    def test_add_message_bucket_storage(self, mock_mongo):
+        config = Config.get_instance()
+        mock_mongo_instance = MagicMock()
+        mock_mongo.return_value = mock_mongo_instance
+        system_message = {"role": "system", "content": "Be nice"}
+        message = {"role": "user", "content": "New message"}
+        mock_mongo_instance.update_document.side_effect = [
+            {"_id": "conv1", "channel_id": "conv1", "message_count": 101, "pinned": [system_message]},
+            {"_id": "bucket1"}
+        ]
+        mock_mongo_instance.get_documents.return_value = [
+            {"messages": [{**message, "index": 100}]}
+        ]
+
+        with patch.object(config, "MESSAGE_STORAGE", ConversationServices.BUCKET_STORAGE), \
+                patch.object(config, "LLM_CONTEXT_TRIM_STEP", 1):
+            result = ConversationServices.add_message(channel_id="conv1", message=message, window=1)
+
+        self.assertEqual(result, [system_message, message])
+        header_call, bucket_call = mock_mongo_instance.update_document.call_args_list
+        self.assertEqual(header_call.kwargs["inc_data"], {"message_count": 1})
+        self.assertEqual(header_call.kwargs["set_on_insert_data"], {"pinned": []})
+        self.assertEqual(bucket_call.args[0], config.MESSAGE_COLLECTION_NAME)
+        self.assertEqual(bucket_call.kwargs["match"], {"conversation_id": "conv1", "sequence": 1})
+        self.assertEqual(bucket_call.kwargs["push_data"], {"messages": {"$each": [{**message, "index": 100}], "$sort": {"index": 1}}})
+        self.assertTrue(bucket_call.kwargs["upsert"])
+        mock_mongo_instance.create_document.assert_not_called()
+        # Only the buckets holding the window are read
+        args, kwargs = mock_mongo_instance.get_documents.call_args
+        self.assertEqual(kwargs["match"], {"conversation_id": "conv1", "sequence": {"$gte": 1}})
+
+    @patch('stage0_py_utils.MongoIO.get_instance')
+    def test_add_message_bucket_storage_pins_system_messages(self, mock_mongo):
+        config = Config.get_instance()
+        mock_mongo_instance = MagicMock()
+        mock_mongo.return_value = mock_mongo_instance
+        system_message = {"role": "system", "content": "Be nice"}
+        mock_mongo_instance.update_document.return_value = {"_id": "conv1", "message_count": 1, "pinned": [system_message]}
+        mock_mongo_instance.get_documents.return_value = [{"messages": [{**system_message, "index": 0}]}]
+
+        with patch.object(config, "MESSAGE_STORAGE", ConversationServices.BUCKET_STORAGE):
+            result = ConversationServices.add_message(channel_id="conv1", message=system_message, window=10)
+
+        self.assertEqual(result, [system_message])
+        header_call = mock_mongo_instance.update_document.call_args_list[0]
+        self.assertEqual(header_call.kwargs["push_data"], {"pinned": {"$each": [system_message]}})
+
+    @patch('stage0_py_utils.services.conversation_services.ConversationServices.reset_conversation')
+    @patch('stage0_py_utils.MongoIO.get_instance')
+    def test_add_message_bucket_storage_rollover(self, mock_mongo, mock_reset):
+        config = Config.get_instance()
+        mock_mongo_instance = MagicMock()
+        mock_mongo.return_value = mock_mongo_instance
+        mock_mongo_instance.update_document.return_value = {"_id": "conv1", "message_count": config.MAX_MESSAGES, "pinned": []}
+        mock_mongo_instance.get_documents.return_value = []
+
+        with patch.object(config, "MESSAGE_STORAGE", ConversationServices.BUCKET_STORAGE):
+            ConversationServices.add_message(channel_id="conv1", message={"role": "user", "content": "Last"}, window=10)
+
+        mock_reset.assert_called_once()
+
+    @patch('stage0_py_utils.MongoIO.get_instance')
+    def test_load_given_conversation_bucket_storage(self, mock_mongo):
+        config = Config.get_instance()
+        mock_mongo_instance = MagicMock()
+        mock_mongo.return_value = mock_mongo_instance
+        mock_mongo_instance.update_document.return_value = {"_id": "conv1", "message_count": 101}
+        csv_data = """role,from,to,text
+user,alice,group,Hello Bob!
+assistant,bob,group,Hi Alice!
+user,alice,group,How are you today?
+"""
+
+        with patch.object(config, "MESSAGE_STORAGE", ConversationServices.BUCKET_STORAGE):
+            ConversationServices.load_given_conversation(channel_id="conv1", csv_data=csv_data)
+
+        header_call, first_bucket, second_bucket = mock_mongo_instance.update_document.call_args_list
+        self.assertEqual(header_call.kwargs["inc_data"], {"message_count": 3})
+        self.assertEqual(first_bucket.kwargs["match"]["sequence"], 0)
+        self.assertEqual(len(first_bucket.kwargs["push_data"]["messages"]["$each"]), 2)
+        self.assertEqual(second_bucket.kwargs["match"]["sequence"], 1)
+        self.assertEqual(len(second_bucket.kwargs["push_data"]["messages"]["$each"]), 1)
+
+    @patch('stage0_py_utils.MongoIO.get_instance')
+    def test_get_messages_bucket_storage(self, mock_mongo):
+        config = Config.get_instance()
+        mock_mongo_instance = MagicMock()
+        mock_mongo.return_value = mock_mongo_instance
+        bucket1 = [{"role": "user", "content": f"Message {i}"} for i in range(100, 200)]
+        bucket2 = [{"role": "user", "content": f"Message {i}"} for i in range(200, 300)]
+        mock_mongo_instance.get_documents.side_effect = [
+            [{"_id": "conv1"}],
+            [{"messages": bucket1}, {"messages": bucket2}]
+        ]
+
+        with patch.object(config, "MESSAGE_STORAGE", ConversationServices.BUCKET_STORAGE):
+            result = ConversationServices.get_messages(channel_id="conv1", start=150, end=250)
+
+        self.assertEqual(len(result), 100)
+        self.assertEqual(result[0]["content"], "Message 150")
+        self.assertEqual(result[-1]["content"], "Message 249")
+        args, kwargs = mock_mongo_instance.get_documents.call_args
+        self.assertEqual(kwargs["match"], {"conversation_id": "conv1", "sequence": {"$gte": 1, "$lte": 2}})
+
+    @patch('stage0_py_utils.MongoIO.get_instance')
+    def test_get_messages_embedded_storage(self, mock_mongo):
+        mock_mongo_instance = MagicMock()
+        mock_mongo.return_value = mock_mongo_instance
+        mock_mongo_instance.get_documents.return_value = [{"messages": "Range Of Values"}]
+
+        result = ConversationServices.get_messages(channel_id="conv1", start=10, end=20)
+
+        self.assertEqual(result, "Range Of Values")
+        args, kwargs = mock_mongo_instance.get_documents.call_args
+        self.assertEqual(kwargs["project"], {"_id": 0, "messages": {"$slice": [10, 10]}})
+
+    @patch('stage0_py_utils.MongoIO.get_instance')
+    def test_add_message_cached(self, mock_mongo):
+        mock_mongo_instance = MagicMock()
+        mock_mongo.return_value = mock_mongo_instance
+        config = Config.get_instance()
+        system_message = {"role": "system", "content": "Be nice"}
+        mock_mongo_instance.get_documents.return_value = [{"messages": [system_message]}]
+
+        with patch.object(config, "CONVERSATION_CACHE", True), patch.object(ConversationServices, "_cache", None), \
+                patch.object(config, "LLM_CONTEXT_TRIM_STEP", 1):
+            first = ConversationServices.add_message(channel_id="conv1", message={"role": "user", "content": "One"}, window=1)
+            second = ConversationServices.add_message(channel_id="conv1", message={"role": "user", "content": "Two"}, window=1)
+            mock_mongo_instance.get_documents.assert_called_once()
+            mock_mongo_instance.update_document.assert_not_called()
+            self.assertEqual(first, [system_message, {"role": "user", "content": "One"}])
+            self.assertEqual(second, [system_message, {"role": "user", "content": "Two"}])
+
+            # Closing the cache writes both messages in one batch
+            ConversationServices.close_cache()
+            mock_mongo_instance.update_document.assert_called_once()
+            args, kwargs = mock_mongo_instance.update_document.call_args
+            self.assertEqual(len(kwargs["push_data"]["messages"]["$each"]), 2)
+
+    @patch('stage0_py_utils.MongoIO.get_instance')
+    def test_reset_conversation_evicts_cache(self, mock_mongo):
+        mock_mongo_instance = MagicMock()
+        mock_mongo.return_value = mock_mongo_instance
+        config = Config.get_instance()
+        mock_mongo_instance.get_documents.return_value = []
+
+        with patch.object(config, "CONVERSATION_CACHE", True), patch.object(ConversationServices, "_cache", None):
+            ConversationServices.add_message(channel_id="conv1", message={"role": "user", "content": "One"})
+            ConversationServices.reset_conversation(channel_id="conv1")
+            self.assertNotIn("conv1", ConversationServices.get_cache().channels)
+            # The cached message is written before the conversation is reset
+            push_call, reset_call = mock_mongo_instance.update_document.call_args_list
+            self.assertIn("push_data", push_call.kwargs)
+            self.assertEqual(reset_call.kwargs["set_data"]["status"], config.COMPLETED_STATUS)
+            ConversationServices.close_cache()
+
+    def test_window_messages(self):
+        messages = [{"role": "system", "content": "Be nice"}] + [{"role": "user", "content": str(i)} for i in range(5)]
+        self.assertEqual(ConversationServices.window_messages(messages, None), messages)
+        with patch.object(Config.get_instance(), "LLM_CONTEXT_TRIM_STEP", 1):
+            self.assertEqual(ConversationServices.window_messages(messages, 2), [messages[0], messages[4], messages[5]])
+
+    def test_window_moves_in_steps(self):
+        config = Config.get_instance()
+        with patch.object(config, "LLM_CONTEXT_TRIM_STEP", 4):
+            self.assertEqual(ConversationServices.window_start(3, 10), 0)
+            self.assertEqual(ConversationServices.window_start(13, 10), 0)
+            self.assertEqual(ConversationServices.window_start(14, 10), 4)
+            self.assertEqual(ConversationServices.window_start(17, 10), 4)
+            messages = [{"role": "system", "content": "Be nice"}] + [{"role": "user", "content": str(i)} for i in range(17)]
+            self.assertEqual(ConversationServices.window_messages(messages, 10), [messages[0]] + messages[5:])
+
 if __name__ == '__main__':
     unittest.main()